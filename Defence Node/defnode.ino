@@ -18,8 +18,56 @@ WiFiUDP udp;
 const unsigned int LOCAL_UDP_PORT = 5005;
 const size_t MAX_PACKET = 1500;
 
+// Acknowledged alerts (Pi alert_delivery.py): "<level>;<device_id>;<seq>" is
+// answered with an encrypted "ACK;<device_id>;<seq>"
+const uint8_t DEVICE_ID = 32;
+const uint8_t ACK_NONCE_TAG = 0xAC;
+uint32_t lastSeq = 0;
+bool haveSeq = false;
+
 ChaChaPoly chachapoly; // instance of ChaChaPoly class
 
+// Encrypt "ACK;<id>;<seq>" and send it back to whoever sent the alert.
+// Nonce = 0xAC, device ID, 0, 0, 8 random bytes: never overlaps the Pi's nonces.
+void sendAck(uint32_t seq) {
+  char text[32];
+  int n = snprintf(text, sizeof(text), "ACK;%u;%lu", DEVICE_ID, (unsigned long)seq);
+  uint8_t packet[12 + sizeof(text) + 16];
+  packet[0] = ACK_NONCE_TAG;
+  packet[1] = DEVICE_ID;
+  packet[2] = 0;
+  packet[3] = 0;
+  uint32_t r1 = RANDOM_REG32, r2 = RANDOM_REG32;
+  memcpy(packet + 4, &r1, 4);
+  memcpy(packet + 8, &r2, 4);
+
+  chachapoly.setIV(packet, 12);
+  chachapoly.encrypt(packet + 12, (const uint8_t*)text, n);
+  chachapoly.computeTag(packet + 12 + n, 16);
+
+  udp.beginPacket(udp.remoteIP(), udp.remotePort());
+  udp.write(packet, 12 + n + 16);
+  udp.endPacket();
+}
+
+// Strips "<level>;<id>;<seq>" in place down to the level and acks it.
+// Returns false if the packet is for another device or a retransmission we already handled.
+bool handleAckedAlert(char *msg) {
+  char *sep1 = strchr(msg, ';');
+  if (!sep1) return true;  // plain broadcast from older Pi code
+  char *sep2 = strchr(sep1 + 1, ';');
+  if (!sep2) return false;
+  if (atoi(sep1 + 1) != DEVICE_ID) return false;
+
+  uint32_t seq = strtoul(sep2 + 1, NULL, 10);
+  sendAck(seq);  // always ack, our previous ack may have been lost
+  if (haveSeq && seq == lastSeq) return false;
+  lastSeq = seq;
+  haveSeq = true;
+  *sep1 = 0;
+  return true;
+}
+
 void setup() {
   Serial.begin(115200);
   delay(200);
@@ -113,6 +161,9 @@ void loop() {
 
     // Relay control
     Serial.printf("Received %u-byte plaintext: %s\n", (unsigned)plaintext_len, (char*)plaintext);
+    if (!handleAckedAlert((char*)plaintext)) {
+      return;
+    }
     if (strcmp((char*)plaintext, "High") == 0) {
     digitalWrite(RELAY_PIN, HIGH); // turn relay ON
     Serial.println("Relay ON");
@@ -12,6 +12,11 @@
 #define ECHO_PIN  14
 #define HIGH_WATER_PIN 4
 
+// Payload format: 1 = packed binary v1 (7 bytes, see receiver/payload.py on the Pi), 0 = CSV text
+#define USE_BINARY_PAYLOAD 1
+#define PAYLOAD_V1 0x81
+#define TYPE_RIVER 0x03
+
 struct RateSleep {
   float rate;
   uint32_t sleepTime;
@@ -57,7 +62,7 @@ float getDistanceCM() {
   return duration * 0.0343 / 2.0;
 }
 
-void sendEncryptedMessage(uint8_t dest, uint8_t src, const String &message) {
+void sendEncryptedBytes(uint8_t dest, uint8_t src, const uint8_t *message, size_t messageLen) {
   // Load nonceCounter from prefs and increment
   prefs.begin("lora", false);
   nonceCounter = prefs.getUInt("nonce", 0) + 1;
@@ -69,11 +74,11 @@ void sendEncryptedMessage(uint8_t dest, uint8_t src, const String &message) {
   uint64_t t = micros();
   memcpy(nonce + 4, &t, sizeof(t));
 
-  int plaintext_len = 2 + message.length();
+  int plaintext_len = 2 + messageLen;
   uint8_t plaintext[plaintext_len];
   plaintext[0] = dest;
   plaintext[1] = src;
-  memcpy(&plaintext[2], message.c_str(), message.length());
+  memcpy(&plaintext[2], message, messageLen);
 
   chacha.setIV(nonce, sizeof(nonce));
   uint8_t ciphertext[plaintext_len];
@@ -87,7 +92,11 @@ void sendEncryptedMessage(uint8_t dest, uint8_t src, const String &message) {
   LoRa.write(tag, sizeof(tag));
   LoRa.endPacket();
 
-  Serial.printf("Encrypted message sent: %s\n", message.c_str());
+  Serial.printf("Encrypted message sent (%u bytes)\n", (unsigned)messageLen);
+}
+
+void sendEncryptedMessage(uint8_t dest, uint8_t src, const String &message) {
+  sendEncryptedBytes(dest, src, (const uint8_t *)message.c_str(), message.length());
 }
 
 
@@ -172,11 +181,27 @@ void setup() {
   lastDistance = distance;
   lastMeasurementTime = now;
 
+#if USE_BINARY_PAYLOAD
+  // v1 river: uint16 distance (0.1cm), int16 rate of rise (0.1cm), uint8 flags (bit 0 = high water)
+  uint16_t distFx = (distance < 0) ? 0xFFFF : (uint16_t)lroundf(distance * 10);
+  int16_t rateFx = isnan(rs.rate) ? 0x7FFF : (int16_t)lroundf(rs.rate * 10);
+
+  uint8_t payload[7];
+  payload[0] = PAYLOAD_V1;
+  payload[1] = TYPE_RIVER;
+  memcpy(&payload[2], &distFx, 2);   // little-endian, as the Pi decoder expects
+  memcpy(&payload[4], &rateFx, 2);
+  payload[6] = highWater ? 0x01 : 0x00;
+
+  // Send to Pi (to pi at 0x01), from slave (ID=3)
+  sendEncryptedBytes(0x01, 3, payload, sizeof(payload));
+#else
   // Create "distance,rate,highWater" message
   String message = String(distance, 1) + "," + String(rs.rate, 1) + "," + String((int)highWater);
 
   // Send to Pi (to pi at 0x01), from slave (ID=3)
   sendEncryptedMessage(0x01, 3, message);
+#endif
 
   Serial.printf("Sleeping for %u seconds...\n", nextSleepSeconds);
 
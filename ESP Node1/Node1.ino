@@ -41,6 +41,11 @@ const int soilWet = 1456; // 100% saturation
 const uint8_t DEST_ID = 0x01; // send to Pi
 const uint8_t SRC_ID  = 0x02; // this node
 
+// Payload format: 1 = packed binary v1 (11 bytes, see receiver/payload.py on the Pi), 0 = CSV text
+#define USE_BINARY_PAYLOAD 1
+#define PAYLOAD_V1   0x81
+#define TYPE_WEATHER 0x02
+
 // Encryption key (32 bytes, for now just 0x00 to 0x1f)
 const uint8_t CHACHA_KEY[32] = {
   0x00,0x01,0x02,0x03,0x04,0x05,0x06,0x07,
@@ -70,7 +75,7 @@ int mapSoilSaturation(int rawValue) {
 }
 
 // uses preferences for nonce counter
-void sendEncryptedMessage(uint8_t dest, uint8_t src, const String &message) {
+void sendEncryptedBytes(uint8_t dest, uint8_t src, const uint8_t *message, size_t messageLen) {
   prefs.begin("lora", false);
   nonceCounter = prefs.getUInt("nonce", 0) + 1;
   prefs.putUInt("nonce", nonceCounter);
@@ -81,11 +86,11 @@ void sendEncryptedMessage(uint8_t dest, uint8_t src, const String &message) {
   uint64_t microsNow = micros();
   memcpy(nonce + 4, &microsNow, sizeof(microsNow));
 
-  int plaintext_len = 2 + message.length();
+  int plaintext_len = 2 + messageLen;
   uint8_t plaintext[plaintext_len];
   plaintext[0] = dest;
   plaintext[1] = src;
-  memcpy(&plaintext[2], message.c_str(), message.length());
+  memcpy(&plaintext[2], message, messageLen);
 
   chacha.setKey(CHACHA_KEY, sizeof(CHACHA_KEY));
   chacha.setIV(nonce, sizeof(nonce));
@@ -101,7 +106,11 @@ void sendEncryptedMessage(uint8_t dest, uint8_t src, const String &message) {
   LoRa.write(tag, sizeof(tag));
   LoRa.endPacket();
 
-  Serial.printf("Encrypted message sent to dest %d from src %d: %s\n", dest, src, message.c_str());
+  Serial.printf("Encrypted message sent to dest %d from src %d (%u bytes)\n", dest, src, (unsigned)messageLen);
+}
+
+void sendEncryptedMessage(uint8_t dest, uint8_t src, const String &message) {
+  sendEncryptedBytes(dest, src, (const uint8_t *)message.c_str(), message.length());
 }
 
 void printAndSendSensorReport() {
@@ -126,6 +135,24 @@ void printAndSendSensorReport() {
   Serial.printf("Rain total: %.2f mm\n", rainTotal);
   Serial.println("-------------------------------");
 
+#if USE_BINARY_PAYLOAD
+  // v1 weather: int16 temp (0.01C), uint16 hum (0.01%), uint8 soil (%), uint16 rain/min, uint16 rain total (0.01mm)
+  int16_t tempFx = isnan(temperature) ? 0x7FFF : (int16_t)lroundf(temperature * 100);
+  uint16_t humFx = isnan(humidity) ? 0xFFFF : (uint16_t)lroundf(humidity * 100);
+  uint16_t rainFx = (uint16_t)lroundf(rainLastMinute * 100);
+  uint16_t totalFx = (uint16_t)lroundf(rainTotal * 100);
+
+  uint8_t payload[11];
+  payload[0] = PAYLOAD_V1;
+  payload[1] = TYPE_WEATHER;
+  memcpy(&payload[2], &tempFx, 2);   // ESP32 is little-endian, same as the Pi decoder expects
+  memcpy(&payload[4], &humFx, 2);
+  payload[6] = (uint8_t)soilSat;
+  memcpy(&payload[7], &rainFx, 2);
+  memcpy(&payload[9], &totalFx, 2);
+
+  sendEncryptedBytes(DEST_ID, SRC_ID, payload, sizeof(payload));
+#else
   String payload = String((int)temperature) + "," +
                    String((int)humidity) + "," +
                    String(soilSat) + "," +
@@ -133,6 +160,7 @@ void printAndSendSensorReport() {
                    String(rainTotal, 2);
 
   sendEncryptedMessage(DEST_ID, SRC_ID, payload);
+#endif
 
   tipCountLastMinute = 0;
 
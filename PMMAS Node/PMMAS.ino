@@ -17,6 +17,13 @@ const char* password = "Password123";
 const unsigned int LOCAL_UDP_PORT = 5005;
 const size_t MAX_PACKET = 1500;
 
+// Acknowledged alerts (Pi alert_delivery.py): "<level>;<device_id>;<seq>" is
+// answered with an encrypted "ACK;<device_id>;<seq>". Give every wearable its own ID.
+const uint8_t DEVICE_ID = 16;
+const uint8_t ACK_NONCE_TAG = 0xAC;
+uint32_t lastSeq = 0;
+bool haveSeq = false;
+
 
 static const uint8_t WIFI_CHACHA_KEY[32] = {
   0x00,0x01,0x02,0x03,0x04,0x05,0x06,0x07,
@@ -56,6 +63,47 @@ void triggerBuzzer(unsigned long duration) {
   ledcDetach(BUZZER_PIN);
 }
 
+// Encrypt "ACK;<id>;<seq>" and send it back to whoever sent the alert.
+// Nonce = 0xAC, device ID, 0, 0, 8 random bytes: never overlaps the Pi's nonces.
+void sendAck(uint32_t seq) {
+  char text[32];
+  int n = snprintf(text, sizeof(text), "ACK;%u;%lu", DEVICE_ID, (unsigned long)seq);
+  uint8_t packet[12 + sizeof(text) + 16];
+  packet[0] = ACK_NONCE_TAG;
+  packet[1] = DEVICE_ID;
+  packet[2] = 0;
+  packet[3] = 0;
+  uint32_t r1 = esp_random(), r2 = esp_random();
+  memcpy(packet + 4, &r1, 4);
+  memcpy(packet + 8, &r2, 4);
+
+  chachapoly.setIV(packet, 12);
+  chachapoly.encrypt(packet + 12, (const uint8_t*)text, n);
+  chachapoly.computeTag(packet + 12 + n, 16);
+
+  udp.beginPacket(udp.remoteIP(), udp.remotePort());
+  udp.write(packet, 12 + n + 16);
+  udp.endPacket();
+}
+
+// Strips "<level>;<id>;<seq>" down to the level and acks it.
+// Returns false if the packet is for another device or a retransmission we already handled.
+bool handleAckedAlert(String &msg) {
+  int sep1 = msg.indexOf(';');
+  if (sep1 < 0) return true;  // plain broadcast from older Pi code
+  int sep2 = msg.indexOf(';', sep1 + 1);
+  if (sep2 < 0) return false;
+  if (msg.substring(sep1 + 1, sep2).toInt() != DEVICE_ID) return false;
+
+  uint32_t seq = strtoul(msg.substring(sep2 + 1).c_str(), NULL, 10);
+  sendAck(seq);  // always ack, our previous ack may have been lost
+  if (haveSeq && seq == lastSeq) return false;
+  lastSeq = seq;
+  haveSeq = true;
+  msg = msg.substring(0, sep1);
+  return true;
+}
+
 void startBeacon() {
   WiFi.disconnect(true);
   WiFi.mode(WIFI_AP);
@@ -119,6 +167,7 @@ void loop() {
         plaintext[plaintext_len] = 0;
         String msg = String((char*)plaintext);
         Serial.println("Received: " + msg);
+        if (!handleAckedAlert(msg)) return;
 
         AlertLevel newAlert = ALERT_NONE;
         if (msg == "Low")       newAlert = ALERT_LOW;
@@ -0,0 +1,242 @@
+# alert_delivery.py
+# Acknowledged alert delivery to the PMMAS / Defence nodes (optional; plain
+# broadcasts from alert_sender.py keep working for old firmware).
+#
+# Alert (Pi -> node), encrypted as usual:   "<level>;<device_id>;<seq>"
+# Ack   (node -> Pi), encrypted, same key:  "ACK;<device_id>;<seq>"
+#
+# The node replies to the address/port the alert came from. Ack nonces start
+# with ACK_NONCE_TAG and the device ID, so they can never collide with the
+# Pi's nonces (seconds || counter).
+#
+# Each device gets its own copy of an alert. Until the matching ack arrives
+# it is retransmitted with exponential backoff (RETRY_BASE_S, doubling, capped
+# at RETRY_MAX_S, up to MAX_ATTEMPTS). The first alert goes to the broadcast
+# address; once a device has acked, retransmissions go straight to its IP.
+# A newer alert for a device supersedes one still being retried.
+
+import asyncio
+import random
+import threading
+from collections import deque
+from time import monotonic
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+from alert_sender import AlertSender, shared_nonce_counter, WIFI_CHACHA_KEY, UDP_PORT, BROADCAST_ADDR
+
+ACK_PORT = 5006
+ACK_NONCE_TAG = 0xAC
+RETRY_BASE_S = 0.25
+RETRY_MAX_S = 8.0
+MAX_ATTEMPTS = 10
+LATENCY_SAMPLES = 1000
+
+
+def format_alert(level, device_id, seq):
+    return f"{level};{device_id};{seq}"
+
+
+def parse_ack(text):
+    """'ACK;<device_id>;<seq>' -> (device_id, seq); ValueError otherwise."""
+    kind, device_id, seq = text.split(";")
+    if kind != "ACK":
+        raise ValueError(f"Not an ack: {text!r}")
+    return int(device_id), int(seq)
+
+
+def encrypt_ack(device_id, seq, key=WIFI_CHACHA_KEY):
+    """What the node firmware sends back (used by tests / device stand-ins)."""
+    nonce = bytes([ACK_NONCE_TAG, device_id & 0xFF, 0, 0]) + random.getrandbits(64).to_bytes(8, "big")
+    return nonce + ChaCha20Poly1305(key).encrypt(nonce, f"ACK;{device_id};{seq}".encode(), None)
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+class DeviceStats:
+
+    def __init__(self):
+        self.alerts = 0
+        self.packets = 0
+        self.retransmits = 0
+        self.acked = 0
+        self.failed = 0
+        self.superseded = 0
+        self.latencies_ms = deque(maxlen=LATENCY_SAMPLES)
+
+    def as_dict(self):
+        lat = sorted(self.latencies_ms)
+        return {
+            "alerts": self.alerts,
+            "packets": self.packets,
+            "retransmits": self.retransmits,
+            "acked": self.acked,
+            "failed": self.failed,
+            "superseded": self.superseded,
+            "latency_ms": {
+                "p50": _percentile(lat, 50),
+                "p95": _percentile(lat, 95),
+                "p99": _percentile(lat, 99),
+                "max": lat[-1] if lat else 0.0,
+            },
+        }
+
+
+class _AckProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    def datagram_received(self, data, addr):
+        self.scheduler._on_datagram(data, addr)
+
+
+class DeliveryScheduler:
+    """
+    asyncio retransmission scheduler. Sends and receives on one UDP socket
+    (bound to ack_port) so nodes can answer the source address of the alert.
+
+    devices: {device_id: (host, port) or None}; None means broadcast to
+    (broadcast_addr, port) until the device's own address is learned.
+    """
+
+    def __init__(self, devices, key=WIFI_CHACHA_KEY, sender=None,
+                 port=UDP_PORT, ack_port=ACK_PORT, bind_host="0.0.0.0",
+                 broadcast_addr=BROADCAST_ADDR,
+                 retry_base_s=RETRY_BASE_S, retry_max_s=RETRY_MAX_S, max_attempts=MAX_ATTEMPTS):
+        self.devices = {int(d): addr for d, addr in dict(devices).items()}
+        self.aead = ChaCha20Poly1305(key)
+        # Only used to encrypt (same nonce counter as the plain broadcasts)
+        self.sender = sender or AlertSender(key=key, interfaces=(), counter=shared_nonce_counter())
+        self.port = port
+        self.ack_port = ack_port
+        self.bind_host = bind_host
+        self.broadcast_addr = broadcast_addr
+        self.retry_base_s = retry_base_s
+        self.retry_max_s = retry_max_s
+        self.max_attempts = max_attempts
+
+        self.transport = None
+        # Random start so a restarted Pi is unlikely to repeat a node's last seq
+        self._seq = {d: random.getrandbits(16) for d in self.devices}
+        self._pending = {}  # device_id -> (seq, asyncio.Future)
+        self._learned = {}  # device_id -> address its last ack came from
+        self.stats = {d: DeviceStats() for d in self.devices}
+        self.bad_acks = 0
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: _AckProtocol(self), local_addr=(self.bind_host, self.ack_port), allow_broadcast=True)
+        return self
+
+    def close(self):
+        for _, fut in self._pending.values():
+            if not fut.done():
+                fut.cancel()
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    @property
+    def local_port(self):
+        return self.transport.get_extra_info("sockname")[1]
+
+    def _address(self, device_id):
+        return self._learned.get(device_id) or self.devices[device_id] or (self.broadcast_addr, self.port)
+
+    def _on_datagram(self, data, addr):
+        if len(data) < 12 + 16 or data[0] != ACK_NONCE_TAG:
+            return  # our own broadcast echoing back, or noise
+        try:
+            device_id, seq = parse_ack(self.aead.decrypt(data[:12], data[12:], None).decode())
+        except (InvalidTag, ValueError, UnicodeDecodeError):
+            self.bad_acks += 1
+            return
+        pending = self._pending.get(device_id)
+        if pending and pending[0] == seq and not pending[1].done():
+            self._learned[device_id] = addr
+            pending[1].set_result(monotonic())
+
+    async def deliver(self, device_id, level):
+        """Send level to one device until acked. Returns latency in ms, or None if it gave up."""
+        stats = self.stats[device_id]
+        previous = self._pending.get(device_id)
+        if previous and not previous[1].done():
+            stats.superseded += 1
+            previous[1].cancel()
+
+        self._seq[device_id] = seq = (self._seq[device_id] + 1) & 0xFFFFFFFF
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[device_id] = (seq, fut)
+        packet = self.sender.encrypt(format_alert(level, device_id, seq))
+        stats.alerts += 1
+
+        start = monotonic()
+        timeout = self.retry_base_s
+        try:
+            for attempt in range(self.max_attempts):
+                self.transport.sendto(packet, self._address(device_id))
+                stats.packets += 1
+                if attempt:
+                    stats.retransmits += 1
+                try:
+                    acked_at = await asyncio.wait_for(asyncio.shield(fut), timeout)
+                except asyncio.TimeoutError:
+                    timeout = min(timeout * 2, self.retry_max_s)
+                    continue
+                latency_ms = (acked_at - start) * 1000.0
+                stats.acked += 1
+                stats.latencies_ms.append(latency_ms)
+                return latency_ms
+            stats.failed += 1
+            print(f"[WARN] Alert {level!r} to device {device_id} not acked after {self.max_attempts} attempts")
+            return None
+        except asyncio.CancelledError:
+            return None
+        finally:
+            if self._pending.get(device_id, (None, None))[1] is fut:
+                del self._pending[device_id]
+
+    async def send_alert(self, level):
+        """Deliver level to every device concurrently. Returns {device_id: latency_ms or None}."""
+        ids = list(self.devices)
+        results = await asyncio.gather(*(self.deliver(d, level) for d in ids))
+        return dict(zip(ids, results))
+
+    def stats_dict(self):
+        return {"devices": {d: s.as_dict() for d, s in self.stats.items()}, "bad_acks": self.bad_acks}
+
+
+class AckedAlertSender:
+    """
+    Runs a DeliveryScheduler on its own event loop thread so synchronous code
+    (the alert engine) can hand it levels: send(level) returns immediately.
+    """
+
+    def __init__(self, devices, **kwargs):
+        self.loop = asyncio.new_event_loop()
+        self.scheduler = DeliveryScheduler(devices, **kwargs)
+        self._thread = threading.Thread(target=self.loop.run_forever, name="alert-delivery", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.scheduler.start(), self.loop).result()
+
+    def send(self, level):
+        return asyncio.run_coroutine_threadsafe(self.scheduler.send_alert(level), self.loop)
+
+    def stats(self):
+        return asyncio.run_coroutine_threadsafe(self._stats(), self.loop).result()
+
+    async def _stats(self):
+        return self.scheduler.stats_dict()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.scheduler.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2)
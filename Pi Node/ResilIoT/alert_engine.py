@@ -0,0 +1,182 @@
+# alert_engine.py
+# Background alert evaluation. One thread per dashboard process watches the
+# data version bumped by the receiver on every ingest, re-evaluates the alert
+# level when it changes (and every refresh_s, for forecast/threshold changes),
+# keeps the result in memory and broadcasts it:
+#   - immediately when the level changes
+#   - again every heartbeat_s while it stays the same, so nodes that missed
+#     the change (or were rebooted) catch up
+# HTTP handlers only read state(); the number of open dashboards no longer
+# affects how often alerts are evaluated or sent.
+
+import threading
+from datetime import datetime
+from time import monotonic
+
+from utils.metrics import REGISTRY
+
+DEFAULT_POLL_S = 1.0
+DEFAULT_REFRESH_S = 60.0
+DEFAULT_HEARTBEAT_S = 300.0
+
+BROADCASTS = REGISTRY.counter(
+    "resiliot_alert_broadcasts_total",
+    "Alert level broadcasts to the nodes, by level and outcome.",
+    ["level", "result"],
+)
+EVALUATION_SECONDS = REGISTRY.histogram(
+    "resiliot_alert_evaluation_seconds",
+    "Time to evaluate the alert level from the latest readings and forecast.",
+)
+
+
+class AlertEngine:
+
+    def __init__(self, evaluate, send, version_fn,
+                 poll_s=DEFAULT_POLL_S, refresh_s=DEFAULT_REFRESH_S, heartbeat_s=DEFAULT_HEARTBEAT_S):
+        """
+        evaluate()   -> current level ("None", "Low", "Mid", "High")
+        send(level)  -> broadcast a level to the nodes
+        version_fn() -> data version (see utils/db_helpers.py), None if unknown
+        """
+        self.evaluate = evaluate
+        self.send = send
+        self.version_fn = version_fn
+        self.poll_s = poll_s
+        self.refresh_s = refresh_s
+        self.heartbeat_s = heartbeat_s
+
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._thread = None
+        self._stop = threading.Event()
+        self._version = None
+        self._evaluated_mono = None
+        self._sent_mono = None
+        self._state = {
+            "level": None,
+            "since": None,
+            "evaluated_at": None,
+            "broadcast_at": None,
+            "revision": 0,
+            "evaluations": 0,
+            "broadcasts": 0,
+            "errors": 0,
+            "last_error": None,
+        }
+
+    # -----------------------
+    # Readers
+    # -----------------------
+    def state(self):
+        with self._lock:
+            return dict(self._state)
+
+    @property
+    def level(self):
+        with self._lock:
+            return self._state["level"]
+
+    @property
+    def revision(self):
+        """Increases whenever the level changes."""
+        with self._lock:
+            return self._state["revision"]
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def add_listener(self, fn):
+        """fn(level, state) is called from the engine thread after every level change."""
+        self._listeners.append(fn)
+
+    # -----------------------
+    # Evaluation
+    # -----------------------
+    def check(self, force=False, broadcast=True):
+        """
+        Re-evaluate if new data arrived, refresh_s passed, or force; then
+        broadcast on a change or when the heartbeat is due (unless not
+        broadcast, for callers outside the engine thread). Returns the level.
+        """
+        now = monotonic()
+        version = self.version_fn()
+        due = force or self._evaluated_mono is None or version is None \
+            or version != self._version or now - self._evaluated_mono >= self.refresh_s
+        changed = False
+
+        if due:
+            try:
+                with EVALUATION_SECONDS.time():
+                    level = self.evaluate()
+            except Exception as e:
+                print(f"[ERROR] Alert evaluation failed: {e}")
+                with self._lock:
+                    self._state["errors"] += 1
+                    self._state["last_error"] = str(e)
+                return self.level
+            self._version = version
+            self._evaluated_mono = now
+            stamp = datetime.now().isoformat(timespec="seconds")
+            with self._lock:
+                s = self._state
+                s["evaluations"] += 1
+                s["evaluated_at"] = stamp
+                if level != s["level"]:
+                    changed = True
+                    s["level"] = level
+                    s["since"] = stamp
+                    s["revision"] += 1
+
+        level = self.level
+        if level is None:
+            return None
+        if broadcast and (changed or self._sent_mono is None or now - self._sent_mono >= self.heartbeat_s):
+            self._broadcast(level, now)
+        if changed:
+            state = self.state()
+            for fn in self._listeners:
+                try:
+                    fn(level, state)
+                except Exception as e:
+                    print(f"[WARN] Alert listener failed: {e}")
+        return level
+
+    def _broadcast(self, level, now):
+        self._sent_mono = now
+        try:
+            self.send(level)
+        except Exception as e:
+            print(f"[ERROR] Alert broadcast failed: {e}")
+            BROADCASTS.inc(level=level, result="failed")
+            with self._lock:
+                self._state["errors"] += 1
+                self._state["last_error"] = str(e)
+            return
+        BROADCASTS.inc(level=level, result="sent")
+        with self._lock:
+            self._state["broadcasts"] += 1
+            self._state["broadcast_at"] = datetime.now().isoformat(timespec="seconds")
+
+    # -----------------------
+    # Background thread
+    # -----------------------
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="alert-engine", daemon=True)
+        self._thread.start()
+        print(f"[INFO] Alert engine started (heartbeat {self.heartbeat_s:.0f}s)")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        self.check(force=True)
+        while not self._stop.wait(self.poll_s):
+            self.check()
@@ -1,10 +1,22 @@
 # alert_sender.py
+#
+# Encrypted UDP alert broadcasts to the PMMAS / Defence nodes.
+#
+# Packet: nonce (12) || ciphertext || tag (16), ChaCha20-Poly1305.
+# Nonce:  seconds (uint32 BE) || counter (uint64 BE)
+#
+# The counter must never repeat for the key, across restarts too. Instead of
+# writing it to disk for every nonce, counters are reserved in blocks: the file
+# holds the high-water mark (first counter not yet reserved) and is rewritten
+# once per block. After a crash the unused rest of the block is skipped, never
+# reused.
 
 import os
 import socket
 import struct
 import threading
 from datetime import datetime
+from time import sleep
 from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
 
 # -----------------------
@@ -17,16 +29,18 @@ WIFI_CHACHA_KEY = bytes([
     0x18,0x19,0x1a,0x1b,0x1c,0x1d,0x1e,0x1f
 ])
 
-# Path to persist the 8-byte counter
+# Path to persist the 8-byte counter high-water mark
 COUNTER_FILE_PATH = os.path.expanduser("~/.resiliot_nonce_counter")
+# Counters reserved per disk write
+COUNTER_BLOCK = 1024
 
 # Network defaults
 UDP_PORT = 5005
 BROADCAST_ADDR = '<broadcast>'
 DEFAULT_WIFI_INTERFACE = 'wlan0'
 
-# Internal lock for file operations (in case multiple threads call send simultaneously)
-_file_lock = threading.Lock()
+_COUNTER_MASK = (1 << 64) - 1
+_NONCE_PREFIX = struct.Struct(">I")
 
 
 def _read_counter_from_file(path: str) -> int:
@@ -53,28 +67,191 @@ def _write_counter_to_file(path: str, counter: int) -> None:
     os.replace(temp, path)
 
 
-def _get_and_increment_persistent_counter(path: str) -> int:
+class NonceCounter:
     """
-    Safely read the stored counter, increment it, persist, and return the previous value.
-    If no counter exists, seed it with a random 8-byte value.
+    Hands out nonce counters from blocks reserved on disk. The file is
+    written (temp + fsync + rename) once per `block` counters instead of
+    once per nonce.
     """
-    with _file_lock:
-        current = _read_counter_from_file(path)
-        if current is None:
+
+    def __init__(self, path: str = COUNTER_FILE_PATH, block: int = COUNTER_BLOCK):
+        self.path = path
+        self.block = block
+        self._lock = threading.Lock()
+        self._next = 0
+        self._limit = 0  # first counter outside the current reservation
+        self.reservations = 0
+
+    def _reserve(self, count: int) -> None:
+        start = _read_counter_from_file(self.path)
+        if start is None:
             # seeds with an unpredictable start to avoid accidental reuse
-            current = int.from_bytes(os.urandom(8), byteorder="big")
-        next_val = (current + 1) & ((1 << 64) - 1)
-        _write_counter_to_file(path, next_val)
-        return current
+            start = int.from_bytes(os.urandom(8), byteorder="big")
+        size = max(self.block, count)
+        # Persist the new high-water mark before using anything below it
+        _write_counter_to_file(self.path, (start + size) & _COUNTER_MASK)
+        self._next = start
+        self._limit = start + size
+        self.reservations += 1
 
+    def take(self, count: int = 1) -> int:
+        """Reserve `count` consecutive counters and return the first."""
+        with self._lock:
+            if self._next + count > self._limit:
+                self._reserve(count)
+            first = self._next
+            self._next += count
+            return first & _COUNTER_MASK
 
-def _build_nonce() -> bytes:
 
-    seconds = int(datetime.utcnow().timestamp()) & 0xFFFFFFFF
-    counter_val = _get_and_increment_persistent_counter(COUNTER_FILE_PATH)
-    nonce = struct.pack(">I", seconds) + counter_val.to_bytes(8, byteorder="big")
-    assert len(nonce) == 12
-    return nonce
+class AlertSender:
+    """
+    Long-lived alert broadcaster: one AEAD context, one UDP socket per
+    interface (opened on first use and kept), nonces from a NonceCounter.
+    """
+
+    def __init__(self, key: bytes = WIFI_CHACHA_KEY,
+                 interfaces=(DEFAULT_WIFI_INTERFACE,),
+                 port: int = UDP_PORT,
+                 addr: str = BROADCAST_ADDR,
+                 counter: NonceCounter = None,
+                 timeout_s: float = 1.0):
+        self.aead = ChaCha20Poly1305(key)
+        self.interfaces = tuple(interfaces)
+        self.port = port
+        self.addr = addr
+        self.counter = counter or NonceCounter()
+        self.timeout_s = timeout_s
+        self._sockets = {}
+        self._lock = threading.Lock()
+        self.stats = {"packets": 0, "send_errors": 0, "sockets_opened": 0}
+
+    # -----------------------
+    # Encryption
+    # -----------------------
+    def _nonce(self, seconds: int, counter_val: int) -> bytes:
+        return _NONCE_PREFIX.pack(seconds) + (counter_val & _COUNTER_MASK).to_bytes(8, byteorder="big")
+
+    def encrypt(self, plaintext: str) -> bytes:
+        """Returns bytes = nonce (12) || ciphertext || tag (16)"""
+        return self.encrypt_many([plaintext])[0]
+
+    def encrypt_many(self, plaintexts) -> list:
+        """Encrypt several messages with one counter reservation."""
+        for p in plaintexts:
+            if not isinstance(p, str):
+                raise TypeError("plaintext must be a str")
+        seconds = int(datetime.utcnow().timestamp()) & 0xFFFFFFFF
+        first = self.counter.take(len(plaintexts))
+        packets = []
+        for i, p in enumerate(plaintexts):
+            nonce = self._nonce(seconds, first + i)
+            packets.append(nonce + self.aead.encrypt(nonce, p.encode("utf-8"), associated_data=None))
+        return packets
+
+    # -----------------------
+    # Sockets
+    # -----------------------
+    def _open_socket(self, interface: str) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        # Trys binding to the wireless device so packet goes out via that interface
+        if interface:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, interface.encode() + b'\0')
+            except Exception:
+                # Not fatal (not root / not supported): the routing table picks the interface
+                pass
+        sock.settimeout(self.timeout_s)
+        self.stats["sockets_opened"] += 1
+        return sock
+
+    def _socket(self, interface: str) -> socket.socket:
+        sock = self._sockets.get(interface)
+        if sock is None:
+            sock = self._sockets[interface] = self._open_socket(interface)
+        return sock
+
+    def _send_packets(self, packets, repeat: int = 1, interval_s: float = 0.0):
+        dest = (self.addr, self.port)
+        with self._lock:
+            for copy in range(repeat):
+                if copy and interval_s:
+                    sleep(interval_s)
+                for interface in self.interfaces:
+                    for packet in packets:
+                        try:
+                            self._socket(interface).sendto(packet, dest)
+                            self.stats["packets"] += 1
+                        except OSError as e:
+                            # e.g. the interface went down: reopen next time
+                            self.stats["send_errors"] += 1
+                            print(f"[WARN] Alert send on {interface} failed: {e}")
+                            self._close_socket(interface)
+
+    def _close_socket(self, interface: str) -> None:
+        sock = self._sockets.pop(interface, None)
+        if sock is not None:
+            try:
+                sock.close()
+            except Exception:
+                pass
+
+    # -----------------------
+    # Public API
+    # -----------------------
+    def send(self, alert_text: str, repeat: int = 1, interval_s: float = 0.0) -> bytes:
+        """
+        Broadcast one alert, optionally `repeat` times. The copies are the same
+        packet (same nonce), so receivers can discard the extras.
+        """
+        packet = self.encrypt(alert_text)
+        self._send_packets([packet], repeat, interval_s)
+        return packet
+
+    def send_burst(self, alert_texts, repeat: int = 1, interval_s: float = 0.0) -> list:
+        """Broadcast several alerts back to back, encrypted with one counter reservation."""
+        packets = self.encrypt_many(list(alert_texts))
+        self._send_packets(packets, repeat, interval_s)
+        return packets
+
+    def close(self) -> None:
+        with self._lock:
+            for interface in list(self._sockets):
+                self._close_socket(interface)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -----------------------
+# Module-level helpers (one shared counter and sender per interface/port)
+# -----------------------
+_default_counter = None
+_senders = {}
+_senders_lock = threading.Lock()
+
+
+def shared_nonce_counter() -> NonceCounter:
+    global _default_counter
+    with _senders_lock:
+        if _default_counter is None:
+            _default_counter = NonceCounter(COUNTER_FILE_PATH)
+        return _default_counter
+
+
+def get_sender(wifi_interface: str = DEFAULT_WIFI_INTERFACE, port: int = UDP_PORT,
+               timeout_s: float = 1.0) -> AlertSender:
+    counter = shared_nonce_counter()
+    with _senders_lock:
+        sender = _senders.get((wifi_interface, port))
+        if sender is None:
+            sender = _senders[(wifi_interface, port)] = AlertSender(
+                interfaces=(wifi_interface,), port=port, counter=counter, timeout_s=timeout_s)
+        return sender
 
 
 def encrypt_alert_message(plaintext: str, key: bytes = WIFI_CHACHA_KEY) -> bytes:
@@ -84,37 +261,18 @@ def encrypt_alert_message(plaintext: str, key: bytes = WIFI_CHACHA_KEY) -> bytes
     if not isinstance(plaintext, str):
         raise TypeError("plaintext must be a str")
     aead = ChaCha20Poly1305(key)
-    nonce = _build_nonce()
-    ciphertext_and_tag = aead.encrypt(nonce, plaintext.encode("utf-8"), associated_data=None)
-    return nonce + ciphertext_and_tag
+    seconds = int(datetime.utcnow().timestamp()) & 0xFFFFFFFF
+    nonce = _NONCE_PREFIX.pack(seconds) + shared_nonce_counter().take().to_bytes(8, byteorder="big")
+    return nonce + aead.encrypt(nonce, plaintext.encode("utf-8"), associated_data=None)
 
 
 def send_encrypted_alert_broadcast(alert_text: str,
                                    wifi_interface: str = DEFAULT_WIFI_INTERFACE,
                                    port: int = UDP_PORT,
-                                   timeout_s: float = 1.0):
+                                   timeout_s: float = 1.0,
+                                   repeat: int = 1):
     """
-    Encrypts and broadcasts alert_text as a UDP packet. Also
-    attempts to bind the socket to the specified interface.
-    If that fails (not run as root or not supported), it will still send and the OS routing table will choose interface.
+    Encrypts and broadcasts alert_text as a UDP packet through the shared
+    sender for wifi_interface, which keeps its socket open between alerts.
     """
-    payload = encrypt_alert_message(alert_text)
-
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        # Trys binding to the wireless device so packet goes out via wlan0
-        try:
-
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, wifi_interface.encode() + b'\0')
-        except Exception:
-            # Not fatal: fallback to default route
-            pass
-
-        sock.settimeout(timeout_s)
-        sock.sendto(payload, (BROADCAST_ADDR, port))
-    finally:
-        try:
-            sock.close()
-        except Exception:
-            pass
+    get_sender(wifi_interface, port, timeout_s).send(alert_text, repeat=repeat)
@@ -1,10 +1,12 @@
 # app.py
 from flask import Flask
+import os
 from routes.auth import auth_bp
 from routes.dashboard import dashboard_bp
-from routes.api import api_bp
+from routes.api import api_bp, alert_engine, sql_tracer
 from routes.dynaminsert import dynaminsert_bp
-from utils.db_helpers import init_user_db
+from routes.metrics import metrics_bp
+from utils.db_helpers import init_user_db, init_sensor_db
 
 def create_app(test_config=None):
 
@@ -15,20 +17,46 @@ def create_app(test_config=None):
     if test_config:
         app.config.update(test_config)
 
+    # SQL tracing (per-request query stats, slow-query log); RESILIOT_SQL_TRACE=1
+    # turns it on without a config change
+    sql_tracer.enabled = app.config.get("SQL_TRACE", os.environ.get("RESILIOT_SQL_TRACE") == "1")
+    sql_tracer.slow_ms = app.config.get("SQL_SLOW_MS", sql_tracer.slow_ms)
+    sql_tracer.log_path = app.config.get("SQL_SLOW_LOG", sql_tracer.log_path)
+
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(dynaminsert_bp)
+    app.register_blueprint(metrics_bp)
 
-    # Initialise user database
+    # Initialise user and sensor databases
     if not app.config.get("TESTING", False):
         init_user_db()
+        init_sensor_db()
+
+    # Alerts are evaluated and broadcast to the nodes in the background,
+    # whether or not anyone has the dashboard open. Opt-in, so tests and
+    # scripts that build an app never send real UDP alerts: set
+    # ALERT_ENGINE_ENABLED in the config or RESILIOT_ALERT_ENGINE=1
+    if app.config.get("ALERT_ENGINE_ENABLED", os.environ.get("RESILIOT_ALERT_ENGINE") == "1"):
+        alert_engine.heartbeat_s = app.config.get("ALERT_HEARTBEAT_S", alert_engine.heartbeat_s)
+        # {device_id: (host, port) or None}: switch to acknowledged delivery
+        # (needs the ack-capable PMMAS / Defence firmware on every node)
+        ack_devices = app.config.get("ALERT_ACK_DEVICES")
+        if ack_devices:
+            from alert_delivery import AckedAlertSender
+            alert_engine.send = AckedAlertSender(ack_devices).send
+        alert_engine.start()
 
     return app
 
 
 # Only run when executing the file directly
 if __name__ == "__main__":
-    app = create_app()
+    # Alerts still need RESILIOT_ALERT_ENGINE=1; the debug reloader runs this
+    # file twice, and only the serving child (where WERKZEUG_RUN_MAIN is set)
+    # should broadcast them
+    app = create_app({"ALERT_ENGINE_ENABLED": os.environ.get("RESILIOT_ALERT_ENGINE") == "1"
+                                              and os.environ.get("WERKZEUG_RUN_MAIN") == "true"})
     app.run(host="0.0.0.0", port=5000, debug=True)
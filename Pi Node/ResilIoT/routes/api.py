@@ -1,4 +1,4 @@
-from flask import Blueprint, jsonify, request, render_template, redirect, url_for, flash, get_flashed_messages
+from flask import Blueprint, Response, jsonify, request, render_template, redirect, url_for, flash, get_flashed_messages
 from routes.auth import login_required
 from datetime import datetime, timedelta
 import sqlite3
@@ -6,36 +6,125 @@ import traceback
 from collections import defaultdict
 import os, json
 from utils.params_helper import load_thresholds, save_thresholds
+from utils.alert_rules import RuleEngine, normalize_forecast
+from utils.db_helpers import format_ts, to_epoch_ms, get_data_version, get_raw_since, ROLLUP_METRICS
+from utils.response_cache import ResponseCache
+from utils.event_stream import EventHub, Event
+from utils.downsample import downsample_columns
+from utils.backtest import backtest
+from utils.query_trace import SqlTracer
+from utils.archive import Archive, missing_ranges
+import numpy as np
 import threading
+import time
 from alert_sender import send_encrypted_alert_broadcast
+from alert_engine import AlertEngine
 
 api_bp = Blueprint('api', __name__)
 DB_PATH = './db/sensor_data.db'
 
+# Readings that utils/compact.py removed from the database (utils/archive.py)
+cold_archive = Archive()
+
+# Per-request SQL statistics and slow-query log; off unless the app enables
+# it (SQL_TRACE, see app.py and utils/query_trace.py)
+sql_tracer = SqlTracer()
+
 # Helpers
 def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+    conn = sql_tracer.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
 def safe_fetchone(conn, query, params=()):
+    """fetchone(), or None if a table it reads does not exist yet (fresh DB)."""
     try:
         return conn.execute(query, params).fetchone()
-    except Exception as e:
-        print(f"[safe_fetchone] Error: {e}")
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+        print(f"[WARN] {e}: {query.strip()}")
         return None
 
 THRESHOLDS_FILE = os.path.join(os.path.dirname(__file__), "..", "db", "thresholds.json")
 
-def _get_latest_data():
-    conn = get_conn()
+# Alert rules compiled from THRESHOLDS_FILE, recompiled when it changes
+rule_engine = RuleEngine(THRESHOLDS_FILE, loader=lambda: load_thresholds())
+
+def _current_data_version():
+    try:
+        conn = sql_tracer.connect(DB_PATH)
+    except sqlite3.Error:
+        return None
+    try:
+        return get_data_version(conn)
+    finally:
+        conn.close()
+
+# Dashboard polls are served from here until the receiver (or forecast fetcher)
+# commits new data; see utils/response_cache.py
+response_cache = ResponseCache(_current_data_version)
+
+def _today():
+    return datetime.now().strftime('%Y-%m-%d')
+
+def _this_hour():
+    # /historic labels run up to the current hour/day/week
+    return datetime.now().strftime('%Y-%m-%d %H')
+
+def _alert_inputs():
     try:
+        thresholds_mtime = os.path.getmtime(THRESHOLDS_FILE)
+    except OSError:
+        thresholds_mtime = None
+    return _today(), thresholds_mtime
+
+@api_bp.route('/cache/stats')
+@login_required
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+@api_bp.before_request
+def _begin_sql_trace():
+    sql_tracer.begin_request(f"{request.method} {request.full_path.rstrip('?')}")
+
+@api_bp.after_request
+def _sql_trace_headers(response):
+    trace = sql_tracer.end_request()
+    if trace is not None:
+        # Shows up in the browser's network panel next to the request timing
+        response.headers["Server-Timing"] = f'sql;dur={trace["ms"]:.1f};desc="{trace["queries"]} queries"'
+        response.headers["X-SQL-Queries"] = str(trace["queries"])
+    return response
+
+@api_bp.route('/debug/sql')
+@login_required
+def sql_trace():
+    """Recent per-request SQL traces and slow queries (with their query plans)."""
+    return jsonify(sql_tracer.recent())
+
+def _get_latest_rows(conn):
+    """Newest soil (sensor 2) and river (sensor 3) rows."""
+    try:
+        rows = conn.execute(
+            "SELECT * FROM latest_readings WHERE sensor_id IN (2, 3)"
+        ).fetchall()
+        by_sensor = {r["sensor_id"]: r for r in rows}
+        return by_sensor.get(2), by_sensor.get(3)
+    except sqlite3.OperationalError:
+        # DB without latest_readings (not migrated yet): fall back to the readings table
         soil_row = safe_fetchone(conn,
-            "SELECT * FROM sensor_readings WHERE sensor_id=2 ORDER BY timestamp DESC LIMIT 1"
+            "SELECT * FROM sensor_readings WHERE sensor_id=2 ORDER BY ts DESC LIMIT 1"
         )
         river_row = safe_fetchone(conn,
-            "SELECT * FROM sensor_readings WHERE sensor_id=3 ORDER BY timestamp DESC LIMIT 1"
+            "SELECT * FROM sensor_readings WHERE sensor_id=3 ORDER BY ts DESC LIMIT 1"
         )
+        return soil_row, river_row
+
+def _get_latest_data():
+    conn = get_conn()
+    try:
+        soil_row, river_row = _get_latest_rows(conn)
 
         data = {
             "soil": soil_row["soil"] if soil_row and soil_row["soil"] is not None else 0,
@@ -44,15 +133,22 @@ def _get_latest_data():
             "rain": soil_row["rain"] if soil_row and soil_row["rain"] is not None else 0,
             "total_rain": soil_row["total_daily_rain"] if soil_row and soil_row["total_daily_rain"] is not None else 0,
             "river": river_row["river"] if river_row and river_row["river"] is not None else 0,
-            "alert_level": soil_row["alert_level"] if soil_row and "alert_level" in soil_row.keys() else "normal"
+            "high_level_alert": river_row["high_level_alert"] if river_row and "high_level_alert" in river_row.keys()
+                                and river_row["high_level_alert"] is not None else 0,
+            "alert_level": soil_row["alert_level"] if soil_row and "alert_level" in soil_row.keys() else "normal",
+            "timestamps": {
+                "soil": format_ts(soil_row["ts"]) if soil_row and soil_row["ts"] is not None else None,
+                "river": format_ts(river_row["ts"]) if river_row and river_row["ts"] is not None else None,
+            }
         }
 
         return data
     finally:
-    conn.close()
+        conn.close()
 
 @api_bp.route('/latest')
 @login_required
+@response_cache.cached()
 def latest():
     try:
         return jsonify(_get_latest_data())
@@ -61,8 +157,33 @@ def latest():
         return jsonify({"error": str(e)}), 500
 
 
+# The forecast changes at most once per fetch (hourly), but the alert engine
+# and the stream watcher ask for it on every check; keep today's row in
+# memory until the data version moves (getforecast.py bumps it when it
+# stores a fetch), and at most FORECAST_CACHE_S for writers that don't.
+FORECAST_CACHE_S = 60
+_forecast_cache = {"date": None, "version": None, "expires": 0.0, "value": None}
+_forecast_cache_lock = threading.Lock()
+
 def _get_forecast_today():
-    today_str = datetime.now().strftime('%Y-%m-%d')
+    today_str = _today()
+    version = _current_data_version()
+    now = time.monotonic()
+    with _forecast_cache_lock:
+        if (_forecast_cache["date"] == today_str and _forecast_cache["version"] == version
+                and now < _forecast_cache["expires"]):
+            return _forecast_cache["value"]
+
+    value = _read_forecast(today_str)
+    with _forecast_cache_lock:
+        _forecast_cache.update(date=today_str, version=version, expires=now + FORECAST_CACHE_S, value=value)
+    return value
+
+def _clear_forecast_cache():
+    with _forecast_cache_lock:
+        _forecast_cache.update(date=None, version=None, expires=0.0, value=None)
+
+def _read_forecast(today_str):
     conn = get_conn()
     try:
         forecast_row = safe_fetchone(conn,
@@ -87,6 +208,7 @@ def _get_forecast_today():
 
 @api_bp.route('/forecast/today')
 @login_required
+@response_cache.cached(vary=_today)
 def forecast_today():
     try:
         data = _get_forecast_today()
@@ -98,58 +220,46 @@ def forecast_today():
         return jsonify({"forecast": {}, "rain_intensity": "None", "error": str(e)}), 500
 
 #/historic/<period_range>
+# The chart labels of each range are the bucket labels of one rollup table, so
+# a request reads at most a few dozen pre-aggregated rows.
+HISTORIC_ROLLUP = {'day': 'rollup_hour', 'week': 'rollup_day', 'month': 'rollup_week', 'year': 'rollup_week'}
+
+def _get_rollups(conn, table, buckets):
+    """
+    bucket -> {metric: average (0 if the bucket has no value for it),
+               'river': last river level}, combining all sensors.
+    Buckets with no readings at all are left out.
+    """
+    if not buckets:
+        return {}
+    placeholders = ",".join("?" * len(buckets))
+    rows = conn.execute(
+        f"SELECT * FROM {table} WHERE bucket IN ({placeholders})", buckets
+    ).fetchall()
+
+    totals = defaultdict(lambda: defaultdict(float))
+    for r in rows:
+        t = totals[r['bucket']]
+        for m in ROLLUP_METRICS:
+            t[m + '_sum'] += r[m + '_sum']
+            t[m + '_n'] += r[m + '_n']
+        if r['river_last_ts'] is not None and r['river_last_ts'] >= t.get('river_last_ts', -1):
+            t['river_last_ts'] = r['river_last_ts']
+            t['river_last'] = r['river_last']
+
+    agg = {}
+    for bucket, t in totals.items():
+        values = {m: (t[m + '_sum'] / t[m + '_n'] if t[m + '_n'] else 0) for m in ROLLUP_METRICS}
+        values['river'] = t.get('river_last', 0)
+        agg[bucket] = values
+    return agg
+
 @api_bp.route('/historic/<period_range>')
 @login_required
+@response_cache.cached(vary=_this_hour)
 def historic(period_range):
     try:
         now = datetime.now()
-        conn = get_conn()
-        try:
-            if period_range == 'day':
-                since = datetime(now.year, now.month, now.day)
-            elif period_range == 'week':
-                since = now - timedelta(days=6)
-            elif period_range == 'month':
-                since = now - timedelta(days=30)
-            elif period_range == 'year':
-                since = datetime(now.year, 1, 1)
-            else:
-                return jsonify({"error": "Invalid range"}), 400
-
-            rows = conn.execute(
-                "SELECT timestamp, soil, temp, hum, rain, total_daily_rain, river "
-                "FROM sensor_readings "
-                "WHERE timestamp >= ? "
-                "ORDER BY timestamp ASC",
-                (since.strftime('%Y-%m-%d %H:%M:%S'),)
-            ).fetchall()
-        finally:
-            conn.close()
-
-        merged = defaultdict(dict)
-        for r in rows:
-            ts = r['timestamp']
-            merged[ts].update({k: v for k, v in dict(r).items() if v is not None})
-
-        def get_group_key(dt):
-            if period_range == 'day':
-                return dt.strftime('%Y-%m-%d %H:00')
-            elif period_range == 'week':
-                return dt.strftime('%Y-%m-%d')  # group by day
-            elif period_range == 'month':
-                year, week, _ = dt.isocalendar()
-                return f"{year}-W{week:02d}"
-            elif period_range == 'year':
-                year, week, _ = dt.isocalendar()
-                return f"{year}-W{week:02d}"
-
-
-        agg = defaultdict(list)
-        for ts_str, values in merged.items():
-            dt = datetime.strptime(ts_str, '%Y-%m-%d %H:%M:%S')
-            key = get_group_key(dt)
-            agg[key].append(values)
-
         all_periods = []
         if period_range == 'day':
             all_periods = [
@@ -174,18 +284,26 @@ def historic(period_range):
                 week_dt = start_of_year + timedelta(weeks=i)
                 year, week, _ = week_dt.isocalendar()
                 all_periods.append(f"{year}-W{week:02d}")
+        else:
+            return jsonify({"error": "Invalid range"}), 400
+
+        conn = get_conn()
+        try:
+            agg = _get_rollups(conn, HISTORIC_ROLLUP[period_range], all_periods)
+        finally:
+            conn.close()
 
         labels, soil_list, temp_list, hum_list, rain_total_list, rain_max_list, river_list = [], [], [], [], [], [], []
 
         for key in all_periods:
-            group = agg.get(key, [])
+            group = agg.get(key)
             if group:
-                avg_temp = sum(g.get('temp', 0) for g in group) / len(group)
-                avg_hum = sum(g.get('hum', 0) for g in group) / len(group)
-                avg_rain_total = sum(g.get('total_daily_rain', 0) for g in group) / len(group)
-                avg_rain = sum(g.get('rain', 0) for g in group) / len(group)
-                last_river = group[-1].get('river', 0)
-                avg_soil = sum(g.get('soil', 0) for g in group) / len(group)
+                avg_temp = group['temp']
+                avg_hum = group['hum']
+                avg_rain_total = group['total_daily_rain']
+                avg_rain = group['rain']
+                last_river = group['river']
+                avg_soil = group['soil']
             else:
                 avg_temp = avg_hum = avg_rain_total = avg_rain = last_river = avg_soil = "NA"
 
@@ -213,6 +331,76 @@ def historic(period_range):
         print(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
+#/history?start=&end=&points=
+# Any time range, each series LTTB-downsampled to at most `points` points.
+# start/end are epoch milliseconds or ISO 8601 local times; the default is the
+# last 24 hours. The part of a range before the compaction horizon is read
+# from the cold archive; raw_since and missing ([start, end) ranges that were
+# compacted away and never archived) tell that apart from a range with no
+# readings.
+HISTORY_SERIES = ["soil", "temp", "hum", "rain", "total_daily_rain", "river"]
+HISTORY_DEFAULT_POINTS = 500
+HISTORY_MAX_POINTS = 5000
+
+def _parse_time(value):
+    if value.lstrip('-').isdigit():
+        return int(value)
+    return to_epoch_ms(datetime.fromisoformat(value))
+
+@api_bp.route('/history')
+@login_required
+def history():
+    try:
+        try:
+            end = _parse_time(request.args['end']) if request.args.get('end') else to_epoch_ms(datetime.now())
+            start = _parse_time(request.args['start']) if request.args.get('start') else end - 24 * 3600 * 1000
+            points = int(request.args.get('points', HISTORY_DEFAULT_POINTS))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid parameter: {e}"}), 400
+        if start >= end:
+            return jsonify({"error": "start must be before end"}), 400
+        points = max(3, min(points, HISTORY_MAX_POINTS))
+
+        conn = get_conn()
+        try:
+            raw_since = get_raw_since(conn)
+            cold = raw_since is not None and start < raw_since
+            rows = conn.execute(
+                f"SELECT ts, {', '.join(HISTORY_SERIES)} FROM sensor_readings "
+                "WHERE ts >= ? AND ts <= ? ORDER BY ts",
+                (max(start, raw_since) if cold else start, end)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        # NULLs become NaN, so each series is one column of a float matrix
+        data = np.array(rows, dtype=np.float64).reshape(len(rows), len(HISTORY_SERIES) + 1)
+        archived = 0
+        if cold:
+            older = cold_archive.read(start, min(end, raw_since - 1), HISTORY_SERIES)
+            archived = len(older)
+            data = np.concatenate([older, data])
+        ts = data[:, 0]
+        series = downsample_columns(ts, {name: data[:, i + 1] for i, name in enumerate(HISTORY_SERIES)}, points)
+
+        return jsonify({
+            "start": start,
+            "end": end,
+            "points": points,
+            "rows": len(data),
+            "archived_rows": archived,
+            "raw_since": raw_since,
+            "missing": missing_ranges(start, end, raw_since, cold_archive),
+            "series": {
+                name: {"ts": s_ts.astype(np.int64).tolist(), "values": s_values.tolist()}
+                for name, (s_ts, s_values) in series.items()
+            }
+        })
+
+    except Exception as e:
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
 # user def alert levels handling
 @api_bp.route('/alert/params', methods=['GET', 'POST'])
 @login_required
@@ -284,49 +472,134 @@ def set_thresholds_page():
             error=f"Failed to update: {e}"
         ), 500
 
+def _evaluate_alert(latest_data=None, forecast_data=None):
+    """Alert level for the newest readings, today's forecast and the saved thresholds."""
+    latest_data = latest_data if latest_data is not None else _get_latest_data()
+    forecast_data = (forecast_data if forecast_data is not None else _get_forecast_today()) or {}
+
+    return rule_engine.evaluate({
+        "soil": latest_data.get("soil", 0),
+        "river": latest_data.get("river", 0),
+        "rain": latest_data.get("rain", 0),
+        "high_level_alert": latest_data.get("high_level_alert", 0),
+        "forecast": normalize_forecast(forecast_data.get("forecast", {}).get("precip_intensity")),
+    })
+
+# Evaluates on ingest and broadcasts over Wi-Fi on level changes plus a
+# heartbeat; started by create_app() when ALERT_ENGINE_ENABLED (see alert_engine.py)
+alert_engine = AlertEngine(_evaluate_alert, lambda level: send_encrypted_alert_broadcast(level),
+                           _current_data_version)
+
 @api_bp.route('/alert/latest')
 @login_required
+@response_cache.cached(vary=lambda: (_alert_inputs(), alert_engine.revision))
 def latest_alert():
     try:
-        latest_data = _get_latest_data()
-        forecast_data = _get_forecast_today() or {}
-
-        soil = latest_data.get("soil", 0)
-        river = latest_data.get("river", 0)
-        high_level_alert = latest_data.get("high_level_alert", 0)
-        rain_now = latest_data.get("rain", 0)
-        forecast_rain = (forecast_data.get("forecast", {}).get("precip_intensity") or "none").lower()
-
-        T = load_thresholds()
-
-        alert = "None"
-        # High priority
-        if river >= T["High"]["river_max"] \
-                or soil >= T["High"]["soil_min"] and forecast_rain in ["Mid", "High"] \
-                or rain_now >= 5 \
-                or high_level_alert == 1:
-            alert = "High"
-
-        # Mid priority
-        elif river >= T["Mid"]["river_max"] \
-                or (T["Mid"]["soil_min"] <= soil <= T["Mid"]["soil_max"] and forecast_rain in ["Mid", "High"]) \
-                or rain_now >= 3:
-            alert = "Mid"
-
-        # Low priority
-        elif river >= T["Low"]["river_max"] \
-                or (T["Low"]["soil_min"] <= soil <= T["Low"]["soil_max"] and forecast_rain in ["Low", "Mid"]) \
-                or forecast_rain == "Low":
-            alert = "Low"
-
-        # None
-        else:
-            alert = "None"
+        if not alert_engine.running:
+            # No background engine (tests, scripts): evaluate here, but never
+            # broadcast from a request
+            alert_engine.check(broadcast=False)
+        state = alert_engine.state()
+        if state["level"] is None:
+            return jsonify({"level": "No data", "error": state["last_error"]}), 500
+
+        return jsonify({"level": state["level"], "since": state["since"]})
+    except Exception as e:
+        print(traceback.format_exc())
+        return jsonify({"level": "No data", "error": str(e)}), 500
+
+BACKTEST_DEFAULT_DAYS = 30
 
-        #Broadcasts the alert over Wi-Fi
-        send_encrypted_alert_broadcast(alert)
+# How a threshold set would have behaved over stored history (utils/backtest.py).
+# GET uses the saved thresholds; POST takes {"thresholds": {...}} in the same
+# shape as thresholds.json (missing keys fall back to the defaults).
+@api_bp.route('/alert/backtest', methods=['GET', 'POST'])
+@login_required
+def alert_backtest():
+    try:
+        body = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+        args = {**request.args.to_dict(), **{k: v for k, v in body.items() if k != 'thresholds'}}
+        try:
+            end = _parse_time(str(args['end'])) if args.get('end') else to_epoch_ms(datetime.now())
+            start = (_parse_time(str(args['start'])) if args.get('start')
+                     else end - int(float(args.get('days', BACKTEST_DEFAULT_DAYS)) * 86400 * 1000))
+            peak_min = float(args['peak_min']) if args.get('peak_min') not in (None, '') else None
+            thresholds = body.get('thresholds') or rule_engine.thresholds
+            if not isinstance(thresholds, dict):
+                raise ValueError("thresholds must be an object")
+            thresholds = {level: {key: float(value) for key, value in values.items()}
+                          for level, values in thresholds.items()}
+        except (ValueError, TypeError, AttributeError) as e:
+            return jsonify({"error": f"Invalid parameter: {e}"}), 400
+        if start >= end:
+            return jsonify({"error": "start must be before end"}), 400
+
+        conn = get_conn()
+        conn.row_factory = None  # plain tuples convert to arrays much faster
+        try:
+            return jsonify(backtest(conn, thresholds, start, end, peak_min=peak_min, archive=cold_archive))
+        finally:
+            conn.close()
 
-        return jsonify({"level": alert})
     except Exception as e:
         print(traceback.format_exc())
-        return jsonify({"level": "No data", "error": str(e)}), 500
+        return jsonify({"error": str(e)}), 500
+
+#/stream
+# Server-Sent Events: 'reading' (same payload as /latest), 'forecast' (same as
+# /forecast/today) and 'alert' ({"level": ...}, from the alert engine), each
+# sent when it changes.
+# One watcher per process checks data_version every STREAM_POLL_S, so the DB
+# cost does not grow with the number of open dashboards.
+STREAM_POLL_S = 1.0
+STREAM_REFRESH_S = 60.0  # recheck the forecast anyway (date rollover)
+
+event_hub = EventHub()
+_stream_state = {"version": None, "checked": 0.0, "reading": None, "forecast": None}
+
+def _stream_snapshot():
+    return {
+        "reading": _get_latest_data(),
+        "forecast": _get_forecast_today() or {},
+    }
+
+def _stream_alert(level, state):
+    event_hub.publish("alert", {"level": level})
+
+alert_engine.add_listener(_stream_alert)
+
+def _stream_poll(hub):
+    now = datetime.now().timestamp()
+    version = _current_data_version()
+    if version is not None and version == _stream_state["version"] \
+            and now - _stream_state["checked"] < STREAM_REFRESH_S:
+        return
+    _stream_state["version"] = version
+    _stream_state["checked"] = now
+    for name, data in _stream_snapshot().items():
+        if data != _stream_state[name]:
+            _stream_state[name] = data
+            hub.publish(name, data)
+
+@api_bp.route('/stream')
+@login_required
+def stream():
+    last_id = request.headers.get("Last-Event-ID") or None
+
+    event_hub.start_watcher(_stream_poll, STREAM_POLL_S)
+    q, missed = event_hub.subscribe(last_id)
+    if missed is None:
+        # New client, or one we cannot replay for: start from the current state
+        try:
+            snapshot = _stream_snapshot()
+        except Exception:
+            event_hub.unsubscribe(q)
+            print(traceback.format_exc())
+            return jsonify({"error": "stream unavailable"}), 503
+        if not alert_engine.running:
+            alert_engine.check(broadcast=False)
+        snapshot["alert"] = {"level": alert_engine.level or "No data"}
+        missed = [Event(event_hub.last_id, name, data) for name, data in snapshot.items()]
+
+    return Response(event_hub.stream(q, missed), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
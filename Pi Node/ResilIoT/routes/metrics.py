@@ -0,0 +1,53 @@
+import os
+from time import perf_counter
+
+from flask import Blueprint, Response, g, request
+
+import routes.api as api
+from utils.metrics import REGISTRY, CONTENT_TYPE, read_textfile
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# Written by the receiver next to the sensor database (receiver/metrics.py)
+RECEIVER_METRICS_FILE = 'receiver.prom'
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "resiliot_http_request_duration_seconds",
+    "Time to handle a dashboard/API request, by route pattern.",
+    ["route", "method", "status"],
+)
+
+
+@metrics_bp.before_app_request
+def _start_timer():
+    g.metrics_start = perf_counter()
+
+
+@metrics_bp.after_app_request
+def _observe_request(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        # The URL rule, not the path, so /api/historic/<period_range> is one series
+        # and unknown URLs cannot grow the label set
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(perf_counter() - start, route=route,
+                                method=request.method, status=response.status_code)
+    return response
+
+
+def receiver_metrics_path():
+    return os.path.join(os.path.dirname(api.DB_PATH), RECEIVER_METRICS_FILE)
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    # Unauthenticated like any scrape target: counts and timings only, no readings
+    body = REGISTRY.render()
+    text, age = read_textfile(receiver_metrics_path())
+    if text is not None:
+        body += text
+        # Lets alerting tell a stopped receiver from an idle one
+        body += ("# HELP resiliot_receiver_metrics_age_seconds Age of the receiver's metrics snapshot.\n"
+                 "# TYPE resiliot_receiver_metrics_age_seconds gauge\n"
+                 f"resiliot_receiver_metrics_age_seconds {age:.3f}\n")
+    return Response(body, content_type=CONTENT_TYPE)
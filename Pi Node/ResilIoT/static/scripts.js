@@ -76,43 +76,49 @@ function updateGauges(soil, river) {
     if (river !== undefined) riverGauge.set(river);
 }
 
+// Show last sens readings (from /api/latest or a stream 'reading' event)
+function renderLatest(data) {
+    updateGauges(data.soil, data.river);
+    tempEl.textContent = data.temp !== undefined ? data.temp + '°C' : '-';
+    humEl.textContent = data.hum !== undefined ? data.hum + '%' : '-';
+    rainEl.textContent = data.rain ?? '-';
+    rainSince9El.textContent = data.total_rain ?? '-';
+}
+
 // Get last sens readings
 async function fetchLatest() {
     try {
         const res = await fetch('/api/latest');
         if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        const data = await res.json();
-
-        updateGauges(data.soil, data.river);
-        tempEl.textContent = data.temp !== undefined ? data.temp + '°C' : '-';
-        humEl.textContent = data.hum !== undefined ? data.hum + '%' : '-';
-        rainEl.textContent = data.rain ?? '-';
-        rainSince9El.textContent = data.total_rain ?? '-';
+        renderLatest(await res.json());
     } catch (err) {
         console.error("Error fetching latest readings:", err);
         soilEl.textContent = tempEl.textContent = humEl.textContent =
             rainEl.textContent = riverEl.textContent = 'Error';
     }
 }
+function renderForecast(data) {
+    const forecast = data?.forecast || {}; // fallback to empty object
+    // Check if data exists for today
+    if (!data || Object.keys(data).length === 0) {
+        forecastMinEl.textContent = 'No current forecast';
+        forecastMaxEl.textContent = 'No current forecast';
+        forecastRainProbEl.textContent = 'No current forecast';
+        forecastRainIntensityEl.textContent = 'No current forecast';
+        return;
+    }
+
+    forecastMinEl.textContent = `Min temp: ${forecast.min_temp ?? '-'}`;
+    forecastMaxEl.textContent = `Max temp: ${forecast.max_temp ?? '-'}`;
+    forecastRainProbEl.textContent = `Probability of rain: ${forecast.precip_prob != null ? forecast.precip_prob + '%' : '-'}`;
+    forecastRainIntensityEl.textContent = `Intensity of rain: ${forecast.precip_intensity ?? '-'}`;
+}
+
 async function fetchLocalForecast() {
     try {
         const res = await fetch('/api/forecast/today');
         if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        const data = await res.json();
-        const forecast = data.forecast || {}; // fallback to empty object
-        // Check if data exists for today
-        if (!data || Object.keys(data).length === 0) {
-            forecastMinEl.textContent = 'No current forecast';
-            forecastMaxEl.textContent = 'No current forecast';
-            forecastRainProbEl.textContent = 'No current forecast';
-            forecastRainIntensityEl.textContent = 'No current forecast';
-            return;
-        }
-
-        forecastMinEl.textContent = `Min temp: ${forecast.min_temp ?? '-'}`;
-        forecastMaxEl.textContent = `Max temp: ${forecast.max_temp ?? '-'}`;
-        forecastRainProbEl.textContent = `Probability of rain: ${forecast.precip_prob != null ? forecast.precip_prob + '%' : '-'}`;
-        forecastRainIntensityEl.textContent = `Intensity of rain: ${forecast.precip_intensity ?? '-'}`;
+        renderForecast(await res.json());
     } catch (err) {
         console.error("Error fetching local forecast:", err);
         forecastMinEl.textContent = forecastMaxEl.textContent =
@@ -207,19 +213,68 @@ async function updateAllAlerts() {
 }
 
 
-fetchLatest();
-updateChart();
-updateAllAlerts();
-
+function homeVisible() {
+    const main = document.getElementById('main-content');
+    return main && main.dataset.current === 'home.html';
+}
 
-// Refresh 60s
-    setInterval(() => {
-        const main = document.getElementById('main-content');
-        if (main && main.dataset.current === 'home.html') {
+// Polling fallback: refresh every 60s
+function startPolling() {
+    if (window.homePollTimer) return;
+    window.homePollTimer = setInterval(() => {
+        if (homeVisible()) {
             fetchLatest();
             updateChart(currentRange);
             updateAllAlerts();
         }
     }, 60000);
+}
+
+// Live updates over Server-Sent Events; readings arrive as they are stored.
+// The browser reconnects on its own (sending Last-Event-ID); only if the
+// stream cannot be opened at all do we go back to polling.
+const CHART_REFRESH_MS = 60000;
+let lastChartUpdate = Date.now();
+
+function startStream() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    window.homeStream?.close();
+    const stream = new EventSource('/api/stream');
+    window.homeStream = stream;
+
+    stream.addEventListener('reading', e => {
+        if (!homeVisible()) return;
+        renderLatest(JSON.parse(e.data));
+        // The chart's buckets move slowly; don't refetch it for every packet
+        if (Date.now() - lastChartUpdate >= CHART_REFRESH_MS) {
+            lastChartUpdate = Date.now();
+            updateChart(currentRange);
+        }
+    });
+    stream.addEventListener('forecast', e => {
+        if (homeVisible()) renderForecast(JSON.parse(e.data));
+    });
+    stream.addEventListener('alert', e => {
+        if (homeVisible()) alertLevelEl.textContent = JSON.parse(e.data).level ?? 'No data';
+    });
+    stream.onopen = () => {
+        clearInterval(window.homePollTimer);
+        window.homePollTimer = null;
+    };
+    stream.onerror = () => {
+        if (stream.readyState === EventSource.CLOSED) {
+            console.error("Live stream unavailable, falling back to polling");
+            startPolling();
+        }
+    };
+}
+
+fetchLatest();
+updateChart();
+updateAllAlerts();
+startStream();
 
 }
\ No newline at end of file
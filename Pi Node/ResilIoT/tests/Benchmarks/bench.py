@@ -0,0 +1,348 @@
+# Benchmarks for ingest, the dashboard API and alert evaluation against
+# fixture DBs of realistic size.
+#
+#   python "tests/Benchmarks/bench.py" [--sizes 10k,1m,10m] [--out results.json] [--compare old.json]
+#
+# Run from the ResilIoT directory. Fixture DBs are generated once with
+# utils/seeddat.py (a year of data ending now, spread over more nodes as the
+# size grows) into --fixtures and reused while their data is recent.
+#
+# For every size it measures:
+#   ingest     frames/s through the receiver's worker path: decrypt, parse and
+#              write-behind insert (triggers included) of --frames binary frames
+#              from a bench-only node, which is deleted again afterwards
+#   endpoints  latency percentiles of /api/latest, /api/historic/*, /api/history
+#              and /api/alert/latest, with the response cache cleared before
+#              every request ("cold") and left alone ("warm")
+#   alert      _evaluate_alert() on its own (latest rows + forecast + rules)
+#   memory     Python heap peak (tracemalloc, one extra pass per phase, so it
+#              does not slow the timed runs) and the process max RSS so far
+#              (which includes generating a fixture, if this run had to)
+#
+# Results are one JSON document; --compare prints the change of every p50
+# against an earlier run.
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESILIOT = os.path.abspath(os.path.join(HERE, "..", ".."))
+sys.path.insert(0, RESILIOT)
+sys.path.insert(0, os.path.dirname(RESILIOT))  # the receiver package
+
+from receiver.backends import SimulatedBackend
+from receiver.pipeline import RxFrame
+from receiver.service import Receiver
+from receiver.storage import percentile
+from utils.getforecast import FORECAST_SCHEMA
+from utils.seeddat import seed
+
+# name -> (rows, nodes); the cadence follows from a year of data
+SIZES = {
+    "10k": (10_000, 2),
+    "1m": (1_000_000, 4),
+    "10m": (10_000_000, 20),
+}
+SPAN_DAYS = 365
+BENCH_NODE = 250        # ingest frames come from here, so they are easy to remove
+ENDPOINTS = [
+    "/api/latest",
+    "/api/historic/day",
+    "/api/historic/week",
+    "/api/historic/month",
+    "/api/historic/year",
+    "/api/history",
+    "/api/alert/latest",
+]
+
+
+def _rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _summary(samples_ms):
+    s = sorted(samples_ms)
+    return {
+        "n": len(s),
+        "p50_ms": percentile(s, 50),
+        "p95_ms": percentile(s, 95),
+        "p99_ms": percentile(s, 99),
+        "max_ms": s[-1] if s else 0.0,
+    }
+
+
+def _traced(fn):
+    """Peak Python heap (MiB) while fn() runs."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0)
+    finally:
+        tracemalloc.stop()
+
+
+# -----------------------
+# Fixtures
+# -----------------------
+def fixture(name, directory, rebuild=False):
+    """Path of the fixture DB for a size, (re)generated if missing or stale."""
+    rows, nodes = SIZES[name]
+    path = os.path.join(directory, f"fixture_{name}.db")
+    if os.path.exists(path) and not rebuild:
+        conn = sqlite3.connect(path)
+        try:
+            newest = conn.execute("SELECT MAX(ts) FROM sensor_readings").fetchone()[0]
+        finally:
+            conn.close()
+        # The API's ranges are relative to now; older data would leave them empty
+        if newest and newest > (time.time() - 86400) * 1000:
+            return path
+    if os.path.exists(path):
+        os.remove(path)
+
+    cadence_s = max(1, round(SPAN_DAYS * 86400 * nodes / rows))
+    end = datetime.now()
+    print(f"[INFO] Building {path}: {nodes} nodes every {cadence_s}s for {SPAN_DAYS} days", file=sys.stderr)
+    conn = sqlite3.connect(path)
+    try:
+        # Keep stdout for the JSON result
+        with contextlib.redirect_stdout(sys.stderr):
+            seed(conn, nodes, cadence_s, end - timedelta(days=SPAN_DAYS), end, random_seed=0)
+        # A daily forecast matching the weather node's days, as the fetcher would have stored
+        with conn:
+            for stmt in FORECAST_SCHEMA:
+                conn.execute(stmt)
+            conn.execute("""
+                INSERT OR REPLACE INTO forecast (date, min_temp, max_temp, has_precip, precip_prob, precip_intensity)
+                SELECT bucket, temp_sum / temp_n - 4, temp_sum / temp_n + 4, rain_sum > 0,
+                       CASE WHEN rain_sum > 0 THEN 80 ELSE 10 END,
+                       CASE WHEN rain_sum = 0 THEN 'NA' WHEN rain_sum < 2.5 THEN 'Light'
+                            WHEN rain_sum < 7.5 THEN 'Moderate' ELSE 'Heavy' END
+                FROM rollup_day WHERE sensor_id = 2 AND temp_n > 0
+            """)
+    finally:
+        conn.close()
+    return path
+
+
+def _remove_bench_node(path):
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            for table in ("sensor_readings", "latest_readings", "rollup_hour", "rollup_day", "rollup_week"):
+                conn.execute(f"DELETE FROM {table} WHERE sensor_id = ?", (BENCH_NODE,))
+    finally:
+        conn.close()
+
+
+# -----------------------
+# Ingest
+# -----------------------
+def _frames(count):
+    sim = SimulatedBackend(nodes=[BENCH_NODE], binary=True, seed=0)
+    base = time.time()
+    # Distinct receive times, so no row is a duplicate of another
+    return [RxFrame(sim.next_frame(), -80, time.monotonic(), base + i * 0.001) for i in range(count)]
+
+
+def _ingest(path, frames):
+    receiver = Receiver(backend=None, db_path=path, verbose=False)
+    start = time.perf_counter()
+    for frame in frames:
+        receiver.handle_frame(frame)
+    receiver.storage.close()
+    elapsed = time.perf_counter() - start
+    receiver.pipeline.close()
+    return elapsed, receiver.stats()
+
+
+def bench_ingest(path, count):
+    frames = _frames(count)
+    try:
+        elapsed, stats = _ingest(path, frames)
+    finally:
+        _remove_bench_node(path)
+    storage = stats["storage"]
+    try:
+        peak_mb = _traced(lambda: _ingest(path, _frames(min(count, 2000))))
+    finally:
+        _remove_bench_node(path)
+    return {
+        "frames": count,
+        "rows_written": storage["rows_written"],
+        "elapsed_s": elapsed,
+        "frames_per_s": count / elapsed if elapsed else 0.0,
+        "flushes": storage["flushes"],
+        "avg_flush_ms": storage["avg_flush_ms"],
+        "max_flush_ms": storage["max_flush_ms"],
+        "py_peak_mb": peak_mb,
+    }
+
+
+# -----------------------
+# API
+# -----------------------
+def _client(path):
+    os.chdir(RESILIOT)
+    from app import create_app
+    import routes.api as api
+
+    api.DB_PATH = path
+    api.alert_engine.send = lambda level: None  # never broadcast from a benchmark
+    app = create_app({"TESTING": True})
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+    return api, client
+
+
+def _reset_caches(api):
+    api.response_cache.clear()
+    api._clear_forecast_cache()
+
+
+def bench_endpoints(path, requests):
+    api, client = _client(path)
+    results = {}
+    for url in ENDPOINTS:
+        def get():
+            resp = client.get(url)
+            if resp.status_code != 200:
+                raise RuntimeError(f"{url}: HTTP {resp.status_code} {resp.get_data(as_text=True)[:200]}")
+
+        cold = []
+        for _ in range(requests):
+            _reset_caches(api)
+            t0 = time.perf_counter()
+            get()
+            cold.append((time.perf_counter() - t0) * 1000.0)
+        warm = []
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            get()
+            warm.append((time.perf_counter() - t0) * 1000.0)
+
+        _reset_caches(api)
+        results[url] = {"cold": _summary(cold), "warm": _summary(warm), "py_peak_mb": _traced(get)}
+
+    evaluate = []
+    for _ in range(requests):
+        _reset_caches(api)
+        t0 = time.perf_counter()
+        api._evaluate_alert()
+        evaluate.append((time.perf_counter() - t0) * 1000.0)
+    results["_evaluate_alert"] = {"cold": _summary(evaluate)}
+    return results
+
+
+# -----------------------
+# Driver
+# -----------------------
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RESILIOT,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(sizes, fixtures_dir, frames, requests, rebuild=False):
+    os.makedirs(fixtures_dir, exist_ok=True)
+    out = {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "frames": frames,
+            "requests": requests,
+        },
+        "results": {},
+    }
+    for name in sizes:
+        path = fixture(name, fixtures_dir, rebuild)
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0]
+        finally:
+            conn.close()
+        print(f"[INFO] {name}: {rows} rows", file=sys.stderr)
+        result = {"rows": rows, "db_mb": os.path.getsize(path) / (1024.0 * 1024.0)}
+        result["ingest"] = bench_ingest(path, frames)
+        result["endpoints"] = bench_endpoints(path, requests)
+        result["max_rss_mb"] = _rss_mb()
+        out["results"][name] = result
+    return out
+
+
+def compare(old, new):
+    """Lines with the p50 change of every measurement both runs have."""
+    lines = []
+    for size, result in new["results"].items():
+        before = old.get("results", {}).get(size)
+        if not before:
+            continue
+        a, b = before["ingest"]["frames_per_s"], result["ingest"]["frames_per_s"]
+        lines.append(f"{size:>4} ingest {a:10.0f} -> {b:10.0f} frames/s ({(b - a) / a * 100 if a else 0:+.1f}%)")
+        for url, r in result["endpoints"].items():
+            for mode, summary in r.items():
+                if not isinstance(summary, dict) or mode not in before["endpoints"].get(url, {}):
+                    continue
+                a, b = before["endpoints"][url][mode]["p50_ms"], summary["p50_ms"]
+                lines.append(f"{size:>4} {url:<22} {mode:<4} p50 {a:8.2f} -> {b:8.2f} ms "
+                             f"({(b - a) / a * 100 if a else 0:+.1f}%)")
+    return lines
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="ResilIoT ingest / API benchmarks")
+    p.add_argument("--sizes", default=",".join(SIZES), help="comma separated, from: " + ", ".join(SIZES))
+    p.add_argument("--fixtures", default=os.path.join(tempfile.gettempdir(), "resiliot-bench"),
+                   help="directory for the fixture DBs (default %(default)s)")
+    p.add_argument("--rebuild", action="store_true", help="regenerate the fixture DBs")
+    p.add_argument("--frames", type=int, default=5000, help="frames per ingest run")
+    p.add_argument("--requests", type=int, default=30, help="requests per endpoint and mode")
+    p.add_argument("--out", help="write the JSON here instead of stdout")
+    p.add_argument("--compare", help="earlier JSON result to compare p50s against")
+    args = p.parse_args(argv)
+
+    sizes = [s for s in args.sizes.split(",") if s]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        p.error(f"unknown size(s): {', '.join(unknown)}")
+    if shutil.disk_usage(os.path.dirname(os.path.abspath(args.fixtures)) or ".").free < 2 * 1024 ** 3 \
+            and "10m" in sizes:
+        print("[WARN] Less than 2 GB free; the 10m fixture may not fit", file=sys.stderr)
+
+    result = run(sizes, args.fixtures, args.frames, args.requests, args.rebuild)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        for line in compare(old, result):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,7 +20,7 @@ def test_client():
     # Create sensor_readings + forecast tables
     cursor.execute("""
         CREATE TABLE sensor_readings (
-            timestamp TEXT,
+            ts INTEGER,
             soil REAL,
             temp REAL,
             hum REAL,
@@ -69,8 +69,8 @@ def test_full_sensor_to_alert_flow(test_client):
 
     # Step 1: simulate river sensor, writes to DB
     cursor.execute(
-        "INSERT INTO sensor_readings (timestamp, river, sensor_id) VALUES (?, ?, ?)",
-        (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 350, 3)
+        "INSERT INTO sensor_readings (ts, river, sensor_id) VALUES (?, ?, ?)",
+        (int(datetime.now().timestamp() * 1000), 350, 3)
     )
     conn.commit()
 
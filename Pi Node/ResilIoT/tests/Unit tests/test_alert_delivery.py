@@ -0,0 +1,97 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+from alert_sender import AlertSender, NonceCounter, WIFI_CHACHA_KEY
+from alert_delivery import DeliveryScheduler, encrypt_ack
+
+
+class FakeNode(asyncio.DatagramProtocol):
+    """ Local UDP stand-in for a PMMAS / Defence node that loses the first `drop` alerts. """
+
+    def __init__(self, device_id, drop=0, ack=True):
+        self.device_id = device_id
+        self.drop = drop
+        self.ack = ack
+        self.received = []
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        text = ChaCha20Poly1305(WIFI_CHACHA_KEY).decrypt(data[:12], data[12:], None).decode()
+        level, device_id, seq = text.split(";")
+        if int(device_id) != self.device_id:
+            return
+        self.received.append((level, int(seq)))
+        if self.drop:
+            self.drop -= 1
+            return
+        if self.ack:
+            self.transport.sendto(encrypt_ack(self.device_id, int(seq)), addr)
+
+
+class DeliverySchedulerTestCase(unittest.TestCase):
+    """ Alerts are retransmitted with backoff until each device acks. """
+
+    def _run(self, coro):
+        return asyncio.run(coro)
+
+    async def _setup(self, nodes, **kwargs):
+        loop = asyncio.get_running_loop()
+        devices = {}
+        for node in nodes:
+            transport, _ = await loop.create_datagram_endpoint(lambda n=node: n, local_addr=("127.0.0.1", 0))
+            devices[node.device_id] = transport.get_extra_info("sockname")
+        counter = NonceCounter(os.path.join(tempfile.mkdtemp(), "counter"))
+        sender = AlertSender(interfaces=(), counter=counter)
+        scheduler = DeliveryScheduler(devices, sender=sender, ack_port=0, bind_host="127.0.0.1",
+                                      retry_base_s=0.02, retry_max_s=0.1, **kwargs)
+        return await scheduler.start()
+
+    def test_acked_first_time(self):
+        async def run():
+            node = FakeNode(16)
+            scheduler = await self._setup([node])
+            result = await scheduler.send_alert("High")
+            scheduler.close()
+            return node, scheduler, result
+        node, scheduler, result = self._run(run())
+        self.assertIsNotNone(result[16])
+        self.assertEqual(len(node.received), 1)
+        self.assertEqual(scheduler.stats[16].acked, 1)
+
+    def test_retransmits_after_loss(self):
+        async def run():
+            lossy, good = FakeNode(16, drop=3), FakeNode(32)
+            scheduler = await self._setup([lossy, good])
+            result = await scheduler.send_alert("Mid")
+            scheduler.close()
+            return lossy, scheduler, result
+        lossy, scheduler, result = self._run(run())
+        self.assertEqual(len(lossy.received), 4)
+        self.assertEqual(len({seq for _, seq in lossy.received}), 1)  # same alert each time
+        self.assertEqual(scheduler.stats[16].retransmits, 3)
+        self.assertEqual(scheduler.stats[32].retransmits, 0)
+        # backoff 20 + 40 + 80 ms before the 4th copy
+        self.assertGreaterEqual(result[16], 100)
+
+    def test_gives_up(self):
+        async def run():
+            node = FakeNode(16, ack=False)
+            scheduler = await self._setup([node], max_attempts=3)
+            result = await scheduler.send_alert("High")
+            scheduler.close()
+            return node, scheduler, result
+        node, scheduler, result = self._run(run())
+        self.assertIsNone(result[16])
+        self.assertEqual(len(node.received), 3)
+        self.assertEqual(scheduler.stats[16].failed, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
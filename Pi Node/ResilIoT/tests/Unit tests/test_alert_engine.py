@@ -0,0 +1,74 @@
+import unittest
+from unittest.mock import patch
+
+from alert_engine import AlertEngine
+
+
+class AlertEngineTestCase(unittest.TestCase):
+    """ Levels are evaluated on new data and broadcast on change plus heartbeat. """
+
+    def setUp(self):
+        self.version = 1
+        self.level = "None"
+        self.evaluations = 0
+        self.sent = []
+        self.engine = AlertEngine(self._evaluate, self.sent.append, lambda: self.version,
+                                  refresh_s=60, heartbeat_s=300)
+
+    def _evaluate(self):
+        self.evaluations += 1
+        return self.level
+
+    def test_evaluates_only_on_new_data(self):
+        self.engine.check()
+        self.engine.check()
+        self.assertEqual(self.evaluations, 1)
+        self.version = 2
+        self.engine.check()
+        self.assertEqual(self.evaluations, 2)
+
+    def test_broadcasts_on_change_only(self):
+        self.engine.check()
+        self.version = 2
+        self.engine.check()
+        self.assertEqual(self.sent, ["None"])
+
+        self.level = "High"
+        self.version = 3
+        self.assertEqual(self.engine.check(), "High")
+        self.assertEqual(self.sent, ["None", "High"])
+        self.assertEqual(self.engine.state()["revision"], 2)
+
+    def test_check_without_broadcast(self):
+        self.level = "High"
+        self.assertEqual(self.engine.check(broadcast=False), "High")
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.engine.state()["level"], "High")
+
+    def test_heartbeat_repeats_level(self):
+        with patch("alert_engine.monotonic", return_value=1000.0):
+            self.engine.check()
+        with patch("alert_engine.monotonic", return_value=1200.0):
+            self.engine.check()
+        with patch("alert_engine.monotonic", return_value=1301.0):
+            self.engine.check()
+        self.assertEqual(self.sent, ["None", "None"])
+
+    def test_listener_called_on_change(self):
+        seen = []
+        self.engine.add_listener(lambda level, state: seen.append(level))
+        self.engine.check()
+        self.version = 2
+        self.engine.check()
+        self.assertEqual(seen, ["None"])
+
+    def test_evaluation_error_keeps_last_level(self):
+        self.engine.check()
+        self.engine.evaluate = lambda: 1 / 0
+        self.version = 2
+        self.assertEqual(self.engine.check(), "None")
+        self.assertEqual(self.engine.state()["errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
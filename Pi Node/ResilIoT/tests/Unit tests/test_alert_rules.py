@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from utils.alert_rules import LEVELS, CompiledRules, RuleEngine, normalize_forecast
+from utils.params_helper import DEFAULT_THRESHOLDS
+
+THRESHOLDS = {
+    "Low": {"river_max": 1.0, "soil_min": 20, "soil_max": 80},
+    "Mid": {"river_max": 1.5, "soil_min": 15, "soil_max": 85, "rain_thresh": 2.0},
+    "High": {"river_max": 2.0, "soil_min": 90, "soil_max": 100, "rain_thresh": 4.0},
+}
+
+
+def reading(**values):
+    r = {"soil": 0, "river": 0, "rain": 0, "high_level_alert": 0, "forecast": "none"}
+    r.update(values)
+    return r
+
+
+class CompiledRulesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = CompiledRules(THRESHOLDS)
+
+    def test_river_levels(self):
+        self.assertEqual(self.rules.evaluate_rows([
+            reading(river=0.5), reading(river=1.0), reading(river=1.6), reading(river=2.0),
+        ]), ["None", "Low", "Mid", "High"])
+
+    def test_rain_uses_configured_thresholds(self):
+        self.assertEqual(self.rules.evaluate(reading(rain=2.5)), "Mid")
+        self.assertEqual(self.rules.evaluate(reading(rain=4.0)), "High")
+
+    def test_forecast_intensity_matches(self):
+        self.assertEqual(normalize_forecast("Moderate"), "mid")
+        self.assertEqual(normalize_forecast(None), "none")
+        self.assertEqual(self.rules.evaluate(reading(soil=50, forecast=normalize_forecast("Moderate"))), "Mid")
+        self.assertEqual(self.rules.evaluate(reading(soil=95, forecast=normalize_forecast("Heavy"))), "High")
+        self.assertEqual(self.rules.evaluate(reading(forecast=normalize_forecast("Light"))), "Low")
+
+    def test_high_water_switch(self):
+        self.assertEqual(self.rules.evaluate(reading(high_level_alert=1)), "High")
+
+    def test_missing_values_count_as_zero(self):
+        self.assertEqual(self.rules.evaluate({"river": None}), "None")
+
+    def test_columns_match_rows(self):
+        rng = np.random.default_rng(0)
+        n = 2000
+        columns = {
+            "soil": rng.uniform(0, 100, n),
+            "river": rng.uniform(0, 2.5, n),
+            "rain": rng.uniform(0, 5, n),
+            "high_level_alert": (rng.random(n) < 0.05).astype(float),
+            "forecast": rng.choice(np.array(["none", "low", "mid", "high"], dtype=object), n),
+        }
+        columns["river"][::5] = np.nan
+        rows = [{k: (None if isinstance(v[i], float) and np.isnan(v[i]) else v[i]) for k, v in columns.items()}
+                for i in range(n)]
+        levels = [LEVELS[i] for i in self.rules.evaluate_columns(columns)]
+        self.assertEqual(levels, self.rules.evaluate_rows(rows))
+
+
+class RuleEngineTestCase(unittest.TestCase):
+    """ Thresholds are compiled once and reloaded only when the file changes. """
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "thresholds.json")
+
+    def _write(self, thresholds, mtime):
+        with open(self.path, "w") as f:
+            json.dump(thresholds, f)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_reload_on_mtime_change(self):
+        self._write(THRESHOLDS, 1000)
+        engine = RuleEngine(self.path)
+        self.assertEqual(engine.evaluate(reading(river=1.2)), "Low")
+        engine.evaluate(reading())
+        self.assertEqual(engine.reloads, 1)
+
+        changed = json.loads(json.dumps(THRESHOLDS))
+        changed["Mid"]["river_max"] = 1.1
+        self._write(changed, 2000)
+        self.assertEqual(engine.evaluate(reading(river=1.2)), "Mid")
+        self.assertEqual(engine.reloads, 2)
+
+    def test_defaults_without_file(self):
+        engine = RuleEngine(self.path)
+        self.assertEqual(engine.evaluate(reading(river=DEFAULT_THRESHOLDS["Mid"]["river_max"])), "Mid")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import socket
+import tempfile
+import unittest
+
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+import alert_sender
+from alert_sender import AlertSender, NonceCounter, WIFI_CHACHA_KEY
+
+
+class NonceCounterTestCase(unittest.TestCase):
+    """ Counters come from blocks; only the high-water mark is written to disk. """
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "counter")
+        with open(self.path, "wb") as f:
+            f.write((1000).to_bytes(8, "big"))
+
+    def test_one_write_per_block(self):
+        counter = NonceCounter(self.path, block=10)
+        values = [counter.take() for _ in range(25)]
+        self.assertEqual(values, list(range(1000, 1025)))
+        self.assertEqual(counter.reservations, 3)
+        self.assertEqual(alert_sender._read_counter_from_file(self.path), 1030)
+
+    def test_restart_skips_reserved_block(self):
+        first = NonceCounter(self.path, block=10)
+        used = [first.take() for _ in range(3)]
+        # "crash": a new counter must start above everything the first one could hand out
+        second = NonceCounter(self.path, block=10)
+        self.assertGreater(second.take(), max(used) + 7)
+
+    def test_take_many_is_consecutive(self):
+        counter = NonceCounter(self.path, block=4)
+        self.assertEqual(counter.take(6), 1000)
+        self.assertEqual(counter.take(), 1006)
+
+
+class AlertSenderTestCase(unittest.TestCase):
+    """ Packets decrypt with the Wi-Fi key and reuse one socket per interface. """
+
+    def setUp(self):
+        self.rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.rx.bind(("127.0.0.1", 0))
+        self.rx.settimeout(1.0)
+        counter = NonceCounter(os.path.join(tempfile.mkdtemp(), "counter"), block=8)
+        self.sender = AlertSender(interfaces=("",), addr="127.0.0.1",
+                                  port=self.rx.getsockname()[1], counter=counter)
+
+    def tearDown(self):
+        self.sender.close()
+        self.rx.close()
+
+    def _recv(self):
+        packet = self.rx.recv(256)
+        return packet, ChaCha20Poly1305(WIFI_CHACHA_KEY).decrypt(packet[:12], packet[12:], None).decode()
+
+    def test_send_and_repeat(self):
+        self.sender.send("High", repeat=3)
+        packets = [self._recv() for _ in range(3)]
+        self.assertEqual({p[1] for p in packets}, {"High"})
+        self.assertEqual(len({p[0] for p in packets}), 1)  # identical copies
+        self.assertEqual(self.sender.stats["sockets_opened"], 1)
+
+    def test_burst_uses_distinct_nonces(self):
+        self.sender.send_burst(["Low", "Mid", "High"])
+        self.sender.send("None")
+        packets = [self._recv() for _ in range(4)]
+        self.assertEqual([p[1] for p in packets], ["Low", "Mid", "High", "None"])
+        self.assertEqual(len({p[0][:12] for p in packets}), 4)
+        self.assertEqual(self.sender.stats["sockets_opened"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
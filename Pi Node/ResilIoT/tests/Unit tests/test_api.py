@@ -1,6 +1,7 @@
 import unittest
 from unittest.mock import patch
 import sqlite3
+import tempfile
 from datetime import datetime
 
 
@@ -13,13 +14,34 @@ patch_login.start()
 in_memory_conn = sqlite3.connect(":memory:")
 in_memory_conn.row_factory = sqlite3.Row
 
+
+class _SharedConn:
+    """The routes close their connection after each request; keep the shared one open."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name == "_conn":
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def close(self):
+        pass
+
+
 # Patch routes.api.sqlite3.connect to always return the in-memory DB
-patch_db = patch("routes.api.sqlite3.connect", return_value=in_memory_conn)
+patch_db = patch("routes.api.sqlite3.connect", return_value=_SharedConn(in_memory_conn))
 patch_db.start()
 
 
 from app import create_app
 import routes.api
+from utils.archive import Archive
 
 
 class DashboardApiTestCase(unittest.TestCase):
@@ -28,8 +50,8 @@ class DashboardApiTestCase(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """Run once for the test suite: create Flask client and DB schema."""
-        cls.app = create_app()
-        cls.app.config['TESTING'] = True
+        # TESTING skips DB initialisation; the alert engine is opt-in and stays off
+        cls.app = create_app({"TESTING": True})
         cls.client = cls.app.test_client()
 
         # Use shared in-memory DB
@@ -57,12 +79,19 @@ class DashboardApiTestCase(unittest.TestCase):
         patch_login.stop()
         patch_db.stop()
 
+    def setUp(self):
+        """Each test starts from empty tables."""
+        self.cursor.execute("DELETE FROM sensor_readings")
+        self.cursor.execute("DELETE FROM forecast")
+        self.conn.commit()
+        routes.api._clear_forecast_cache()
+
     @classmethod
     def _create_tables_static(cls):
         """Create DB tables used by the API."""
         cls.cursor.execute("""
             CREATE TABLE IF NOT EXISTS sensor_readings (
-                timestamp TEXT,
+                ts INTEGER,
                 sensor_id INTEGER,
                 soil REAL,
                 temp REAL,
@@ -109,6 +138,61 @@ class DashboardApiTestCase(unittest.TestCase):
         response = self.client.get("/api/forecast/today")
         self.assertEqual(response.status_code, 404)
 
+    def test_forecast_today(self):
+        """
+        GET /api/forecast/today with today's row stored.
+        Expected: returns 200 with the stored intensity.
+        """
+        self.cursor.execute(
+            "INSERT INTO forecast VALUES (?, 5, 12, 1, 80, 'Moderate')",
+            (datetime.now().strftime("%Y-%m-%d"),)
+        )
+        self.conn.commit()
+
+        response = self.client.get("/api/forecast/today")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["forecast"]["precip_intensity"], "Moderate")
+
+    def test_forecast_follows_data_version(self):
+        """
+        GET /api/forecast/today after a new fetch is stored and the data version bumped.
+        Expected: returns the new row, not the cached one.
+        """
+        today = datetime.now().strftime("%Y-%m-%d")
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS data_version (id INTEGER PRIMARY KEY, version INTEGER)")
+        self.cursor.execute("INSERT OR REPLACE INTO data_version VALUES (1, 1)")
+        self.cursor.execute("INSERT INTO forecast VALUES (?, 5, 12, 1, 80, 'Moderate')", (today,))
+        self.conn.commit()
+        self.assertEqual(self.client.get("/api/forecast/today").get_json()["forecast"]["precip_intensity"],
+                         "Moderate")
+
+        self.cursor.execute("UPDATE forecast SET precip_intensity = 'Heavy' WHERE date = ?", (today,))
+        self.cursor.execute("UPDATE data_version SET version = 2")
+        self.conn.commit()
+        try:
+            response = self.client.get("/api/forecast/today")
+            self.assertEqual(response.get_json()["forecast"]["precip_intensity"], "Heavy")
+        finally:
+            self.cursor.execute("DROP TABLE data_version")
+            self.conn.commit()
+
+    def test_history_reports_compacted_range(self):
+        """
+        GET /api/history over a range compacted without an archive.
+        Expected: no rows, and the compacted part listed as missing.
+        """
+        self.cursor.execute("CREATE TABLE retention (id INTEGER PRIMARY KEY, raw_since INTEGER NOT NULL)")
+        self.cursor.execute("INSERT INTO retention VALUES (1, 5000)")
+        self.cursor.execute("INSERT INTO sensor_readings (ts, sensor_id, river) VALUES (6000, 3, 1.5)")
+        self.conn.commit()
+        try:
+            with tempfile.TemporaryDirectory() as empty, patch("routes.api.cold_archive", Archive(empty)):
+                data = self.client.get("/api/history?start=1000&end=9000").get_json()
+        finally:
+            self.cursor.execute("DROP TABLE retention")
+            self.conn.commit()
+        self.assertEqual((data["rows"], data["raw_since"], data["missing"]), (1, 5000, [[1000, 5000]]))
+
     def test_alert_latest_high(self):
         """
         GET /api/alert/latest after inserting a high river reading.
@@ -116,8 +200,8 @@ class DashboardApiTestCase(unittest.TestCase):
         """
         # Insert high river reading
         self.cursor.execute(
-            "INSERT INTO sensor_readings (timestamp, sensor_id, river) VALUES (?, ?, ?)",
-            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 3, 999)
+            "INSERT INTO sensor_readings (ts, sensor_id, river) VALUES (?, ?, ?)",
+            (int(datetime.now().timestamp() * 1000), 3, 999)
         )
         self.conn.commit()
 
@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from utils.archive import Archive, VALUE_COLUMNS, missing_ranges
+from utils.backtest import backtest, load_columns
+from utils.compact import compact
+from utils.db_helpers import init_sensor_db, to_epoch_ms
+from utils.seeddat import seed
+
+
+class ArchiveTestCase(unittest.TestCase):
+    """ Closed months go to per-column .npy files and are read back in place of compacted rows. """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.conn = sqlite3.connect(os.path.join(self.tmp.name, "sensor_data.db"))
+        init_sensor_db(self.conn)
+        seed(self.conn, nodes=2, cadence_s=900, start=datetime(2025, 1, 1), end=datetime(2025, 3, 20),
+             random_seed=3, append=True)
+        self.archive = Archive(os.path.join(self.tmp.name, "archive"))
+        self.march = to_epoch_ms(datetime(2025, 3, 1))
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def _sql(self, start, end, columns, sensor_id=None):
+        where = " AND sensor_id = ?" if sensor_id is not None else ""
+        params = (start, end) + ((sensor_id,) if sensor_id is not None else ())
+        rows = self.conn.execute(
+            f"SELECT ts, {', '.join(columns)} FROM sensor_readings WHERE ts >= ? AND ts <= ?{where} "
+            "ORDER BY ts, sensor_id", params
+        ).fetchall()
+        return np.array(rows, dtype=np.float64).reshape(len(rows), len(columns) + 1)
+
+    def test_manifest_stats(self):
+        written = self.archive.archive_closed_months(self.conn, before=self.march)
+        self.assertEqual([e["month"] for e in written], ["2025-01", "2025-02"])
+        self.assertEqual(self.archive.archive_closed_months(self.conn, before=self.march), [])
+
+        jan = self.archive.manifest()[0]
+        n, lo, hi, river_min, river_max = self.conn.execute(
+            "SELECT COUNT(*), MIN(ts), MAX(ts), MIN(river), MAX(river) FROM sensor_readings WHERE ts < ?",
+            (jan["end_ts"],)
+        ).fetchone()
+        self.assertEqual((jan["rows"], jan["min_ts"], jan["max_ts"]), (n, lo, hi))
+        self.assertEqual((jan["stats"]["river"]["min"], jan["stats"]["river"]["max"]), (river_min, river_max))
+        self.assertEqual(jan["sensors"], [2, 3])
+
+    def test_partly_compacted_month_is_never_written(self):
+        jan = to_epoch_ms(datetime(2025, 1, 1))
+        self.archive.archive_closed_months(self.conn, before=self.march)
+        rows = self.archive.manifest()[0]["rows"]
+        # Compacted past mid-January: a forced rewrite must not shrink the archive
+        compact(self.conn, to_epoch_ms(datetime(2025, 1, 15)), pause_s=0)
+        self.assertEqual([e["month"] for e in self.archive.archive_closed_months(
+            self.conn, before=self.march, force=True)], ["2025-02"])
+        self.assertEqual(self.archive.manifest()[0]["rows"], rows)
+        with self.assertRaises(ValueError):
+            self.archive.write_month(self.conn, jan)
+
+        # A month compacted without --archive is not archived from its remains
+        other = Archive(os.path.join(self.tmp.name, "other"))
+        self.assertEqual([e["month"] for e in other.archive_closed_months(self.conn, before=self.march)],
+                         ["2025-02"])
+
+    def test_read_matches_database(self):
+        self.archive.archive_closed_months(self.conn, before=self.march)
+        start, end = to_epoch_ms(datetime(2025, 1, 20, 13)), to_epoch_ms(datetime(2025, 2, 10))
+        np.testing.assert_array_equal(self.archive.read(start, end, VALUE_COLUMNS), self._sql(start, end, VALUE_COLUMNS))
+        np.testing.assert_array_equal(self.archive.read(start, end, ["river"], sensor_id=3),
+                                      self._sql(start, end, ["river"], sensor_id=3))
+        self.assertEqual(len(self.archive.read(self.march, self.march + 10 ** 9, ["river"])), 0)
+
+    def test_columns_are_mapped_and_cache_is_bounded(self):
+        self.archive.archive_closed_months(self.conn, before=self.march)
+        jan, feb = self.archive.manifest()
+        self.assertEqual(sorted(os.listdir(os.path.join(self.archive.directory, jan["dir"]))),
+                         sorted(c + ".npy" for c in ["ts", "sensor_id"] + VALUE_COLUMNS))
+        self.assertIsInstance(self.archive._columns(jan, ["river"])["river"], np.memmap)
+
+        # Room for one month's ts, sensor_id and river: reading February evicts January
+        bounded = Archive(self.archive.directory, cache_bytes=jan["rows"] * 20)
+        bounded.read(jan["min_ts"], feb["max_ts"], ["river"])
+        self.assertEqual(list(bounded._cache), [feb["dir"]])
+        self.assertLessEqual(bounded._cached_bytes, feb["rows"] * 20)
+
+    def test_compacted_history_reads_from_archive(self):
+        start, end = to_epoch_ms(datetime(2025, 1, 15, 6)), to_epoch_ms(datetime(2025, 3, 10))
+        before_ts, before_cols = load_columns(self.conn, start, end)
+
+        self.archive.archive_closed_months(self.conn, before=self.march)
+        compact(self.conn, self.march, pause_s=0)
+        self.assertGreater(self.conn.execute("SELECT MIN(ts) FROM sensor_readings").fetchone()[0], start)
+
+        ts, cols = load_columns(self.conn, start, end, archive=self.archive)
+        np.testing.assert_array_equal(ts, before_ts)
+        for field, values in before_cols.items():
+            np.testing.assert_array_equal(cols[field], values)
+
+
+    def test_compacted_without_archive_is_reported_missing(self):
+        jan, feb = to_epoch_ms(datetime(2025, 1, 1)), to_epoch_ms(datetime(2025, 2, 1))
+        horizon = to_epoch_ms(datetime(2025, 2, 10))
+        self.assertEqual(missing_ranges(jan, self.march, None, self.archive), [])
+        self.archive.write_month(self.conn, jan)
+        compact(self.conn, horizon, pause_s=0)
+        # January is archived, February up to the horizon is gone
+        self.assertEqual(missing_ranges(jan, self.march, horizon, self.archive), [[feb, horizon]])
+        self.assertEqual(missing_ranges(jan, self.march, horizon), [[jan, horizon]])
+        self.assertEqual(missing_ranges(horizon, self.march, horizon, self.archive), [])
+
+        thresholds = {"Low": {"river_max": 100, "soil_min": 0, "soil_max": 100}}
+        result = backtest(self.conn, thresholds, jan, self.march, archive=self.archive)
+        self.assertEqual((result["raw_since"], result["missing"]), (horizon, [[feb, horizon]]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import sqlite3
+
+from utils.backtest import backtest
+from utils.db_helpers import init_sensor_db
+
+THRESHOLDS = {
+    "Low": {"river_max": 1.0, "soil_min": 20, "soil_max": 80},
+    "Mid": {"river_max": 1.5, "soil_min": 15, "soil_max": 85, "rain_thresh": 2.0},
+    "High": {"river_max": 2.0, "soil_min": 90, "soil_max": 100, "rain_thresh": 4.0},
+}
+MIN = 60 * 1000
+
+
+class BacktestTestCase(unittest.TestCase):
+    """ A threshold set replayed over stored readings. """
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        init_sensor_db(self.conn)
+        # Soil node reports dry soil throughout; river rises to 2.2 and falls back
+        river = [0.5, 0.8, 1.0, 1.2, 1.6, 2.2, 1.8, 1.1, 0.7, 0.5]
+        for i, level in enumerate(river):
+            self.conn.execute("INSERT INTO sensor_readings (ts, sensor_id, river) VALUES (?, 3, ?)",
+                              (i * 10 * MIN, level))
+            self.conn.execute("INSERT INTO sensor_readings (ts, sensor_id, soil, rain) VALUES (?, 2, 5, 0)",
+                              (i * 10 * MIN + MIN, ))
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_time_in_level_and_transitions(self):
+        result = backtest(self.conn, THRESHOLDS, 0, 100 * MIN)
+        seconds = {level: v["seconds"] for level, v in result["time_in_level"].items()}
+        self.assertEqual(seconds, {"None": 2400.0, "Low": 1800.0, "Mid": 1200.0, "High": 600.0})
+        self.assertAlmostEqual(sum(v["fraction"] for v in result["time_in_level"].values()), 1.0)
+        self.assertEqual(result["transitions"]["total"], 6)
+        self.assertEqual(result["transitions"]["into"], {"None": 1, "Low": 2, "Mid": 2, "High": 1})
+
+    def test_lead_time_before_peak(self):
+        result = backtest(self.conn, THRESHOLDS, 0, 100 * MIN)
+        self.assertEqual(len(result["peaks"]), 1)
+        peak = result["peaks"][0]
+        self.assertEqual((peak["ts"], peak["river"], peak["level"]), (50 * MIN, 2.2, "High"))
+        self.assertEqual(peak["lead_s"], {"Low": 1800.0, "Mid": 600.0, "High": 0.0})
+        self.assertEqual(result["lead_time"]["Low"]["caught"], 1)
+
+    def test_stricter_thresholds_miss_the_peak(self):
+        strict = {level: dict(v, river_max=3.0) for level, v in THRESHOLDS.items()}
+        result = backtest(self.conn, strict, 0, 100 * MIN, peak_min=2.0)
+        self.assertEqual(result["time_in_level"]["None"]["seconds"], 6000.0)
+        self.assertEqual(result["lead_time"]["Low"], {
+            "caught": 0, "missed": 1, "min_s": None, "median_s": None, "max_s": None,
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+
+from utils.archive import Archive
+from utils.compact import compact, reclaim, run, week_start
+from utils.db_helpers import init_sensor_db, rebuild_rollups, get_raw_since, to_epoch_ms, from_epoch_ms
+from utils.seeddat import seed
+
+ROLLUP_TOTALS = "SELECT SUM(n), ROUND(SUM(river_sum), 6), SUM(soil_n) FROM rollup_{}"
+
+
+class CompactTestCase(unittest.TestCase):
+    """ Old raw readings are folded into the rollups, deleted in batches and their pages freed. """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "sensor_data.db")
+        self.conn = sqlite3.connect(self.db_path)
+        init_sensor_db(self.conn)
+        seed(self.conn, nodes=2, cadence_s=600, start=datetime(2025, 1, 1), end=datetime(2025, 3, 1),
+             random_seed=1, append=True)
+        self.totals = self._totals()
+        self.rows = self.conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0]
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def _totals(self):
+        return {grain: self.conn.execute(ROLLUP_TOTALS.format(grain)).fetchone() for grain in ("hour", "day", "week")}
+
+    def test_cutoff_is_a_week_start(self):
+        start = from_epoch_ms(week_start(to_epoch_ms(datetime(2025, 2, 6, 15, 30))))
+        self.assertEqual(start, datetime(2025, 2, 3))
+
+    def test_compact_keeps_rollups(self):
+        result = compact(self.conn, to_epoch_ms(datetime(2025, 2, 6)), batch=500, pause_s=0)
+        cutoff = to_epoch_ms(datetime(2025, 2, 3))
+        self.assertEqual(result["raw_since"], cutoff)
+        self.assertGreater(result["batches"], result["weeks"])
+
+        oldest, remaining = self.conn.execute("SELECT MIN(ts), COUNT(*) FROM sensor_readings").fetchone()
+        self.assertGreaterEqual(oldest, cutoff)
+        self.assertEqual(remaining + result["rows_deleted"], self.rows)
+        self.assertEqual(self._totals(), self.totals)
+
+        # A rebuild after compaction must not lose the compacted buckets
+        rebuild_rollups(self.conn)
+        self.assertEqual(self._totals(), self.totals)
+
+        space = reclaim(self.conn, pause_s=0)
+        self.assertTrue(space["incremental_vacuum"])
+        self.assertGreater(space["bytes_reclaimed"], 0)
+        self.assertEqual(space["bytes_free"], 0)
+
+    def test_backs_off_while_receiver_holds_the_lock(self):
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        locked = threading.Event()
+
+        def receiver_flush():
+            other = sqlite3.connect(self.db_path)
+            other.execute("BEGIN IMMEDIATE")
+            locked.set()
+            time.sleep(0.3)
+            other.rollback()
+            other.close()
+
+        conn = sqlite3.connect(self.db_path, timeout=0.02)
+        writer = threading.Thread(target=receiver_flush)
+        writer.start()
+        locked.wait()
+        result = compact(conn, to_epoch_ms(datetime(2025, 2, 6)), pause_s=0.01)
+        writer.join()
+        conn.close()
+        self.assertEqual(result["raw_since"], to_epoch_ms(datetime(2025, 2, 3)))
+        self.assertEqual(self._totals(), self.totals)
+
+    def test_resumes_interrupted_deletes(self):
+        # Week folded and horizon moved, but the run stopped before deleting
+        horizon = to_epoch_ms(datetime(2025, 1, 13))
+        with self.conn:
+            self.conn.execute("INSERT INTO retention (id, raw_since) VALUES (1, ?)", (horizon,))
+        result = compact(self.conn, horizon, pause_s=0)
+        self.assertEqual(result["weeks"], 0)
+        self.assertEqual(self.conn.execute("SELECT MIN(ts) >= ? FROM sensor_readings", (horizon,)).fetchone()[0], 1)
+        self.assertEqual(get_raw_since(self.conn), horizon)
+        self.assertEqual(self._totals(), self.totals)
+
+
+    def _raw_rows(self):
+        return self.conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0]
+
+    def test_archive_then_delete(self):
+        archive_dir = os.path.join(self.tmp.name, "archive")
+        report = run(self.db_path, keep_days=1, archive_dir=archive_dir)
+        self.assertEqual([e["month"] for e in Archive(archive_dir).manifest()], ["2025-01", "2025-02", "2025-03"])
+        self.assertEqual((report["rows_deleted"], self._raw_rows()), (self.rows, 0))
+
+    def test_late_reading_keeps_its_month(self):
+        archive_dir = os.path.join(self.tmp.name, "archive")
+        Archive(archive_dir).archive_closed_months(self.conn, before=to_epoch_ms(datetime(2025, 3, 1)))
+        # A January reading arrives after January was archived
+        with self.conn:
+            self.conn.execute("INSERT INTO sensor_readings (ts, sensor_id, river) VALUES (?, 2, 1.0)",
+                              (to_epoch_ms(datetime(2025, 1, 20, 0, 0, 7)),))
+        report = run(self.db_path, keep_days=1, archive_dir=archive_dir)
+        self.assertEqual(report["rows_deleted"], 0)
+        self.assertEqual(self._raw_rows(), self.rows + 1)
+
+    def test_refused_month_survives(self):
+        archive_dir = os.path.join(self.tmp.name, "archive")
+        # Compacted without --archive: the archiver refuses January's remains
+        compact(self.conn, to_epoch_ms(datetime(2025, 1, 13)), pause_s=0)
+        remaining = self._raw_rows()
+        report = run(self.db_path, keep_days=1, archive_dir=archive_dir)
+        self.assertEqual(report["rows_deleted"], 0)
+        self.assertEqual(self._raw_rows(), remaining)
+        self.assertEqual([e["month"] for e in Archive(archive_dir).manifest()], ["2025-02", "2025-03"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import sqlite3
+from datetime import datetime
+
+from utils.db_helpers import init_sensor_db, rebuild_latest, rebuild_rollups, to_epoch_ms
+
+
+class LatestReadingsTestCase(unittest.TestCase):
+    """ latest_readings is maintained by trigger on every sensor_readings insert. """
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        init_sensor_db(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _insert(self, ts, sensor_id, **values):
+        cols = ["ts", "sensor_id"] + list(values)
+        self.conn.execute(
+            f"INSERT INTO sensor_readings ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+            [ts, sensor_id] + list(values.values()),
+        )
+        self.conn.commit()
+
+    def _latest(self):
+        return self.conn.execute(
+            "SELECT sensor_id, ts, soil, river FROM latest_readings ORDER BY sensor_id"
+        ).fetchall()
+
+    def test_newest_row_wins(self):
+        self._insert(1000, 2, soil=40.0)
+        self._insert(2000, 2, soil=45.0)
+        self._insert(1500, 3, river=120.0)
+        self.assertEqual(self._latest(), [(2, 2000, 45.0, None), (3, 1500, None, 120.0)])
+
+    def test_late_row_does_not_overwrite(self):
+        self._insert(2000, 2, soil=45.0)
+        self._insert(1000, 2, soil=40.0)
+        self.assertEqual(self._latest(), [(2, 2000, 45.0, None)])
+
+    def test_rebuild_matches_trigger(self):
+        for ts in (1000, 3000, 2000):
+            self._insert(ts, 2, soil=ts / 100.0)
+        self._insert(500, 3, river=99.0)
+        expected = self._latest()
+        self.conn.execute("DELETE FROM latest_readings")
+        rebuild_latest(self.conn)
+        self.assertEqual(self._latest(), expected)
+
+
+class RollupTestCase(unittest.TestCase):
+    """ rollup_hour/day/week are kept by trigger and can be rebuilt from scratch. """
+
+    setUp = LatestReadingsTestCase.setUp
+    tearDown = LatestReadingsTestCase.tearDown
+    _insert = LatestReadingsTestCase._insert
+
+    def _rollup(self, table):
+        return self.conn.execute(
+            f"SELECT bucket, sensor_id, n, soil_sum, soil_n, river_n, river_last, river_last_ts "
+            f"FROM {table} ORDER BY bucket, sensor_id"
+        ).fetchall()
+
+    def test_buckets_use_local_labels(self):
+        # Sunday 2024-12-29 belongs to ISO week 2024-W52, Monday 2024-12-30 to 2025-W01
+        self._insert(to_epoch_ms(datetime(2024, 12, 29, 23, 30)), 2, soil=40.0)
+        self._insert(to_epoch_ms(datetime(2024, 12, 30, 0, 15)), 2, soil=50.0)
+        self.assertEqual([r[0] for r in self._rollup("rollup_hour")], ["2024-12-29 23:00", "2024-12-30 00:00"])
+        self.assertEqual([r[0] for r in self._rollup("rollup_day")], ["2024-12-29", "2024-12-30"])
+        self.assertEqual([r[0] for r in self._rollup("rollup_week")], ["2024-W52", "2025-W01"])
+
+    def test_sums_and_last_river(self):
+        base = to_epoch_ms(datetime(2025, 3, 5, 10, 0))
+        self._insert(base, 2, soil=40.0)
+        self._insert(base + 1000, 2)
+        self._insert(base + 2000, 2, soil=50.0)
+        self._insert(base + 5000, 3, river=120.0)
+        self._insert(base + 3000, 3, river=110.0)  # late packet
+        self.assertEqual(self._rollup("rollup_hour"), [
+            ("2025-03-05 10:00", 2, 3, 90.0, 2, 0, None, None),
+            ("2025-03-05 10:00", 3, 2, 0.0, 0, 2, 120.0, base + 5000),
+        ])
+
+    def test_rebuild_rollups_matches_trigger(self):
+        base = to_epoch_ms(datetime(2025, 1, 1))
+        for i in range(50):
+            self._insert(base + i * 1800 * 1000, 2 + i % 2, soil=float(i), river=float(100 - i))
+        expected = {t: self._rollup(t) for t in ("rollup_hour", "rollup_day", "rollup_week")}
+        rebuild_rollups(self.conn)
+        for table, rows in expected.items():
+            self.assertEqual(self._rollup(table), rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
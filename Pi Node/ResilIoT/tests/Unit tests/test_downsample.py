@@ -0,0 +1,36 @@
+import unittest
+
+import numpy as np
+
+from utils.downsample import lttb_indices, downsample_columns
+
+
+class LttbTestCase(unittest.TestCase):
+
+    def test_short_series_unchanged(self):
+        x = np.arange(10.0)
+        self.assertEqual(list(lttb_indices(x, x, 50)), list(range(10)))
+
+    def test_keeps_endpoints_and_spike(self):
+        x = np.arange(10000.0)
+        y = np.full(10000, 100.0)
+        y[4321] = 180.0
+        idx = lttb_indices(x, y, 100)
+        self.assertEqual(len(idx), 100)
+        self.assertEqual((idx[0], idx[-1]), (0, 9999))
+        self.assertIn(4321, idx)
+        self.assertTrue(np.all(np.diff(idx) > 0))
+
+    def test_columns_skip_missing_values(self):
+        ts = np.arange(1000.0)
+        soil = np.where(np.arange(1000) % 2 == 0, 40.0, np.nan)
+        river = np.where(np.arange(1000) % 2 == 1, 100.0, np.nan)
+        out = downsample_columns(ts, {"soil": soil, "river": river, "temp": np.full(1000, np.nan)}, 20)
+        self.assertEqual(len(out["soil"][0]), 20)
+        self.assertTrue(np.all(out["soil"][0] % 2 == 0))
+        self.assertTrue(np.all(out["river"][0] % 2 == 1))
+        self.assertEqual(len(out["temp"][0]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
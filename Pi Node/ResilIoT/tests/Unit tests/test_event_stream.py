@@ -0,0 +1,55 @@
+import unittest
+
+from utils.event_stream import EventHub, format_event
+
+
+class EventHubTestCase(unittest.TestCase):
+    """ Events fan out to subscribers and can be replayed from Last-Event-ID. """
+
+    def test_publish_reaches_subscribers(self):
+        hub = EventHub(boot="b1")
+        q1, _ = hub.subscribe()
+        q2, _ = hub.subscribe()
+        hub.publish("reading", {"river": 1.2})
+        self.assertEqual(q1.get_nowait().data, {"river": 1.2})
+        self.assertEqual(q2.get_nowait().id, "b1-1")
+
+    def test_resume_from_last_event_id(self):
+        hub = EventHub(boot="b1")
+        for i in range(5):
+            hub.publish("reading", {"n": i})
+        _, missed = hub.subscribe(last_event_id="b1-3")
+        self.assertEqual([e.id for e in missed], ["b1-4", "b1-5"])
+        _, missed = hub.subscribe(last_event_id="b1-5")
+        self.assertEqual(missed, [])
+
+    def test_unknown_id_needs_snapshot(self):
+        hub = EventHub(buffer_size=3, boot="b1")
+        for i in range(10):
+            hub.publish("reading", {"n": i})
+        self.assertIsNone(hub.subscribe()[1])
+        self.assertIsNone(hub.subscribe(last_event_id="b1-2")[1])   # fell out of the buffer
+        self.assertIsNone(hub.subscribe(last_event_id="b1-99")[1])  # not issued yet
+        self.assertIsNone(hub.subscribe(last_event_id="7")[1])      # not an id of ours
+        self.assertEqual([e.id for e in hub.subscribe(last_event_id="b1-7")[1]], ["b1-8", "b1-9", "b1-10"])
+
+    def test_restart_needs_snapshot(self):
+        before = EventHub(boot="b1")
+        for i in range(10):
+            before.publish("reading", {"n": i})
+        # After a restart the counter is back at 1 but the boot token differs
+        after = EventHub()
+        for i in range(12):
+            after.publish("reading", {"n": i})
+        self.assertNotEqual(after.boot, before.boot)
+        self.assertIsNone(after.subscribe(last_event_id=before.last_id)[1])
+        self.assertIsNone(after.subscribe(last_event_id="b1-3")[1])
+
+    def test_format(self):
+        hub = EventHub(boot="b1")
+        event = hub.publish("alert", {"level": "High"})
+        self.assertEqual(format_event(event), 'id: b1-1\nevent: alert\ndata: {"level": "High"}\n\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
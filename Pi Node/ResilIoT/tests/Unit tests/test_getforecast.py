@@ -0,0 +1,124 @@
+import json
+import sqlite3
+import threading
+import unittest
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.getforecast import ForecastFetcher, BACKOFF_BASE_S
+from utils.db_helpers import get_data_version
+
+
+def open_meteo_body(day, rain):
+    """Two local days of hourly data starting at midnight of day."""
+    midnight = datetime.combine(day, datetime.min.time())
+    times = [int((midnight + timedelta(hours=h)).timestamp()) for h in range(48)]
+    return {"hourly": {
+        "time": times,
+        "temperature_2m": [10.0 + h % 24 / 4 for h in range(48)],
+        "precipitation_probability": [60] * 48,
+        "precipitation": [rain] * 48,
+        "rain": [rain] * 48,
+    }}
+
+
+class MockOpenMeteo(BaseHTTPRequestHandler):
+    """ Serves server.body with an ETag; answers If-None-Match with 304, or fails while server.fail > 0. """
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if server.fail:
+            server.fail -= 1
+            self.send_response(503)
+            self.send_header("Retry-After", "1")
+            self.end_headers()
+            return
+        etag = f'"{server.revision}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "max-age=600")
+            self.end_headers()
+            return
+        data = json.dumps(server.body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "max-age=600")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class ForecastFetcherTestCase(unittest.TestCase):
+    """ The fetcher against a local stand-in for the Open-Meteo API. """
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), MockOpenMeteo)
+        self.server.requests, self.server.fail, self.server.revision = [], 0, 1
+        self.day = datetime.now().date()
+        self.server.body = open_meteo_body(self.day, rain=0.2)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.now = 1_000_000.0
+        self.conn = sqlite3.connect(":memory:")
+        sites = [{"id": "home", "lat": 51.1, "lon": 4.2}, {"id": "upstream", "lat": 51.2, "lon": 4.3}]
+        self.fetcher = ForecastFetcher(self.conn, sites, days=2,
+                                       api_url=f"http://127.0.0.1:{self.server.server_port}/v1/forecast",
+                                       clock=lambda: self.now)
+
+    def tearDown(self):
+        self.fetcher.close()
+        self.conn.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_stores_hourly_and_daily(self):
+        self.assertEqual(self.fetcher.run_once(), {"home": "updated", "upstream": "updated"})
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM forecast_hourly").fetchone()[0], 96)
+        # Only the first site feeds the daily table; 0.2 mm/h -> 4.8 mm/day
+        rows = self.conn.execute("SELECT date, precip_prob, precip_intensity FROM forecast ORDER BY date").fetchall()
+        self.assertEqual(rows, [(self.day.isoformat(), 60, "Moderate"),
+                                ((self.day + timedelta(days=1)).isoformat(), 60, "Moderate")])
+        self.assertEqual(get_data_version(self.conn), 2)
+
+    def test_honours_freshness_and_etag(self):
+        self.fetcher.run_once()
+        self.assertEqual(self.fetcher.run_once(), {"home": "fresh", "upstream": "fresh"})
+        self.assertEqual(len(self.server.requests), 2)
+
+        self.now += 601
+        self.assertEqual(self.fetcher.run_once(), {"home": "not modified", "upstream": "not modified"})
+        self.assertEqual(self.server.requests[-1].get("If-None-Match"), '"1"')
+        self.assertEqual(get_data_version(self.conn), 2)
+
+        # Same values under a new ETag: fetched but nothing rewritten
+        self.now += 601
+        self.server.revision = 2
+        self.assertEqual(self.fetcher.run_once()["home"], "unchanged")
+        self.assertEqual(get_data_version(self.conn), 2)
+
+    def test_backs_off_after_failure(self):
+        self.server.fail = 2
+        self.assertEqual(self.fetcher.fetch_site(self.fetcher.sites[0]), "error")
+        self.assertEqual(self.fetcher.fetch_site(self.fetcher.sites[0]), "backoff")
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.now += BACKOFF_BASE_S * 1.2 + 1
+        self.assertEqual(self.fetcher.fetch_site(self.fetcher.sites[0]), "error")
+        failed_at = self.now
+        # The second failure waits twice as long
+        self.now += BACKOFF_BASE_S * 1.2 + 1
+        self.assertEqual(self.fetcher.fetch_site(self.fetcher.sites[0]), "backoff")
+
+        self.now = failed_at + BACKOFF_BASE_S * 2.4 + 1
+        self.assertEqual(self.fetcher.fetch_site(self.fetcher.sites[0]), "updated")
+        self.assertEqual(len(self.server.requests), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from utils.metrics import Registry
+
+
+class RegistryTestCase(unittest.TestCase):
+    """ Counters and histograms rendered in the Prometheus text format. """
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_with_labels(self):
+        frames = self.registry.counter("frames_total", "Frames by outcome.", ["result"])
+        frames.inc(result="accepted")
+        frames.inc(2, result="accepted")
+        frames.inc(result="decrypt_failed")
+        self.assertEqual(frames.value(result="accepted"), 3)
+        self.assertEqual(self.registry.render(), (
+            "# HELP frames_total Frames by outcome.\n"
+            "# TYPE frames_total counter\n"
+            'frames_total{result="accepted"} 3\n'
+            'frames_total{result="decrypt_failed"} 1\n'
+        ))
+        with self.assertRaises(ValueError):
+            frames.inc(outcome="accepted")
+
+    def test_histogram_buckets_are_cumulative(self):
+        latency = self.registry.histogram("flush_seconds", "Flush time.", buckets=(0.01, 0.1))
+        for value in (0.005, 0.01, 0.05, 3.0):
+            latency.observe(value)
+        lines = self.registry.render().splitlines()[2:]
+        self.assertEqual(lines, [
+            'flush_seconds_bucket{le="0.01"} 2',
+            'flush_seconds_bucket{le="0.1"} 3',
+            'flush_seconds_bucket{le="+Inf"} 4',
+            "flush_seconds_sum 3.065",
+            "flush_seconds_count 4",
+        ])
+
+    def test_register_twice_returns_same_metric(self):
+        a = self.registry.counter("x_total", "X.", ["k"])
+        self.assertIs(self.registry.counter("x_total", "X.", ["k"]), a)
+        with self.assertRaises(ValueError):
+            self.registry.gauge("x_total", "X.")
+
+    def test_textfile_round_trip(self):
+        self.registry.gauge("depth", "Queue depth.").set(7)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "receiver.prom")
+            self.registry.write_textfile(path)
+            with open(path) as f:
+                self.assertEqual(f.read(), self.registry.render())
+            self.assertEqual(os.listdir(tmp), ["receiver.prom"])
+
+
+class MetricsEndpointTestCase(unittest.TestCase):
+    """ /metrics serves the dashboard's metrics plus the receiver's snapshot. """
+
+    def setUp(self):
+        from app import create_app
+        self.tmp = tempfile.TemporaryDirectory()
+        self.patch_db = patch("routes.api.DB_PATH", os.path.join(self.tmp.name, "sensor_data.db"))
+        self.patch_db.start()
+        self.client = create_app({"TESTING": True}).test_client()
+
+    def tearDown(self):
+        self.patch_db.stop()
+        self.tmp.cleanup()
+
+    def test_request_latency_and_receiver_snapshot(self):
+        self.client.get("/metrics")
+        resp = self.client.get("/metrics")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.content_type.startswith("text/plain; version=0.0.4"))
+        body = resp.get_data(as_text=True)
+        self.assertIn('resiliot_http_request_duration_seconds_count{route="/metrics",method="GET",status="200"}', body)
+        self.assertNotIn("resiliot_receiver", body)
+
+        with open(os.path.join(self.tmp.name, "receiver.prom"), "w") as f:
+            f.write('# TYPE resiliot_receiver_frames_total counter\nresiliot_receiver_frames_total{result="accepted"} 5\n')
+        body = self.client.get("/metrics").get_data(as_text=True)
+        self.assertIn('resiliot_receiver_frames_total{result="accepted"} 5', body)
+        self.assertIn("resiliot_receiver_metrics_age_seconds", body)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import unittest
+import sqlite3
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+
+from utils.migrate_db import main, migrate, needs_migration
+from utils.db_helpers import OutdatedSchema, check_sensor_schema, from_epoch_ms, to_epoch_ms
+
+
+class MigrateDbTestCase(unittest.TestCase):
+    """ Migration of text-timestamp sensor_readings to epoch milliseconds. """
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("""
+            CREATE TABLE sensor_readings (
+                timestamp TEXT,
+                soil REAL,
+                temp REAL,
+                hum REAL,
+                rain REAL,
+                river REAL,
+                rate_of_rise REAL,
+                high_level_alert INTEGER,
+                sensor_id INTEGER,
+                total_daily_rain REAL,
+                PRIMARY KEY (timestamp, sensor_id)
+            )
+        """)
+        self.conn.executemany(
+            "INSERT INTO sensor_readings (timestamp, soil, river, sensor_id) VALUES (?, ?, ?, ?)",
+            [
+                ("2025-03-01 10:00:00", 40.0, None, 2),
+                ("2025-03-01 10:00:00", None, 120.0, 3),
+                ("2025-03-01 10:01:00", 41.0, None, 2),
+                ("not a date", 1.0, None, 2),
+            ],
+        )
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_converts_local_text_to_epoch_ms(self):
+        """
+        Rows keep their values and local wall-clock time; unparsable timestamps are skipped.
+        """
+        self.assertTrue(needs_migration(self.conn))
+        before, after = migrate(self.conn)
+        self.assertEqual((before, after), (4, 3))
+        self.assertFalse(needs_migration(self.conn))
+
+        rows = self.conn.execute(
+            "SELECT ts, sensor_id, soil, river FROM sensor_readings ORDER BY sensor_id, ts"
+        ).fetchall()
+        self.assertEqual(from_epoch_ms(rows[0][0]), datetime(2025, 3, 1, 10, 0, 0))
+        self.assertEqual(rows[0][0] % 1000, 0)
+        self.assertEqual([r[1:] for r in rows], [(2, 40.0, None), (2, 41.0, None), (3, None, 120.0)])
+
+    def test_triggers_and_derived_tables(self):
+        with self.assertRaises(OutdatedSchema):
+            check_sensor_schema(self.conn)
+        migrate(self.conn)
+        check_sensor_schema(self.conn)
+        self.assertEqual(self.conn.execute("SELECT SUM(n) FROM rollup_hour").fetchone()[0], 3)
+        self.assertEqual(self.conn.execute("SELECT sensor_id FROM latest_readings ORDER BY 1").fetchall(),
+                         [(2,), (3,)])
+        # Triggers are in place for new readings
+        ts = to_epoch_ms(datetime(2025, 3, 2))
+        self.conn.execute("INSERT INTO sensor_readings (ts, sensor_id, river) VALUES (?, 3, 130.0)", (ts,))
+        self.assertEqual(self.conn.execute("SELECT ts, river FROM latest_readings WHERE sensor_id = 3").fetchone(),
+                         (ts, 130.0))
+        self.assertEqual(self.conn.execute("SELECT SUM(n) FROM rollup_hour").fetchone()[0], 4)
+
+    def test_cli_switches_to_incremental_vacuum(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sensor_data.db")
+            conn = sqlite3.connect(path)
+            self.conn.backup(conn)
+            self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 0)
+            conn.close()
+            with redirect_stdout(StringIO()):
+                main([path])
+            conn = sqlite3.connect(path)
+            self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0], 3)
+            conn.close()
+
+    def test_second_run_is_a_no_op(self):
+        migrate(self.conn)
+        self.assertEqual(migrate(self.conn), (3, 3))
+
+    def test_keep_old_table(self):
+        migrate(self.conn, keep_old=True)
+        old = self.conn.execute("SELECT COUNT(*) FROM sensor_readings_old").fetchone()[0]
+        self.assertEqual(old, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
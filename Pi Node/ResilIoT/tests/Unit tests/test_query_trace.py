@@ -0,0 +1,69 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from utils.query_trace import SqlTracer, TracedConnection
+
+
+class SqlTracerTestCase(unittest.TestCase):
+    """ Statements are counted and timed per request; slow ones are explained and logged. """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "sensor_data.db")
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE readings (sensor_id INTEGER, ts INTEGER, river REAL, PRIMARY KEY (sensor_id, ts))")
+        conn.executemany("INSERT INTO readings VALUES (?, ?, ?)", [(i % 2 + 2, i, i * 0.1) for i in range(5000)])
+        conn.commit()
+        conn.close()
+        self.log_path = os.path.join(self.tmp.name, "slow.log")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_disabled_is_plain_connection(self):
+        conn = SqlTracer().connect(self.db_path)
+        self.assertNotIsInstance(conn, TracedConnection)
+        conn.close()
+
+    def test_request_trace(self):
+        tracer = SqlTracer(enabled=True, slow_ms=1e9, log_path=self.log_path)
+        tracer.begin_request("GET /api/latest")
+        conn = tracer.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM readings WHERE sensor_id = ? ORDER BY ts DESC LIMIT 1", (3,)).fetchone()
+        self.assertEqual(row["ts"], 4999)
+        rows = conn.execute("SELECT river FROM readings WHERE river > ?", (100,)).fetchall()
+        conn.close()
+        trace = tracer.end_request()
+
+        self.assertEqual(trace["queries"], 2)
+        first, second = trace["statements"]
+        # Parameters are expanded by the trace callback
+        self.assertIn("sensor_id = 3", first["sql"])
+        self.assertEqual((first["rows"], second["rows"]), (1, len(rows)))
+        # The scan walks the whole table, the primary key lookup does not
+        self.assertGreater(second["steps"], first["steps"])
+        self.assertFalse(os.path.exists(self.log_path))
+        self.assertEqual(tracer.recent()["requests"], [trace])
+
+    def test_slow_query_is_explained_and_logged(self):
+        tracer = SqlTracer(enabled=True, slow_ms=0, log_path=self.log_path)
+        conn = tracer.connect(self.db_path)
+        conn.execute("SELECT AVG(river) FROM readings WHERE river > 1").fetchall()
+        conn.execute("SELECT river FROM readings WHERE sensor_id = 2 AND ts = 10").fetchall()
+        conn.close()
+
+        with open(self.log_path) as f:
+            scan, search = [json.loads(line) for line in f]
+        self.assertTrue(scan["full_scan"])
+        self.assertTrue(scan["plan"][0].startswith("SCAN readings"))
+        self.assertFalse(search["full_scan"])
+        self.assertIsNone(scan["request"])
+        self.assertEqual(len(tracer.recent()["slow"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
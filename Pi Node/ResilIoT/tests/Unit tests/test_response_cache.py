@@ -0,0 +1,68 @@
+import unittest
+
+from flask import Flask, jsonify
+
+from utils.response_cache import ResponseCache
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    """ Responses are reused until the data version changes, with ETag/304 revalidation. """
+
+    def setUp(self):
+        self.version = 1
+        self.calls = 0
+        self.cache = ResponseCache(lambda: self.version)
+        app = Flask(__name__)
+
+        @app.route("/data")
+        @self.cache.cached()
+        def data():
+            self.calls += 1
+            return jsonify({"calls": self.calls})
+
+        @app.route("/fail")
+        @self.cache.cached()
+        def fail():
+            self.calls += 1
+            return jsonify({"error": "x"}), 500
+
+        self.client = app.test_client()
+
+    def test_hit_until_version_changes(self):
+        first = self.client.get("/data")
+        self.assertEqual(first.headers["X-Cache"], "MISS")
+        again = self.client.get("/data")
+        self.assertEqual(again.headers["X-Cache"], "HIT")
+        self.assertEqual(again.get_json(), {"calls": 1})
+
+        self.version = 2
+        fresh = self.client.get("/data")
+        self.assertEqual(fresh.get_json(), {"calls": 2})
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 2)
+
+    def test_etag_gives_304(self):
+        etag = self.client.get("/data").headers["ETag"]
+        resp = self.client.get("/data", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.data, b"")
+
+        self.version = 2
+        resp = self.client.get("/data", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_errors_not_cached(self):
+        self.client.get("/fail")
+        self.client.get("/fail")
+        self.assertEqual(self.calls, 2)
+
+    def test_unknown_version_bypasses(self):
+        self.version = None
+        self.client.get("/data")
+        self.client.get("/data")
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.cache.stats()["bypassed"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
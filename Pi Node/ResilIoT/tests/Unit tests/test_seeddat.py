@@ -0,0 +1,50 @@
+import unittest
+import sqlite3
+from datetime import datetime
+
+from utils.seeddat import seed, sensor_ids
+
+
+class SeedTestCase(unittest.TestCase):
+    """ Synthetic readings are bulk loaded and the derived tables rebuilt. """
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.start = datetime(2025, 3, 1)
+        self.end = datetime(2025, 3, 5)
+        self.rows = seed(self.conn, nodes=4, cadence_s=600, start=self.start, end=self.end, random_seed=1)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_rows_per_node(self):
+        steps = 4 * 24 * 6 + 1
+        self.assertEqual(self.rows, 4 * steps)
+        self.assertEqual(sensor_ids(4), [(2, "weather"), (3, "river"), (100, "weather"), (101, "river")])
+        counts = self.conn.execute(
+            "SELECT sensor_id, COUNT(*), COUNT(soil), COUNT(river) FROM sensor_readings GROUP BY sensor_id"
+        ).fetchall()
+        self.assertEqual(counts, [(2, steps, steps, 0), (3, steps, 0, steps),
+                                  (100, steps, steps, 0), (101, steps, 0, steps)])
+
+    def test_triggers_and_derived_tables_restored(self):
+        names = {r[0] for r in self.conn.execute("SELECT name FROM sqlite_master WHERE type IN ('trigger', 'index')")}
+        self.assertTrue({"trg_latest_readings", "trg_rollup_hour", "idx_sensor_readings_ts"} <= names)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM latest_readings").fetchone()[0], 4)
+        self.assertEqual(self.conn.execute("SELECT SUM(n) FROM rollup_day").fetchone()[0], self.rows)
+        self.assertEqual(self.conn.execute("SELECT version FROM data_version").fetchone()[0], 1)
+
+    def test_daily_rain_resets_at_midnight(self):
+        rows = self.conn.execute("""
+            SELECT date(ts / 1000, 'unixepoch', 'localtime'), MIN(total_daily_rain),
+                   MAX(total_daily_rain), SUM(rain), COUNT(*)
+            FROM sensor_readings WHERE sensor_id = 2 GROUP BY 1
+        """).fetchall()
+        for day, first, total, rain, n in rows:
+            self.assertLessEqual(first, rain)
+            # Both sides are sums of values rounded to 0.01
+            self.assertAlmostEqual(total, rain, delta=0.005 * n + 0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
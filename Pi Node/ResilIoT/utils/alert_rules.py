@@ -0,0 +1,198 @@
+# alert_rules.py
+# Threshold rules for the alert level, as data.
+#
+# RULES lists the levels from most to least severe. A level fires if any of
+# its clauses holds; a clause is a list of conditions that must all hold.
+# A condition is (field, op, operand):
+#   ">=", "<="   operand is a threshold key of that level (e.g. "river_max")
+#   "between"    operand is a (min_key, max_key) pair, bounds inclusive
+#   "==", "in"   operand is a literal / tuple of literals
+#
+# RuleEngine compiles RULES against thresholds.json into plain closures once,
+# and recompiles only when the file's mtime changes, so evaluating a reading
+# is a handful of comparisons with no file access.
+
+import os
+
+import numpy as np
+
+from utils.params_helper import THRESHOLDS_FILE, DEFAULT_THRESHOLDS, load_thresholds
+
+LEVELS = ["None", "Low", "Mid", "High"]
+
+RULES = [
+    ("High", [
+        [("river", ">=", "river_max")],
+        [("soil", ">=", "soil_min"), ("forecast", "in", ("mid", "high"))],
+        [("rain", ">=", "rain_thresh")],
+        [("high_level_alert", "==", 1)],
+    ]),
+    ("Mid", [
+        [("river", ">=", "river_max")],
+        [("soil", "between", ("soil_min", "soil_max")), ("forecast", "in", ("mid", "high"))],
+        [("rain", ">=", "rain_thresh")],
+    ]),
+    ("Low", [
+        [("river", ">=", "river_max")],
+        [("soil", "between", ("soil_min", "soil_max")), ("forecast", "in", ("low", "mid"))],
+        [("forecast", "==", "low")],
+    ]),
+]
+
+# Forecast precip_intensity (utils/getforecast.py) -> rule level name
+FORECAST_LEVELS = {
+    "light": "low", "moderate": "mid", "heavy": "high",
+    "low": "low", "mid": "mid", "high": "high",
+}
+
+
+def normalize_forecast(intensity):
+    """'Moderate' / 'Mid' / None ... -> 'low' | 'mid' | 'high' | 'none'."""
+    return FORECAST_LEVELS.get(str(intensity or "").strip().lower(), "none")
+
+
+class RuleError(ValueError):
+    pass
+
+
+def _threshold(thresholds, level, key):
+    value = thresholds.get(level, {}).get(key)
+    if value is None:
+        value = DEFAULT_THRESHOLDS.get(level, {}).get(key)
+    if value is None:
+        raise RuleError(f"{level}: missing threshold {key!r}")
+    return float(value)
+
+
+def _compile_condition(condition, level, thresholds):
+    field, op, operand = condition
+    if op == ">=":
+        limit = _threshold(thresholds, level, operand)
+        return lambda r: (r.get(field) or 0) >= limit
+    if op == "<=":
+        limit = _threshold(thresholds, level, operand)
+        return lambda r: (r.get(field) or 0) <= limit
+    if op == "between":
+        lo = _threshold(thresholds, level, operand[0])
+        hi = _threshold(thresholds, level, operand[1])
+        return lambda r: lo <= (r.get(field) or 0) <= hi
+    if op == "==":
+        return lambda r: r.get(field) == operand
+    if op == "in":
+        values = frozenset(operand)
+        return lambda r: r.get(field) in values
+    raise RuleError(f"{level}: unknown operator {op!r}")
+
+
+def _column_condition(condition, level, thresholds, columns, n):
+    """Vectorized form of _compile_condition: boolean array over n timesteps."""
+    field, op, operand = condition
+    col = columns.get(field)
+    if col is None:
+        col = np.zeros(n) if op in (">=", "<=", "between") else np.full(n, None, dtype=object)
+    if op in (">=", "<=", "between"):
+        col = np.nan_to_num(np.asarray(col, dtype=np.float64), nan=0.0)
+    if op == ">=":
+        return col >= _threshold(thresholds, level, operand)
+    if op == "<=":
+        return col <= _threshold(thresholds, level, operand)
+    if op == "between":
+        lo = _threshold(thresholds, level, operand[0])
+        hi = _threshold(thresholds, level, operand[1])
+        return (col >= lo) & (col <= hi)
+    if op == "==":
+        return np.asarray(col) == operand
+    if op == "in":
+        return np.isin(np.asarray(col), list(operand))
+    raise RuleError(f"{level}: unknown operator {op!r}")
+
+
+def _all_of(preds):
+    return lambda r: all(p(r) for p in preds)
+
+
+class CompiledRules:
+    """RULES bound to one set of thresholds."""
+
+    def __init__(self, thresholds, rules=RULES):
+        self.thresholds = thresholds
+        self.rules = rules
+        self._levels = []
+        for level, clauses in rules:
+            compiled = []
+            for clause in clauses:
+                preds = tuple(_compile_condition(c, level, thresholds) for c in clause)
+                compiled.append(preds[0] if len(preds) == 1 else _all_of(preds))
+            self._levels.append((level, tuple(compiled)))
+
+    def evaluate(self, readings):
+        """
+        readings: dict with soil, river, rain, high_level_alert and forecast
+        (see normalize_forecast). Missing/None numbers count as 0.
+        """
+        for level, clauses in self._levels:
+            for clause in clauses:
+                if clause(readings):
+                    return level
+        return "None"
+
+    def evaluate_rows(self, rows):
+        """Level for each reading dict in rows."""
+        return [self.evaluate(r) for r in rows]
+
+    def evaluate_columns(self, columns):
+        """
+        Vectorized evaluate over equal-length arrays, one per field (NaN counts
+        as 0, like None). Returns an int8 array of indexes into LEVELS.
+        """
+        n = len(next(iter(columns.values()))) if columns else 0
+        result = np.zeros(n, dtype=np.int8)
+        # Least severe first, so a more severe level overwrites it
+        for level, clauses in reversed(self.rules):
+            fired = np.zeros(n, dtype=bool)
+            for clause in clauses:
+                mask = np.ones(n, dtype=bool)
+                for condition in clause:
+                    mask &= _column_condition(condition, level, self.thresholds, columns, n)
+                fired |= mask
+            result[fired] = LEVELS.index(level)
+        return result
+
+
+class RuleEngine:
+    """Compiled rules for thresholds.json, recompiled when the file changes."""
+
+    def __init__(self, path=THRESHOLDS_FILE, rules=RULES, loader=None):
+        self.path = path
+        self.rules = rules
+        self.loader = loader or (lambda: load_thresholds(path))
+        self._mtime = object()  # never equal to a real mtime
+        self._compiled = None
+        self.reloads = 0
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def current(self):
+        mtime = self._file_mtime()
+        if self._compiled is None or mtime != self._mtime:
+            self._compiled = CompiledRules(self.loader(), self.rules)
+            self._mtime = mtime
+            self.reloads += 1
+        return self._compiled
+
+    @property
+    def thresholds(self):
+        return self.current().thresholds
+
+    def evaluate(self, readings):
+        return self.current().evaluate(readings)
+
+    def evaluate_rows(self, rows):
+        return self.current().evaluate_rows(rows)
+
+    def evaluate_columns(self, columns):
+        return self.current().evaluate_columns(columns)
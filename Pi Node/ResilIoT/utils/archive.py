@@ -0,0 +1,334 @@
+# Cold archive of sensor_readings: one directory of NumPy arrays per closed
+# local month, so years of river and rain history stay available for post-event
+# analysis without living in the hot SQLite file.
+#
+#   python -m utils.archive [--db PATH] [--dir DIR] [--force]
+#
+# Each month is written as db/archive/sensor_readings_YYYY-MM/ holding one
+# uncompressed .npy per column: ts.npy (int64 epoch ms), sensor_id.npy
+# (int32) and one float64 array per value column (NaN for NULL), sorted by
+# ts. manifest.json lists every month with its row count, time range,
+# sensors and the min/max of each column, so readers pick the months that
+# overlap a range without opening the others.
+#
+# Readers only go to the archive for the part of a range before
+# retention.raw_since: that is where utils/compact.py deleted the raw rows
+# after archiving them (compact --archive), and everything from raw_since
+# on is still in SQLite. Columns are opened with np.load(mmap_mode='r'), only
+# the ones asked for, so a range is a searchsorted slice of each mapped
+# array and only the pages it touches are read from the card; the maps of
+# recently used months are kept open up to CACHE_BYTES of mapped data.
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.db_helpers import DB_PATH, from_epoch_ms, get_raw_since, to_epoch_ms
+
+ARCHIVE_DIR = './db/archive'
+MANIFEST = 'manifest.json'
+VALUE_COLUMNS = ["soil", "temp", "hum", "rain", "total_daily_rain", "river", "rate_of_rise", "high_level_alert"]
+# Mapped column data kept open across reads (address space, not RAM)
+CACHE_BYTES = 256 * 1024 * 1024
+
+
+def month_bounds(ms):
+    """(start, end) epoch ms of the local month containing ms."""
+    day = from_epoch_ms(ms)
+    start = datetime(day.year, day.month, 1)
+    end = datetime(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return to_epoch_ms(start), to_epoch_ms(end)
+
+
+def missing_ranges(start, end, raw_since, archive=None):
+    """
+    [lo, hi) parts of [start, end) that compaction removed from SQLite (before
+    raw_since) and that no archived month covers: history nobody can serve,
+    as opposed to a range without readings.
+    """
+    if raw_since is None or start >= raw_since:
+        return []
+    stop = min(end, raw_since)
+    gaps, cursor = [], start
+    for entry in (archive.manifest() if archive is not None else []):
+        if entry["end_ts"] <= cursor:
+            continue
+        if entry["start_ts"] >= stop:
+            break
+        if entry["start_ts"] > cursor:
+            gaps.append([cursor, entry["start_ts"]])
+        cursor = entry["end_ts"]
+    if cursor < stop:
+        gaps.append([cursor, stop])
+    return gaps
+
+
+def _column_stats(values):
+    finite = values[~np.isnan(values)]
+    if not len(finite):
+        return {"min": None, "max": None, "nulls": int(len(values))}
+    return {"min": float(finite.min()), "max": float(finite.max()), "nulls": int(len(values) - len(finite))}
+
+
+class Archive:
+
+    def __init__(self, directory=ARCHIVE_DIR, cache_bytes=CACHE_BYTES):
+        self.directory = directory
+        self.cache_bytes = cache_bytes
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._manifest_mtime = None
+        self._cache = OrderedDict()  # month dir -> {column: memmap}
+        self._cached_bytes = 0
+
+    # -----------------------
+    # Manifest
+    # -----------------------
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST)
+
+    def manifest(self):
+        """Entries of manifest.json (reloaded when the archiver rewrites it), oldest first."""
+        path = self._manifest_path()
+        try:
+            st = os.stat(path)
+        except OSError:
+            return []
+        mtime = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if mtime != self._manifest_mtime:
+                with open(path) as f:
+                    self._manifest = json.load(f)["files"]
+                self._manifest_mtime = mtime
+                # A rewritten month must not be served from the cache
+                self._clear_cache()
+            return self._manifest
+
+    def _write_manifest(self, entries):
+        entries = sorted(entries, key=lambda e: e["start_ts"])
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"columns": VALUE_COLUMNS, "files": entries}, f, indent=1)
+        os.replace(tmp, self._manifest_path())
+        with self._lock:
+            self._manifest = None
+            self._manifest_mtime = None
+            self._clear_cache()
+
+    # -----------------------
+    # Writing
+    # -----------------------
+    def write_month(self, conn, month_start):
+        """
+        Export the local month starting at month_start (epoch ms). Returns its
+        manifest entry, or None if empty. Raises ValueError rather than write
+        a month whose raw readings were partly compacted away, or replace an
+        archived month with fewer rows.
+        """
+        start, end = month_bounds(month_start)
+        raw_since = get_raw_since(conn)
+        if raw_since is not None and start < raw_since:
+            raise ValueError(f"{from_epoch_ms(start):%Y-%m} starts before the compaction horizon "
+                             f"({from_epoch_ms(raw_since):%Y-%m-%d}); its raw readings are incomplete")
+        rows = conn.execute(
+            f"SELECT ts, sensor_id, {', '.join(VALUE_COLUMNS)} FROM sensor_readings "
+            "WHERE ts >= ? AND ts < ? ORDER BY ts, sensor_id",
+            (start, end)
+        ).fetchall()
+        if not rows:
+            return None
+        dirname = f"sensor_readings_{from_epoch_ms(start):%Y-%m}"
+        old = next((e for e in self.manifest() if e["dir"] == dirname), None)
+        if old is not None and old["rows"] > len(rows):
+            raise ValueError(f"{old['month']} is archived with {old['rows']} rows, "
+                             f"the database only has {len(rows)}; keeping the archive")
+        data = np.array(rows, dtype=np.float64)
+        arrays = {"ts": data[:, 0].astype(np.int64), "sensor_id": data[:, 1].astype(np.int32)}
+        for i, name in enumerate(VALUE_COLUMNS):
+            arrays[name] = np.ascontiguousarray(data[:, i + 2])
+
+        # Write aside and swap in, so readers never see a half-written month
+        path = os.path.join(self.directory, dirname)
+        tmp, stale = path + ".tmp", path + ".old"
+        for leftover in (tmp, stale):
+            shutil.rmtree(leftover, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, values in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), values)
+        if os.path.isdir(path):
+            os.rename(path, stale)
+        os.rename(tmp, path)
+        shutil.rmtree(stale, ignore_errors=True)
+
+        entry = {
+            "dir": dirname,
+            "month": f"{from_epoch_ms(start):%Y-%m}",
+            "start_ts": start,
+            "end_ts": end,
+            "rows": len(rows),
+            "min_ts": int(arrays["ts"][0]),
+            "max_ts": int(arrays["ts"][-1]),
+            "sensors": sorted(int(s) for s in np.unique(arrays["sensor_id"])),
+            "bytes": sum(os.path.getsize(os.path.join(path, name + ".npy")) for name in arrays),
+            "stats": {c: _column_stats(arrays[c]) for c in VALUE_COLUMNS},
+        }
+        self._write_manifest([e for e in self.manifest() if e["dir"] != dirname] + [entry])
+        return entry
+
+    def archive_closed_months(self, conn, before=None, force=False):
+        """
+        Archive every local month with readings that ended by `before` (epoch
+        ms, default: start of the current month). Months already in the
+        manifest are skipped unless force; months that write_month() refuses
+        (partly compacted, or fewer rows than archived) are skipped with a
+        warning. Returns the new entries.
+        """
+        if before is None:
+            before = to_epoch_ms(datetime.now())
+        before = month_bounds(before)[0]
+        done = {e["start_ts"] for e in self.manifest()}
+        written = []
+        oldest = conn.execute("SELECT MIN(ts) FROM sensor_readings").fetchone()[0]
+        month = month_bounds(oldest)[0] if oldest is not None else before
+        while month < before:
+            next_month = month_bounds(month)[1]
+            if force or month not in done:
+                try:
+                    entry = self.write_month(conn, month)
+                except ValueError as e:
+                    print(f"[WARN] Not archived: {e}")
+                    entry = None
+                if entry:
+                    written.append(entry)
+            month = next_month
+        return written
+
+    def covered_until(self, conn, before):
+        """
+        Start (epoch ms) of the oldest local month before `before` that has
+        raw readings missing from the archive, or the start of before's month
+        if there is none: raw readings before it can be deleted. Months whose
+        archiving was refused, or that got readings after they were archived,
+        end the run.
+        """
+        before = month_bounds(before)[0]
+        raw_since = get_raw_since(conn) or 0
+        archived = {e["start_ts"] for e in self.manifest()}
+        oldest = conn.execute("SELECT MIN(ts) FROM sensor_readings").fetchone()[0]
+        month = month_bounds(oldest)[0] if oldest is not None else before
+        while month < before:
+            start, end = month_bounds(month)
+            lo = max(start, raw_since)
+            n = conn.execute("SELECT COUNT(*) FROM sensor_readings WHERE ts >= ? AND ts < ?",
+                             (lo, end)).fetchone()[0] if lo < end else 0
+            if n and (start not in archived or len(self.read(lo, end - 1, [])) < n):
+                return start
+            month = end
+        return before
+
+    def archived_until(self):
+        """End (epoch ms) of the newest archived month, or None."""
+        entries = self.manifest()
+        return entries[-1]["end_ts"] if entries else None
+
+    # -----------------------
+    # Reading
+    # -----------------------
+    def _columns(self, entry, names):
+        """Memory-mapped arrays of one archived month; only the requested columns are opened."""
+        key = entry["dir"]
+        with self._lock:
+            cached = self._cache.setdefault(key, {})
+            self._cache.move_to_end(key)
+            result = {n: cached[n] for n in names if n in cached}
+        loaded = {n: np.load(os.path.join(self.directory, key, n + ".npy"), mmap_mode="r")
+                  for n in names if n not in result}
+        if loaded:
+            with self._lock:
+                cached = self._cache.setdefault(key, {})
+                for n, values in loaded.items():
+                    if n not in cached:
+                        cached[n] = values
+                        self._cached_bytes += values.nbytes
+                # Keep at least the month being read
+                while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_bytes -= sum(v.nbytes for v in evicted.values())
+            result.update(loaded)
+        return result
+
+    def read(self, start, end, columns, sensor_id=None):
+        """
+        Archived readings with start <= ts <= end, as a float64 matrix like a
+        "SELECT ts, <columns> ... ORDER BY ts" result (NULL as NaN).
+        """
+        parts = []
+        for entry in self.manifest():
+            if entry["max_ts"] < start or entry["min_ts"] > end:
+                continue
+            if sensor_id is not None and sensor_id not in entry["sensors"]:
+                continue
+            arrays = self._columns(entry, ["ts", "sensor_id"] + list(columns))
+            lo = np.searchsorted(arrays["ts"], start, side="left")
+            hi = np.searchsorted(arrays["ts"], end, side="right")
+            sl = slice(lo, hi)
+            if sensor_id is not None:
+                sl = lo + np.flatnonzero(arrays["sensor_id"][lo:hi] == sensor_id)
+            part = np.empty((len(arrays["ts"][sl]), len(columns) + 1))
+            part[:, 0] = arrays["ts"][sl]
+            for i, name in enumerate(columns):
+                part[:, i + 1] = arrays[name][sl]
+            parts.append(part)
+        if not parts:
+            return np.empty((0, len(columns) + 1))
+        return np.concatenate(parts)
+
+    def last_before(self, ts, columns, sensor_id):
+        """Newest archived reading of sensor_id before ts as [ts, <columns>...], or None."""
+        for entry in reversed(self.manifest()):
+            if entry["min_ts"] >= ts or sensor_id not in entry["sensors"]:
+                continue
+            data = self.read(entry["min_ts"], min(ts - 1, entry["max_ts"]), columns, sensor_id)
+            if len(data):
+                return data[-1]
+        return None
+
+    def _clear_cache(self):
+        self._cache.clear()
+        self._cached_bytes = 0
+
+    def clear_cache(self):
+        with self._lock:
+            self._clear_cache()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Export closed months of sensor_readings to columnar .npy files")
+    p.add_argument("--db", default=DB_PATH)
+    p.add_argument("--dir", default=ARCHIVE_DIR, help="archive directory (default %(default)s)")
+    p.add_argument("--force", action="store_true", help="rewrite months that are already archived")
+    args = p.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        written = Archive(args.dir).archive_closed_months(conn, force=args.force)
+    finally:
+        conn.close()
+    for entry in written:
+        print(f"Archived {entry['month']}: {entry['rows']} rows, {entry['bytes'] / 1024:.0f} KiB")
+    if not written:
+        print("Nothing to archive")
+
+
+if __name__ == "__main__":
+    main()
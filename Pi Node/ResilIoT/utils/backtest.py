@@ -0,0 +1,242 @@
+# Replays sensor_readings through the alert rules to show how a threshold set
+# would have behaved: time spent in each level, level transitions, and how
+# long before each river peak an alert was already up.
+#
+#   python -m utils.backtest [db_path] [--thresholds FILE] [--start T] [--end T]
+#
+# Every timestep is a reading from one of the alert sensors. At each one the
+# inputs are what the live engine would have seen (the newest row of each
+# sensor, see routes/api.py), so the whole history is evaluated at once with
+# CompiledRules.evaluate_columns instead of row by row.
+
+import argparse
+import json
+import sqlite3
+import sys
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.alert_rules import CompiledRules, LEVELS, normalize_forecast
+from utils.archive import Archive, ARCHIVE_DIR, missing_ranges
+from utils.db_helpers import DB_PATH, to_epoch_ms, format_ts, get_raw_since
+from utils.params_helper import load_thresholds
+
+# Rule input -> sensor it comes from (same as the dashboard and alert engine)
+FIELD_SENSORS = {"soil": 2, "rain": 2, "river": 3, "high_level_alert": 3}
+# River excursions closer together than this count as one peak
+PEAK_GAP_MS = 6 * 3600 * 1000
+
+
+def load_columns(conn, start, end, field_sensors=FIELD_SENSORS, archive=None):
+    """
+    Merged timeline of the alert sensors' readings in [start, end] and every
+    rule input forward-filled onto it. Returns (ts, {field: float array});
+    values not known yet (or NULL) are NaN. Readings older than the
+    compaction horizon come from archive (utils/archive.py), if given.
+    """
+    by_sensor = {}
+    for field, sensor_id in field_sensors.items():
+        by_sensor.setdefault(sensor_id, []).append(field)
+    raw_since = get_raw_since(conn) if archive is not None else None
+    cold = raw_since is not None and start < raw_since
+
+    loaded = []
+    for sensor_id, fields in by_sensor.items():
+        cols = ", ".join(fields)
+        # Newest row before the range, so the first timesteps are not blind
+        before = conn.execute(
+            f"SELECT ?, {cols} FROM sensor_readings WHERE sensor_id = ? AND ts < ? ORDER BY ts DESC LIMIT 1",
+            (start, sensor_id, start)
+        ).fetchall()
+        rows = conn.execute(
+            f"SELECT ts, {cols} FROM sensor_readings WHERE sensor_id = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+            (sensor_id, max(start, raw_since) if cold else start, end)
+        ).fetchall()
+        data = np.array(before + rows, dtype=np.float64).reshape(len(before) + len(rows), len(fields) + 1)
+        if cold:
+            last = archive.last_before(start, fields, sensor_id)
+            parts = [last[None, :]] if last is not None else []
+            if parts:
+                parts[0][0, 0] = start
+            parts.append(archive.read(start, min(end, raw_since - 1), fields, sensor_id))
+            data = np.concatenate(parts + [data[len(before):]])
+        loaded.append((fields, data))
+
+    ts = np.unique(np.concatenate([data[:, 0] for _, data in loaded])).astype(np.int64)
+    columns = {}
+    for fields, data in loaded:
+        # Index of the sensor's newest row at or before each timestep
+        idx = np.searchsorted(data[:, 0], ts, side="right") - 1
+        known = idx >= 0
+        for i, field in enumerate(fields):
+            col = np.full(len(ts), np.nan)
+            col[known] = data[idx[known], i + 1]
+            columns[field] = col
+    return ts, columns
+
+
+def load_forecast(conn, ts):
+    """Normalized forecast intensity of each timestep's local day ('none' if not fetched)."""
+    out = np.full(len(ts), "none", dtype=object)
+    if not len(ts):
+        return out
+    first = datetime.fromtimestamp(ts[0] / 1000).strftime("%Y-%m-%d")
+    last = datetime.fromtimestamp(ts[-1] / 1000).strftime("%Y-%m-%d")
+    try:
+        rows = conn.execute(
+            "SELECT date, precip_intensity FROM forecast WHERE date >= ? AND date <= ? ORDER BY date",
+            (first, last)
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return out  # no forecast table yet
+    for day, intensity in rows:
+        midnight = datetime.strptime(day, "%Y-%m-%d")
+        lo, hi = np.searchsorted(ts, [to_epoch_ms(midnight), to_epoch_ms(midnight + timedelta(days=1))])
+        out[lo:hi] = normalize_forecast(intensity)
+    return out
+
+
+def _run_starts(mask):
+    """For each index, where the run of True values containing it began."""
+    starts = mask.copy()
+    starts[1:] &= ~mask[:-1]
+    return np.maximum.accumulate(np.where(starts, np.arange(len(mask)), 0))
+
+
+def find_peaks(ts, river, peak_min, gap_ms=PEAK_GAP_MS):
+    """
+    Index of the highest reading of each excursion of river to >= peak_min;
+    excursions less than gap_ms apart are merged.
+    """
+    above = np.nan_to_num(river, nan=-np.inf) >= peak_min
+    if not above.any():
+        return np.zeros(0, dtype=np.int64)
+    edges = np.diff(np.concatenate(([0], above.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+
+    keep = np.concatenate(([True], ts[starts[1:]] - ts[ends[:-1]] > gap_ms))
+    group_starts = starts[keep]
+    group_ends = ends[np.append(np.flatnonzero(keep)[1:] - 1, len(ends) - 1)]
+
+    values = np.where(above, river, -np.inf)
+    marks = np.zeros(len(ts), dtype=np.int64)
+    marks[group_starts] = 1
+    group = np.cumsum(marks) - 1
+    peak_values = np.maximum.reduceat(values, group_starts)
+    inside = (np.arange(len(ts)) <= group_ends[group]) & (group >= 0)
+    candidates = np.flatnonzero(inside & (values == peak_values[np.maximum(group, 0)]))
+    # First index reaching the maximum in each group
+    _, first = np.unique(group[candidates], return_index=True)
+    return candidates[first]
+
+
+def backtest(conn, thresholds, start, end, peak_min=None, field_sensors=FIELD_SENSORS, archive=None):
+    """
+    Evaluate thresholds over readings in [start, end] (epoch ms). peak_min is
+    the river level that counts as a peak (default: the Low river_max). The
+    report's missing lists the parts of the range that were compacted away
+    without an archive, where the replay saw no readings.
+    """
+    rules = CompiledRules(thresholds)
+    raw_since = get_raw_since(conn)
+    ts, columns = load_columns(conn, start, end, field_sensors, archive)
+    columns["forecast"] = load_forecast(conn, ts)
+    levels = rules.evaluate_columns(columns)
+
+    # Each level holds until the next timestep (the last one until end)
+    held = np.diff(np.append(ts, max(end, ts[-1]) if len(ts) else end)) / 1000.0
+    seconds = np.bincount(levels, weights=held, minlength=len(LEVELS))
+    total = seconds.sum()
+
+    changed = np.flatnonzero(levels[1:] != levels[:-1])
+    pairs = np.zeros((len(LEVELS), len(LEVELS)), dtype=np.int64)
+    np.add.at(pairs, (levels[changed], levels[changed + 1]), 1)
+
+    if peak_min is None:
+        peak_min = rules.thresholds.get("Low", {}).get("river_max")
+    river = columns.get("river", np.zeros(len(ts)))
+    peak_idx = find_peaks(ts, river, float(peak_min)) if peak_min is not None else np.zeros(0, dtype=np.int64)
+
+    peaks = [{"ts": int(ts[i]), "time": format_ts(int(ts[i])), "river": float(river[i]),
+              "level": LEVELS[levels[i]], "lead_s": {}} for i in peak_idx]
+    lead = {}
+    for code, level in enumerate(LEVELS[1:], start=1):
+        active = levels >= code
+        run_start = _run_starts(active)[peak_idx]
+        caught = active[peak_idx]
+        lead_s = (ts[peak_idx] - ts[run_start]) / 1000.0
+        for peak, hit, secs in zip(peaks, caught, lead_s):
+            peak["lead_s"][level] = float(secs) if hit else None
+        hits = lead_s[caught]
+        lead[level] = {
+            "caught": int(caught.sum()),
+            "missed": int((~caught).sum()),
+            "min_s": float(hits.min()) if len(hits) else None,
+            "median_s": float(np.median(hits)) if len(hits) else None,
+            "max_s": float(hits.max()) if len(hits) else None,
+        }
+
+    return {
+        "start": start,
+        "end": end,
+        "timesteps": len(ts),
+        "raw_since": raw_since,
+        "missing": missing_ranges(start, end, raw_since, archive),
+        "thresholds": rules.thresholds,
+        "time_in_level": {
+            level: {"seconds": float(seconds[i]), "fraction": float(seconds[i] / total) if total else 0.0}
+            for i, level in enumerate(LEVELS)
+        },
+        "transitions": {
+            "total": int(len(changed)),
+            "into": {level: int(pairs[:, i].sum()) for i, level in enumerate(LEVELS)},
+            "pairs": {f"{LEVELS[a]}->{LEVELS[b]}": int(pairs[a, b])
+                      for a in range(len(LEVELS)) for b in range(len(LEVELS)) if pairs[a, b]},
+        },
+        "peak_min": peak_min,
+        "lead_time": lead,
+        "peaks": peaks,
+    }
+
+
+def _parse_time(value):
+    if value.lstrip("-").isdigit():
+        return int(value)
+    return to_epoch_ms(datetime.fromisoformat(value))
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Backtest alert thresholds against stored readings")
+    p.add_argument("db_path", nargs="?", default=DB_PATH)
+    p.add_argument("--thresholds", help="thresholds JSON (default: the saved thresholds.json)")
+    p.add_argument("--start", help="epoch ms or ISO time (default: --days before --end)")
+    p.add_argument("--end", help="epoch ms or ISO time (default: now)")
+    p.add_argument("--days", type=float, default=365, help="range length when --start is not given")
+    p.add_argument("--peak-min", type=float, help="river level that counts as a peak (default: Low river_max)")
+    p.add_argument("--archive", default=ARCHIVE_DIR, help="cold archive for compacted history (default %(default)s)")
+    args = p.parse_args(argv)
+
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+    else:
+        thresholds = load_thresholds()
+    end = _parse_time(args.end) if args.end else to_epoch_ms(datetime.now())
+    start = _parse_time(args.start) if args.start else end - int(args.days * 86400 * 1000)
+
+    conn = sqlite3.connect(args.db_path)
+    try:
+        result = backtest(conn, thresholds, start, end, peak_min=args.peak_min, archive=Archive(args.archive))
+    finally:
+        conn.close()
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# Retention job: keeps sensor_data.db bounded on the Pi's SD card.
+#
+#   python -m utils.compact [--db PATH] [--keep-days N] [--batch N] [--loop HOURS] [--dry-run]
+#
+# Raw readings older than --keep-days are deleted; the rollup tables (what
+# the /api/historic charts read) already hold them, kept current by the
+# insert triggers of utils/db_helpers.py, and retention.raw_since records
+# where the raw data now starts. The cutoff is rounded down to a local
+# Monday 00:00, so every hour, day and ISO-week bucket is either wholly
+# compacted or wholly raw.
+#
+# Work goes one week at a time, oldest first:
+#   1. move raw_since past the week (a one-row transaction)
+#   2. delete the raw rows before raw_since, DELETE_BATCH rows per
+#      transaction with a short pause in between
+# The connection waits at most BUSY_TIMEOUT_S for the write lock; when the
+# receiver holds it the job backs off and retries instead, so it is the
+# compaction that waits, never the receiver's flushes. An interrupted run
+# resumes at step 2 of the week it was in. Afterwards
+# the freed pages are returned to the filesystem with PRAGMA
+# incremental_vacuum, again in small steps. That needs auto_vacuum=INCREMENTAL,
+# which new databases get from init_sensor_db() and migrated ones from
+# utils/migrate_db.py; any other existing one is converted once with
+# --enable-incremental-vacuum (a full VACUUM: it blocks writers and needs as
+# much free space as the database). Without it the
+# freed pages stay in the file and are reused by new readings.
+#
+# With --archive, closed months are first exported to the cold archive
+# (utils/archive.py) and the cutoff is held back to the week start on or
+# before the oldest month with raw readings the archive does not hold (one
+# write_month() refused, or one that got late readings after it was
+# archived), so no raw reading is deleted unarchived.
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.archive import Archive, ARCHIVE_DIR, month_bounds
+from utils.db_helpers import (DB_PATH, SENSOR_SCHEMA, OutdatedSchema, bump_data_version, check_sensor_schema,
+                              enable_incremental_vacuum, from_epoch_ms, get_raw_since, to_epoch_ms)
+
+RAW_RETENTION_DAYS = 90
+DELETE_BATCH = 5000
+VACUUM_PAGES = 1000
+PAUSE_S = 0.05
+# How long one statement waits for the write lock before backing off, well
+# under the receiver's 5 s, and how often it then retries (with growing pauses)
+BUSY_TIMEOUT_S = 0.25
+LOCK_RETRIES = 50
+
+SET_RAW_SINCE_SQL = """
+    INSERT INTO retention (id, raw_since) VALUES (1, ?)
+    ON CONFLICT (id) DO UPDATE SET raw_since = excluded.raw_since
+"""
+DELETE_BATCH_SQL = """
+    DELETE FROM sensor_readings WHERE (sensor_id, ts) IN (
+        SELECT sensor_id, ts FROM sensor_readings WHERE ts < ? ORDER BY ts LIMIT ?
+    )
+"""
+
+
+def week_start(ms):
+    """Local Monday 00:00 on or before epoch ms."""
+    day = from_epoch_ms(ms)
+    return to_epoch_ms(datetime(day.year, day.month, day.day) - timedelta(days=day.weekday()))
+
+
+def _file_bytes(db_path):
+    return sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+
+
+def _is_locked(e):
+    return "locked" in str(e) or "busy" in str(e)
+
+
+def yielding(fn, pause_s=PAUSE_S, retries=LOCK_RETRIES):
+    """
+    Run fn() (one short write transaction); while the database is locked by
+    another writer, roll back, pause and try again.
+    """
+    for attempt in range(retries):
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if not _is_locked(e) or attempt == retries - 1:
+                raise
+            time.sleep(pause_s * (attempt + 1))
+
+
+def delete_before(conn, ts, batch=DELETE_BATCH, pause_s=PAUSE_S):
+    """Delete raw readings older than ts in batches of `batch` rows. Returns (rows, batches)."""
+    def delete():
+        with conn:
+            return conn.execute(DELETE_BATCH_SQL, (ts, batch)).rowcount
+
+    rows = batches = 0
+    while True:
+        n = yielding(delete, pause_s)
+        if n == 0:
+            return rows, batches
+        rows += n
+        batches += 1
+        if n < batch:
+            return rows, batches
+        time.sleep(pause_s)
+
+
+def compact(conn, cutoff, batch=DELETE_BATCH, pause_s=PAUSE_S):
+    """
+    Delete raw readings before the local week start on or before cutoff
+    (epoch ms). Returns counts for the report.
+    """
+    cutoff = week_start(cutoff)
+    result = {"cutoff": cutoff, "weeks": 0, "rows_deleted": 0, "batches": 0}
+    check_sensor_schema(conn)
+
+    def apply_schema():
+        for stmt in SENSOR_SCHEMA:
+            conn.execute(stmt)
+        conn.commit()
+
+    yielding(apply_schema, pause_s)
+
+    # Finish the deletes of an interrupted run first
+    since = get_raw_since(conn)
+    if since is not None:
+        rows, batches = delete_before(conn, since, batch, pause_s)
+        result["rows_deleted"] += rows
+        result["batches"] += batches
+
+    while True:
+        oldest = conn.execute("SELECT MIN(ts) FROM sensor_readings").fetchone()[0]
+        if oldest is None or oldest >= cutoff:
+            break
+        # Weeks before raw_since are done; a late reading there was deleted above
+        start = max(week_start(oldest), since or oldest)
+        if start >= cutoff:
+            break
+        end = min(week_start(start + 8 * 86400 * 1000), cutoff)
+
+        def move_horizon():
+            with conn:
+                conn.execute(SET_RAW_SINCE_SQL, (end,))
+                bump_data_version(conn)
+
+        yielding(move_horizon, pause_s)
+        rows, batches = delete_before(conn, end, batch, pause_s)
+        result["weeks"] += 1
+        result["rows_deleted"] += rows
+        result["batches"] += batches
+        since = end
+    result["raw_since"] = get_raw_since(conn)
+    return result
+
+
+def reclaim(conn, pages=VACUUM_PAGES, pause_s=PAUSE_S):
+    """
+    Give free pages back to the filesystem (auto_vacuum=INCREMENTAL only),
+    `pages` per transaction. Returns bytes reclaimed and bytes still free.
+    """
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    before = conn.execute("PRAGMA page_count").fetchone()[0]
+    incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    if incremental:
+        while conn.execute("PRAGMA freelist_count").fetchone()[0]:
+            # execute() would step the pragma once and free a single page;
+            # executescript() runs it to completion
+            yielding(lambda: conn.executescript(f"PRAGMA incremental_vacuum({pages})"), pause_s)
+            time.sleep(pause_s)
+    # Fold the WAL back into the database file and truncate it
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    after = conn.execute("PRAGMA page_count").fetchone()[0]
+    return {
+        "incremental_vacuum": incremental,
+        "bytes_reclaimed": (before - after) * page_size,
+        "bytes_free": conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+    }
+
+
+def run(db_path, keep_days=RAW_RETENTION_DAYS, batch=DELETE_BATCH, dry_run=False, enable_incremental=False,
+        archive_dir=None):
+    cutoff = week_start(to_epoch_ms(datetime.now() - timedelta(days=keep_days)))
+    if archive_dir:
+        # Only months that end before the cutoff's month can be archived whole
+        archive_before = month_bounds(cutoff)[0]
+        cutoff = week_start(archive_before)
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_S)
+    try:
+        if archive_dir and not dry_run:
+            archive = Archive(archive_dir)
+            for entry in archive.archive_closed_months(conn, before=archive_before):
+                print(f"[INFO] Archived {entry['month']}: {entry['rows']} rows, {entry['bytes'] / 1024:.0f} KiB")
+            covered = archive.covered_until(conn, archive_before)
+            if covered < archive_before:
+                print(f"[WARN] {from_epoch_ms(covered):%Y-%m} has readings that are not archived; "
+                      "keeping the raw readings from there on")
+                cutoff = week_start(covered)
+        if dry_run:
+            rows = conn.execute("SELECT COUNT(*) FROM sensor_readings WHERE ts < ?", (cutoff,)).fetchone()[0]
+            return {"cutoff": cutoff, "rows_to_delete": rows, "dry_run": True}
+
+        size_before = _file_bytes(db_path)
+        t0 = time.monotonic()
+        if enable_incremental:
+            print("[INFO] Converting to auto_vacuum=INCREMENTAL (full VACUUM)...")
+            enable_incremental_vacuum(conn)
+        report = compact(conn, cutoff, batch)
+        report.update(reclaim(conn))
+        report["file_bytes_before"] = size_before
+        report["file_bytes_after"] = _file_bytes(db_path)
+        report["elapsed_s"] = round(time.monotonic() - t0, 3)
+        return report
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Fold old raw readings into the rollups and delete them")
+    p.add_argument("--db", default=DB_PATH)
+    p.add_argument("--keep-days", type=float, default=RAW_RETENTION_DAYS,
+                   help="keep raw readings this many days (default %(default)s), rounded to a week start")
+    p.add_argument("--batch", type=int, default=DELETE_BATCH, help="rows deleted per transaction")
+    p.add_argument("--dry-run", action="store_true", help="only count the rows that would be deleted")
+    p.add_argument("--enable-incremental-vacuum", action="store_true",
+                   help="switch an existing DB to auto_vacuum=INCREMENTAL first (full VACUUM, one-off)")
+    p.add_argument("--archive", nargs="?", const=ARCHIVE_DIR, metavar="DIR",
+                   help=f"export closed months to the cold archive before deleting them (default DIR {ARCHIVE_DIR})")
+    p.add_argument("--loop", type=float, metavar="HOURS", help="keep running, compacting every HOURS")
+    args = p.parse_args(argv)
+
+    enable_incremental = args.enable_incremental_vacuum
+    try:
+        while True:
+            try:
+                report = run(args.db, args.keep_days, args.batch, args.dry_run, enable_incremental, args.archive)
+            except OutdatedSchema as e:
+                sys.exit(f"[ERROR] {e}")
+            enable_incremental = False
+            report["cutoff"] = from_epoch_ms(report["cutoff"]).isoformat()
+            print(json.dumps(report))
+            if not args.loop:
+                break
+            time.sleep(args.loop * 3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import os
+import sqlite3
+from datetime import datetime
+
+DB_PATH = './db/sensor_data.db'
+USER_DB_PATH = './db/users.db'
+
+# Bumped once per committed write batch by every writer (receiver flush,
+# forecast fetch); the API response cache is keyed on it.
+DATA_VERSION_SQL = """
+    CREATE TABLE IF NOT EXISTS data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+"""
+
+# Readings are keyed by node and integer epoch milliseconds (UTC), so two
+# packets from one node in the same second no longer collide, and per-sensor
+# range scans / "latest" lookups walk the primary key directly.
+SENSOR_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS sensor_readings (
+        ts INTEGER NOT NULL,
+        sensor_id INTEGER NOT NULL,
+        soil REAL,
+        temp REAL,
+        hum REAL,
+        rain REAL,
+        total_daily_rain REAL,
+        river REAL,
+        rate_of_rise REAL,
+        high_level_alert INTEGER,
+        PRIMARY KEY (sensor_id, ts)
+    ) WITHOUT ROWID
+    """,
+    # Cross-sensor range scans (/api/historic) filter on time only
+    "CREATE INDEX IF NOT EXISTS idx_sensor_readings_ts ON sensor_readings (ts)",
+    # One row per sensor with its newest reading, so /api/latest is a primary
+    # key lookup no matter how large sensor_readings grows.
+    """
+    CREATE TABLE IF NOT EXISTS latest_readings (
+        sensor_id INTEGER PRIMARY KEY,
+        ts INTEGER NOT NULL,
+        soil REAL,
+        temp REAL,
+        hum REAL,
+        rain REAL,
+        total_daily_rain REAL,
+        river REAL,
+        rate_of_rise REAL,
+        high_level_alert INTEGER
+    )
+    """,
+    # Kept current by whoever writes readings (receiver, seeding scripts);
+    # late/out-of-order rows never overwrite a newer one.
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_latest_readings
+    AFTER INSERT ON sensor_readings
+    BEGIN
+        INSERT INTO latest_readings (sensor_id, ts, soil, temp, hum, rain, total_daily_rain,
+                                     river, rate_of_rise, high_level_alert)
+        VALUES (NEW.sensor_id, NEW.ts, NEW.soil, NEW.temp, NEW.hum, NEW.rain, NEW.total_daily_rain,
+                NEW.river, NEW.rate_of_rise, NEW.high_level_alert)
+        ON CONFLICT (sensor_id) DO UPDATE SET
+            ts = excluded.ts, soil = excluded.soil, temp = excluded.temp, hum = excluded.hum,
+            rain = excluded.rain, total_daily_rain = excluded.total_daily_rain,
+            river = excluded.river, rate_of_rise = excluded.rate_of_rise,
+            high_level_alert = excluded.high_level_alert
+        WHERE excluded.ts >= latest_readings.ts;
+    END
+    """,
+    DATA_VERSION_SQL,
+    "INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)",
+    # Set by the compaction job (utils/compact.py): raw readings before
+    # raw_since were deleted and only survive in the rollups
+    """
+    CREATE TABLE IF NOT EXISTS retention (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        raw_since INTEGER NOT NULL
+    )
+    """,
+]
+
+BUMP_VERSION_SQL = """
+    INSERT INTO data_version (id, version) VALUES (1, 1)
+    ON CONFLICT (id) DO UPDATE SET version = version + 1
+"""
+
+
+# Rollups: per sensor and time bucket, the sum and count of each metric plus
+# the last river level. Buckets are labelled exactly like the /api/historic
+# labels (local time): 'YYYY-MM-DD HH:00', 'YYYY-MM-DD', ISO week 'YYYY-Www'.
+ROLLUP_METRICS = ["soil", "temp", "hum", "rain", "total_daily_rain", "river"]
+
+_LOCAL = "{ts} / 1000, 'unixepoch', 'localtime'"
+ROLLUP_BUCKETS = {
+    "hour": "strftime('%Y-%m-%d %H:00', " + _LOCAL + ")",
+    "day": "date(" + _LOCAL + ")",
+    # ISO week = week of the Thursday in the same Monday-Sunday week
+    "week": ("(SELECT strftime('%Y', t) || '-W' || printf('%02d', (CAST(strftime('%j', t) AS INTEGER) - 1) / 7 + 1)"
+             " FROM (SELECT date(" + _LOCAL + ", '-3 days', 'weekday 4') AS t))"),
+}
+
+
+def _rollup_schema(grain):
+    table = f"rollup_{grain}"
+    bucket = ROLLUP_BUCKETS[grain].format(ts="NEW.ts")
+    metric_cols = "".join(f"        {m}_sum REAL NOT NULL DEFAULT 0,\n        {m}_n INTEGER NOT NULL DEFAULT 0,\n"
+                          for m in ROLLUP_METRICS)
+    names = ", ".join(f"{m}_sum, {m}_n" for m in ROLLUP_METRICS)
+    values = ", ".join(f"COALESCE(NEW.{m}, 0), NEW.{m} IS NOT NULL" for m in ROLLUP_METRICS)
+    updates = ",\n            ".join(f"{m}_sum = {m}_sum + excluded.{m}_sum, {m}_n = {m}_n + excluded.{m}_n"
+                                      for m in ROLLUP_METRICS)
+    newer_river = ("excluded.river_last_ts IS NOT NULL"
+                   " AND (river_last_ts IS NULL OR excluded.river_last_ts >= river_last_ts)")
+    return [
+        f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        bucket TEXT NOT NULL,
+        sensor_id INTEGER NOT NULL,
+        n INTEGER NOT NULL DEFAULT 0,
+{metric_cols}        river_last REAL,
+        river_last_ts INTEGER,
+        PRIMARY KEY (bucket, sensor_id)
+    ) WITHOUT ROWID
+    """,
+        f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{table}
+    AFTER INSERT ON sensor_readings
+    BEGIN
+        INSERT INTO {table} (bucket, sensor_id, n, {names}, river_last, river_last_ts)
+        VALUES ({bucket}, NEW.sensor_id, 1, {values},
+                NEW.river, CASE WHEN NEW.river IS NULL THEN NULL ELSE NEW.ts END)
+        ON CONFLICT (bucket, sensor_id) DO UPDATE SET
+            n = n + 1,
+            {updates},
+            river_last = CASE WHEN {newer_river} THEN excluded.river_last ELSE river_last END,
+            river_last_ts = CASE WHEN {newer_river} THEN excluded.river_last_ts ELSE river_last_ts END;
+    END
+    """,
+    ]
+
+
+for _grain in ROLLUP_BUCKETS:
+    SENSOR_SCHEMA.extend(_rollup_schema(_grain))
+
+
+def to_epoch_ms(dt):
+    """Naive local datetime -> epoch milliseconds."""
+    return int(dt.timestamp() * 1000)
+
+
+def from_epoch_ms(ms):
+    """Epoch milliseconds -> naive local datetime."""
+    return datetime.fromtimestamp(ms / 1000.0)
+
+
+def format_ts(ms):
+    """Epoch milliseconds -> the 'YYYY-MM-DD HH:MM:SS' local string the API has always returned."""
+    return from_epoch_ms(ms).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class OutdatedSchema(RuntimeError):
+    """sensor_readings predates the epoch-ms schema; SENSOR_SCHEMA cannot be applied to it."""
+
+
+def check_sensor_schema(conn):
+    """Raise OutdatedSchema if sensor_readings still has text timestamps (see utils/migrate_db.py)."""
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(sensor_readings)")]
+    if cols and "ts" not in cols:
+        raise OutdatedSchema("sensor_readings still uses text timestamps, run: python -m utils.migrate_db")
+
+
+def init_sensor_db(conn=None):
+    """Create missing sensor tables/triggers and backfill latest_readings / rollups if they are empty."""
+    own_conn = conn is None
+    if own_conn:
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(DB_PATH)
+    try:
+        try:
+            check_sensor_schema(conn)
+        except OutdatedSchema as e:
+            print(f"[WARN] {e}")
+            return
+        # Lets utils/compact.py return freed pages to the filesystem; only
+        # takes effect while the file is still empty, an existing DB needs
+        # enable_incremental_vacuum() (utils/migrate_db.py runs it)
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        for stmt in SENSOR_SCHEMA:
+            conn.execute(stmt)
+        conn.commit()
+        if conn.execute("SELECT 1 FROM latest_readings LIMIT 1").fetchone() is None:
+            rebuild_latest(conn)
+        if conn.execute("SELECT 1 FROM rollup_hour LIMIT 1").fetchone() is None:
+            rebuild_rollups(conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def enable_incremental_vacuum(conn):
+    """Switch an existing database to auto_vacuum=INCREMENTAL. Rewrites the whole file (VACUUM)."""
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def bump_data_version(conn):
+    """Mark sensor/forecast data as changed; call inside the writing transaction."""
+    conn.execute(BUMP_VERSION_SQL)
+
+
+def get_data_version(conn):
+    """Current data version, or None if the DB has no data_version table yet."""
+    try:
+        row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else 0
+
+
+def rebuild_latest(conn):
+    """Refill latest_readings from sensor_readings (after a migration or bulk load)."""
+    with conn:
+        conn.execute("DELETE FROM latest_readings")
+        conn.execute("""
+            INSERT INTO latest_readings (sensor_id, ts, soil, temp, hum, rain, total_daily_rain,
+                                         river, rate_of_rise, high_level_alert)
+            SELECT r.sensor_id, r.ts, r.soil, r.temp, r.hum, r.rain, r.total_daily_rain,
+                   r.river, r.rate_of_rise, r.high_level_alert
+            FROM (SELECT sensor_id, MAX(ts) AS ts FROM sensor_readings GROUP BY sensor_id) m
+            JOIN sensor_readings r ON r.sensor_id = m.sensor_id AND r.ts = m.ts
+        """)
+
+
+def get_raw_since(conn):
+    """Epoch ms before which raw readings were compacted away (utils/compact.py), or None."""
+    try:
+        row = conn.execute("SELECT raw_since FROM retention WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def fold_rollups(conn, start_ts=None, end_ts=None):
+    """
+    Recompute the rollup buckets of readings in [start_ts, end_ts) from
+    sensor_readings, in the caller's transaction. The bounds should be
+    local week starts, so no hour/day/week bucket straddles them.
+    """
+    sums = ", ".join(f"TOTAL({m}), COUNT({m})" for m in ROLLUP_METRICS)
+    names = ", ".join(f"{m}_sum, {m}_n" for m in ROLLUP_METRICS)
+    for grain, expr in ROLLUP_BUCKETS.items():
+        table = f"rollup_{grain}"
+        where, params = [], []
+        bucket_where, bucket_params = [], []
+        if start_ts is not None:
+            where.append("ts >= ?")
+            params.append(start_ts)
+            bucket_where.append(f"bucket >= {expr.format(ts='?')}")
+            bucket_params.append(start_ts)
+        if end_ts is not None:
+            where.append("ts < ?")
+            params.append(end_ts)
+            bucket_where.append(f"bucket < {expr.format(ts='?')}")
+            bucket_params.append(end_ts)
+        # Bucket labels sort in time order, so a range of them is a range of buckets
+        conn.execute(f"DELETE FROM {table}" + (" WHERE " + " AND ".join(bucket_where) if bucket_where else ""),
+                     bucket_params)
+        # With a single max() aggregate SQLite takes the bare column (river)
+        # from the row holding that max, i.e. the last river reading.
+        conn.execute(f"""
+            INSERT INTO {table} (bucket, sensor_id, n, {names}, river_last_ts, river_last)
+            SELECT {expr.format(ts="ts")} AS b, sensor_id, COUNT(*), {sums},
+                   MAX(CASE WHEN river IS NOT NULL THEN ts END), river
+            FROM sensor_readings
+            {"WHERE " + " AND ".join(where) if where else ""}
+            GROUP BY b, sensor_id
+        """, params)
+
+
+def rebuild_rollups(conn):
+    """
+    Recompute the rollup tables from sensor_readings. Buckets older than the
+    compaction horizon are kept: their raw readings no longer exist.
+    """
+    with conn:
+        fold_rollups(conn, get_raw_since(conn))
+
+
+def get_user_conn():
+    conn = sqlite3.connect(USER_DB_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_user_db():
+    os.makedirs(os.path.dirname(USER_DB_PATH), exist_ok=True)
+    conn = get_user_conn()
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password BLOB NOT NULL
+            )
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+
@@ -0,0 +1,70 @@
+# Largest-Triangle-Three-Buckets downsampling (Steinarsson, 2013).
+#
+# Keeps the first and last point and, from each of the (n_out - 2) buckets in
+# between, the point forming the largest triangle with the previously kept
+# point and the average of the next bucket. Unlike bucket averages this keeps
+# spikes (e.g. a short river peak) visible on the chart.
+
+import numpy as np
+
+
+def _bucket_bounds(n, n_out):
+    # Bucket i (1 .. n_out-2) covers [edges[i-1], edges[i]) of the inner points
+    edges = (np.floor(np.arange(n_out - 1) * ((n - 2) / (n_out - 2))) + 1).astype(np.int64)
+    edges[-1] = n - 1
+    return edges[:-1], edges[1:]
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices of the points LTTB keeps from (x, y), in ascending order.
+    x must be sorted; neither array may contain NaN.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    starts, ends = _bucket_bounds(n, n_out)
+
+    # Average point of every bucket, from prefix sums; the last bucket's
+    # "next" is the final point itself.
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    counts = ends - starts
+    avg_x = np.append((cx[ends] - cx[starts]) / counts, x[-1])
+    avg_y = np.append((cy[ends] - cy[starts]) / counts, y[-1])
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    # Each choice depends on the previous one, so the loop is over buckets
+    # (at most n_out) while the work inside a bucket is vectorized.
+    for i in range(n_out - 2):
+        s, e = starts[i], ends[i]
+        bx, by = x[s:e], y[s:e]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = s + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def lttb(x, y, n_out):
+    """(x, y) downsampled to at most n_out points."""
+    idx = lttb_indices(x, y, n_out)
+    return np.asarray(x)[idx], np.asarray(y)[idx]
+
+
+def downsample_columns(ts, columns, n_out):
+    """
+    ts: sorted 1-D array; columns: {name: 1-D float array, NaN = no reading}.
+    Returns {name: (ts, values)} with each series downsampled on its own
+    non-missing points.
+    """
+    out = {}
+    for name, values in columns.items():
+        present = ~np.isnan(values)
+        out[name] = lttb(ts[present], values[present], n_out)
+    return out
@@ -0,0 +1,125 @@
+# Server-Sent Events hub for the dashboard.
+#
+# One watcher thread per process notices new data and publishes events; each
+# open /api/stream connection gets its own bounded queue. Events carry an id
+# "<boot>-<n>": a random token per hub (i.e. per process start) and a
+# counter, and the last EVENT_BUFFER of them are kept, so a browser
+# reconnecting with Last-Event-ID gets exactly what it missed. If the id is
+# unknown (another boot, or too far behind) the caller sends a fresh snapshot
+# instead.
+
+import json
+import queue
+import secrets
+import threading
+from collections import deque, namedtuple
+
+EVENT_BUFFER = 256
+SUBSCRIBER_QUEUE = 64
+KEEPALIVE_S = 15
+
+Event = namedtuple("Event", ["id", "name", "data"])
+
+
+def format_event(event):
+    return f"id: {event.id}\nevent: {event.name}\ndata: {json.dumps(event.data)}\n\n"
+
+
+class EventHub:
+
+    def __init__(self, buffer_size=EVENT_BUFFER, boot=None):
+        self.boot = boot or secrets.token_hex(4)
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=buffer_size)  # (n, event)
+        self._subscribers = set()
+        self._last_n = 0
+        self._watcher = None
+
+    def _event_id(self, n):
+        return f"{self.boot}-{n}"
+
+    @property
+    def last_id(self):
+        return self._event_id(self._last_n)
+
+    def _parse_id(self, event_id):
+        """Counter of an id issued by this hub, or None (other boot, or not an event id)."""
+        boot, _, n = str(event_id).rpartition("-")
+        if boot != self.boot or not n.isdigit():
+            return None
+        return int(n)
+
+    def publish(self, name, data):
+        with self._lock:
+            self._last_n += 1
+            event = Event(self._event_id(self._last_n), name, data)
+            self._buffer.append((self._last_n, event))
+            for q in list(self._subscribers):
+                try:
+                    q.put_nowait(event)
+                except queue.Full:
+                    # Too slow to keep up: cut it off, it resumes from Last-Event-ID
+                    self._subscribers.discard(q)
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """
+        Returns (queue, missed) where missed is the list of buffered events
+        after last_event_id (a Last-Event-ID header value), or None if they
+        cannot all be replayed.
+        """
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE)
+        last_n = None if last_event_id is None else self._parse_id(last_event_id)
+        with self._lock:
+            self._subscribers.add(q)
+            missed = None
+            if last_n is not None and last_n <= self._last_n:
+                oldest = self._buffer[0][0] if self._buffer else self._last_n + 1
+                if last_n >= oldest - 1:
+                    missed = [e for n, e in self._buffer if n > last_n]
+        return q, missed
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def is_subscribed(self, q):
+        with self._lock:
+            return q in self._subscribers
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stream(self, q, first_events):
+        """Generator of SSE text for one connection."""
+        try:
+            yield "retry: 3000\n\n"
+            for event in first_events:
+                yield format_event(event)
+            while True:
+                try:
+                    yield format_event(q.get(timeout=KEEPALIVE_S))
+                except queue.Empty:
+                    if not self.is_subscribed(q):
+                        return
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(q)
+
+    def start_watcher(self, poll, interval_s):
+        """Run poll(hub) every interval_s seconds in one daemon thread (idempotent)."""
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, args=(poll, interval_s),
+                                             name="event-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self, poll, interval_s):
+        stop = threading.Event()
+        while not stop.wait(interval_s):
+            try:
+                poll(self)
+            except Exception as e:
+                print(f"[ERROR] Event watcher: {e}")
@@ -1,62 +1,359 @@
-import requests
+# Fetches the Open-Meteo forecast for each site and stores it hourly.
+#
+#   python -m utils.getforecast [--db PATH] [--days N] [--sites FILE] [--loop]
+#
+# One requests.Session is reused for every site, so the TLS connection to the
+# API stays open between requests. Per site the fetcher remembers the
+# response's ETag / Last-Modified and how long it is fresh (Cache-Control
+# max-age or Expires, FORECAST_REFRESH_S if neither is sent) in the
+# forecast_fetch table, so a cron run does not refetch a forecast that is
+# still fresh and revalidates it with a conditional request when it is not.
+# Failed fetches back off exponentially (or as long as Retry-After asks).
+#
+# Hourly values go to forecast_hourly (one WITHOUT ROWID row per site and
+# hour). The first site's local days are also summarised into the daily
+# forecast table the dashboard and alert rules read.
+
+import argparse
+import email.utils
+import json
+import random
 import sqlite3
-from datetime import date
+import sys
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.db_helpers import DATA_VERSION_SQL, bump_data_version
 
 DB_PATH = 'db/sensor_data.db'
+API_URL = "https://api.open-meteo.com/v1/forecast"
 
-def fetch_and_store_forecast():
-    url = (
-        "https://api.open-meteo.com/v1/forecast"
-        "?latitude=51.108"
-        "&longitude=4.161"
-        "&daily=temperature_2m_max,temperature_2m_min,precipitation_probability_max,rain_sum"
-        "&timezone=GMT"
-        "&forecast_days=1"
+SITES = [{"id": "home", "lat": 51.108, "lon": 4.161}]
+FORECAST_DAYS = 3
+HOURLY_VARS = ["temperature_2m", "precipitation_probability", "precipitation", "rain"]
+
+FORECAST_REFRESH_S = 3600   # Open-Meteo updates its models about hourly
+REQUEST_TIMEOUT_S = 10
+BACKOFF_BASE_S = 60
+BACKOFF_MAX_S = 6 * 3600
+
+FORECAST_SCHEMA = [
+    # Daily summary read by /api/forecast/today (unchanged columns)
+    """
+    CREATE TABLE IF NOT EXISTS forecast (
+        date TEXT PRIMARY KEY,
+        min_temp REAL,
+        max_temp REAL,
+        has_precip INTEGER,
+        precip_prob INTEGER,
+        precip_intensity TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS forecast_hourly (
+        site TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        temp REAL,
+        precip_prob INTEGER,
+        precip REAL,
+        rain REAL,
+        PRIMARY KEY (site, ts)
+    ) WITHOUT ROWID
+    """,
+    # HTTP cache / backoff state per site, kept across runs
+    """
+    CREATE TABLE IF NOT EXISTS forecast_fetch (
+        site TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        fresh_until REAL NOT NULL DEFAULT 0,
+        failures INTEGER NOT NULL DEFAULT 0,
+        retry_at REAL NOT NULL DEFAULT 0
     )
-    resp = requests.get(url)
-    resp.raise_for_status()
-    data = resp.json()
+    """,
+    DATA_VERSION_SQL,
+]
 
-    daily = data["daily"]
+# Upserts only count (and rewrite) rows whose values actually changed, so an
+# unchanged forecast does not invalidate the dashboard's response cache.
+HOURLY_UPSERT_SQL = """
+    INSERT INTO forecast_hourly (site, ts, temp, precip_prob, precip, rain)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (site, ts) DO UPDATE SET
+        temp = excluded.temp, precip_prob = excluded.precip_prob,
+        precip = excluded.precip, rain = excluded.rain
+    WHERE temp IS NOT excluded.temp OR precip_prob IS NOT excluded.precip_prob
+       OR precip IS NOT excluded.precip OR rain IS NOT excluded.rain
+"""
 
-    min_temp = daily["temperature_2m_min"][0]
-    max_temp = daily["temperature_2m_max"][0]
-    precip_prob = daily.get("precipitation_probability_max", [0])[0]
-    rain_sum = daily.get("rain_sum", [0])[0]
+DAILY_UPSERT_SQL = """
+    INSERT INTO forecast (date, min_temp, max_temp, has_precip, precip_prob, precip_intensity)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (date) DO UPDATE SET
+        min_temp = excluded.min_temp, max_temp = excluded.max_temp,
+        has_precip = excluded.has_precip, precip_prob = excluded.precip_prob,
+        precip_intensity = excluded.precip_intensity
+    WHERE min_temp IS NOT excluded.min_temp OR max_temp IS NOT excluded.max_temp
+       OR has_precip IS NOT excluded.has_precip OR precip_prob IS NOT excluded.precip_prob
+       OR precip_intensity IS NOT excluded.precip_intensity
+"""
 
-    # Define has_precip
-    has_precip = int((precip_prob > 0) or (rain_sum > 0))
 
-    # Map rain_sum into a text category for precip_intensity
+def precip_intensity(has_precip, rain_sum):
+    """Daily rain sum (mm) -> the text category stored in forecast.precip_intensity."""
     if not has_precip:
-        precip_intensity = "NA"
-    elif rain_sum < 2.5:
-        precip_intensity = "Light"
-    elif rain_sum < 7.5:
-        precip_intensity = "Moderate"
-    else:
-        precip_intensity = "Heavy"
-
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    # Keep schema the same
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS forecast (
-            date TEXT PRIMARY KEY,
-            min_temp REAL,
-            max_temp REAL,
-            has_precip INTEGER,
-            precip_prob INTEGER,
-            precip_intensity TEXT
+        return "NA"
+    if rain_sum < 2.5:
+        return "Light"
+    if rain_sum < 7.5:
+        return "Moderate"
+    return "Heavy"
+
+
+def parse_hourly(data):
+    """Open-Meteo JSON (timeformat=unixtime) -> [(ts_ms, temp, precip_prob, precip, rain)]."""
+    hourly = data["hourly"]
+    n = len(hourly["time"])
+    columns = [hourly.get(var) or [None] * n for var in HOURLY_VARS]
+    return [(int(t) * 1000, *values) for t, *values in zip(hourly["time"], *columns)]
+
+
+def summarise_days(rows):
+    """
+    Hourly rows -> forecast table rows, one per local day. Days the response
+    only partly covers are left out (23 hours allows for the DST change).
+    """
+    days = OrderedDict()
+    for row in rows:
+        days.setdefault(datetime.fromtimestamp(row[0] / 1000).date().isoformat(), []).append(row)
+
+    out = []
+    for day, hours in days.items():
+        if len(hours) < 23:
+            continue
+        temps = [h[1] for h in hours if h[1] is not None]
+        probs = [h[2] for h in hours if h[2] is not None]
+        rain_sum = sum(h[4] or 0 for h in hours)
+        precip_prob = max(probs) if probs else 0
+        has_precip = int(precip_prob > 0 or rain_sum > 0)
+        out.append((day, min(temps) if temps else None, max(temps) if temps else None,
+                    has_precip, precip_prob, precip_intensity(has_precip, rain_sum)))
+    return out
+
+
+def _freshness_s(resp, now):
+    """Seconds the response may be reused without asking again."""
+    cache_control = resp.headers.get("Cache-Control", "").lower()
+    for directive in cache_control.split(","):
+        directive = directive.strip()
+        if directive in ("no-cache", "no-store"):
+            return 0
+        if directive.startswith("max-age="):
+            try:
+                return max(0, int(directive[8:]) - int(resp.headers.get("Age", 0) or 0))
+            except ValueError:
+                pass
+    expires = resp.headers.get("Expires")
+    if expires:
+        try:
+            return max(0, email.utils.parsedate_to_datetime(expires).timestamp() - now)
+        except (TypeError, ValueError):
+            return 0
+    return FORECAST_REFRESH_S
+
+
+def _retry_after_s(resp):
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if not value:
+        return 0
+    if value.isdigit():
+        return int(value)
+    try:
+        return max(0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
+
+
+class ForecastFetcher:
+    """
+    Fetches and stores the forecast of each site in sites ({"id", "lat", "lon"}).
+    api_url can point at a local server in tests; clock is time.time.
+    """
+
+    def __init__(self, conn, sites=SITES, days=FORECAST_DAYS, api_url=API_URL,
+                 session=None, clock=time.time, timeout_s=REQUEST_TIMEOUT_S):
+        self.conn = conn
+        self.sites = list(sites)
+        self.days = days
+        self.api_url = api_url
+        self.session = session or requests.Session()
+        self.clock = clock
+        self.timeout_s = timeout_s
+        for stmt in FORECAST_SCHEMA:
+            conn.execute(stmt)
+        conn.commit()
+
+    def _state(self, site_id):
+        row = self.conn.execute(
+            "SELECT etag, last_modified, fresh_until, failures, retry_at FROM forecast_fetch WHERE site = ?",
+            (site_id,)
+        ).fetchone()
+        keys = ("etag", "last_modified", "fresh_until", "failures", "retry_at")
+        return dict(zip(keys, row)) if row else dict(zip(keys, (None, None, 0, 0, 0)))
+
+    def _save_state(self, site_id, state):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO forecast_fetch (site, etag, last_modified, fresh_until, failures, retry_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (site_id, state["etag"], state["last_modified"], state["fresh_until"],
+             state["failures"], state["retry_at"])
         )
-    ''')
-    c.execute('''
-        INSERT OR REPLACE INTO forecast (date, min_temp, max_temp, has_precip, precip_prob, precip_intensity)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (date.today().isoformat(), min_temp, max_temp, has_precip, precip_prob, precip_intensity))
-    conn.commit()
-    conn.close()
-    print(f"Forecast stored for {date.today().isoformat()}")
+
+    def next_due(self):
+        """Seconds until some site needs fetching (0 if one already does)."""
+        now = self.clock()
+        waits = []
+        for site in self.sites:
+            state = self._state(site["id"])
+            waits.append(max(state["fresh_until"], state["retry_at"]) - now)
+        return max(0.0, min(waits)) if waits else FORECAST_REFRESH_S
+
+    def _params(self, site):
+        return {
+            "latitude": site["lat"],
+            "longitude": site["lon"],
+            "hourly": ",".join(HOURLY_VARS),
+            "forecast_days": self.days,
+            "timezone": "auto",
+            "timeformat": "unixtime",
+        }
+
+    def fetch_site(self, site, force=False):
+        """
+        Fetch one site if it is due. Returns 'updated', 'unchanged',
+        'not modified', 'fresh', 'backoff' or 'error'.
+        """
+        site_id = site["id"]
+        state = self._state(site_id)
+        now = self.clock()
+        if not force:
+            if now < state["retry_at"]:
+                return "backoff"
+            if now < state["fresh_until"]:
+                return "fresh"
+
+        headers = {}
+        if state["etag"]:
+            headers["If-None-Match"] = state["etag"]
+        if state["last_modified"]:
+            headers["If-Modified-Since"] = state["last_modified"]
+
+        resp = None
+        try:
+            resp = self.session.get(self.api_url, params=self._params(site),
+                                    headers=headers, timeout=self.timeout_s)
+            if resp.status_code == 304:
+                result, rows = "not modified", None
+            else:
+                resp.raise_for_status()
+                rows = parse_hourly(resp.json())
+                result = None
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            state["failures"] += 1
+            delay = min(BACKOFF_BASE_S * 2 ** (state["failures"] - 1), BACKOFF_MAX_S)
+            delay = max(delay * random.uniform(0.8, 1.2), _retry_after_s(resp))
+            state["retry_at"] = now + delay
+            with self.conn:
+                self._save_state(site_id, state)
+            print(f"[WARN] Forecast fetch for {site_id} failed ({e}); retrying in {delay:.0f}s")
+            return "error"
+
+        state["failures"] = 0
+        state["retry_at"] = 0
+        state["fresh_until"] = now + _freshness_s(resp, now)
+        if "no-store" not in resp.headers.get("Cache-Control", "").lower():
+            state["etag"] = resp.headers.get("ETag") or state["etag"]
+            state["last_modified"] = resp.headers.get("Last-Modified") or state["last_modified"]
+
+        with self.conn:
+            self._save_state(site_id, state)
+            if rows is not None:
+                changed = self.store(site_id, rows, daily=site is self.sites[0])
+                result = "updated" if changed else "unchanged"
+        return result
+
+    def store(self, site_id, rows, daily=False):
+        """Upsert hourly rows (and, for the dashboard's site, the daily summaries). Returns rows changed."""
+        changed = self.conn.executemany(HOURLY_UPSERT_SQL, [(site_id, *r) for r in rows]).rowcount
+        if daily:
+            changed += self.conn.executemany(DAILY_UPSERT_SQL, summarise_days(rows)).rowcount
+        if changed > 0:
+            # Tell the dashboard's response cache the forecast changed
+            bump_data_version(self.conn)
+        return changed
+
+    def run_once(self, force=False):
+        return {site["id"]: self.fetch_site(site, force) for site in self.sites}
+
+    def close(self):
+        self.session.close()
+
+
+def load_sites(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def fetch_and_store_forecast(db_path=DB_PATH, sites=SITES, days=FORECAST_DAYS, force=False):
+    conn = sqlite3.connect(db_path)
+    fetcher = ForecastFetcher(conn, sites, days)
+    try:
+        results = fetcher.run_once(force)
+    finally:
+        fetcher.close()
+        conn.close()
+    for site_id, result in results.items():
+        print(f"Forecast for {site_id}: {result}")
+    return results
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Fetch the hourly forecast for each site")
+    p.add_argument("--db", default=DB_PATH)
+    p.add_argument("--days", type=int, default=FORECAST_DAYS, help="days ahead to fetch (default %(default)s)")
+    p.add_argument("--sites", help='JSON file: [{"id": ..., "lat": ..., "lon": ...}, ...]; the first one '
+                                   'feeds the dashboard')
+    p.add_argument("--force", action="store_true", help="fetch even if the stored forecast is still fresh")
+    p.add_argument("--loop", action="store_true", help="keep running, fetching whenever a site is due")
+    args = p.parse_args(argv)
+
+    sites = load_sites(args.sites) if args.sites else SITES
+    if not args.loop:
+        fetch_and_store_forecast(args.db, sites, args.days, args.force)
+        return
+
+    conn = sqlite3.connect(args.db)
+    fetcher = ForecastFetcher(conn, sites, args.days)
+    try:
+        force = args.force
+        while True:
+            for site_id, result in fetcher.run_once(force).items():
+                if result not in ("fresh", "backoff"):
+                    print(f"Forecast for {site_id}: {result}")
+            force = False
+            time.sleep(max(1.0, fetcher.next_due()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fetcher.close()
+        conn.close()
+
 
 if __name__ == "__main__":
-    fetch_and_store_forecast()
+    main()
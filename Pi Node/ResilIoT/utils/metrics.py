@@ -0,0 +1,25 @@
+# metrics.py
+# The dashboard process's metrics registry (classes in utils/prometheus.py).
+# The LoRa receiver runs in its own process with its own registry: it writes
+# it to a textfile next to the database and the dashboard's /metrics appends
+# it (read_textfile).
+
+import os
+import time
+
+from utils.prometheus import Registry
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# The dashboard process's registry
+REGISTRY = Registry()
+
+
+def read_textfile(path):
+    """(text, age in seconds) of a snapshot written by write_textfile, or (None, None) if missing."""
+    try:
+        with open(path) as f:
+            text = f.read()
+        return text, max(0.0, time.time() - os.path.getmtime(path))
+    except OSError:
+        return None, None
@@ -0,0 +1,111 @@
+# Migrates sensor_readings from text timestamps ('YYYY-MM-DD HH:MM:SS', local
+# time, 1 s resolution) to integer epoch milliseconds keyed on (sensor_id, ts).
+# Run on a new or already migrated DB it only creates whatever part of the
+# schema is missing (tables, triggers, derived tables), e.g. before the LoRa
+# receiver is first pointed at it.
+#
+#   python -m utils.migrate_db [db_path] [--keep-old] [--vacuum]
+#
+# The new table is created with its index only and the triggers afterwards,
+# so they do not fire for every copied row; latest_readings and the rollups
+# are then rebuilt once. Finally the DB is switched to
+# auto_vacuum=INCREMENTAL (one VACUUM), so utils/compact.py can give freed
+# pages back to the filesystem.
+
+import argparse
+import sqlite3
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.db_helpers import (DB_PATH, SENSOR_SCHEMA, enable_incremental_vacuum, init_sensor_db,
+                              rebuild_latest, rebuild_rollups)
+
+VALUE_COLUMNS = ["soil", "temp", "hum", "rain", "total_daily_rain",
+                 "river", "rate_of_rise", "high_level_alert"]
+
+
+def table_columns(conn, table):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def needs_migration(conn):
+    cols = table_columns(conn, "sensor_readings")
+    return "timestamp" in cols and "ts" not in cols
+
+
+def migrate(conn, keep_old=False):
+    """Rewrite sensor_readings in place. Returns (rows_before, rows_after)."""
+    if not table_columns(conn, "sensor_readings"):
+        print("No sensor_readings table yet, creating the schema")
+        return 0, 0
+    if not needs_migration(conn):
+        print("sensor_readings already uses integer timestamps, nothing to do")
+        n = conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0]
+        return n, n
+
+    old_cols = set(table_columns(conn, "sensor_readings"))
+    # Old DBs created by hand may lack some columns; copy those as NULL
+    select_cols = ", ".join(c if c in old_cols else "NULL" for c in VALUE_COLUMNS)
+
+    conn.isolation_level = None
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        before = conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0]
+        conn.execute("ALTER TABLE sensor_readings RENAME TO sensor_readings_old")
+        for stmt in SENSOR_SCHEMA:
+            if "CREATE TRIGGER" not in stmt:
+                conn.execute(stmt)
+        # Text timestamps were written with the Pi's local clock; 'utc' converts
+        # them so the stored epoch is absolute.
+        conn.execute(f"""
+            INSERT OR IGNORE INTO sensor_readings (ts, sensor_id, {", ".join(VALUE_COLUMNS)})
+            SELECT CAST(strftime('%s', timestamp, 'utc') AS INTEGER) * 1000, sensor_id, {select_cols}
+            FROM sensor_readings_old
+            WHERE timestamp IS NOT NULL AND sensor_id IS NOT NULL
+              AND strftime('%s', timestamp, 'utc') IS NOT NULL
+        """)
+        after = conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0]
+        if not keep_old:
+            conn.execute("DROP TABLE sensor_readings_old")
+        for stmt in SENSOR_SCHEMA:
+            conn.execute(stmt)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.isolation_level = ""
+
+    rebuild_latest(conn)
+    rebuild_rollups(conn)
+    return before, after
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Migrate sensor_readings to epoch-millisecond timestamps")
+    p.add_argument("db_path", nargs="?", default=DB_PATH)
+    p.add_argument("--keep-old", action="store_true", help="keep the original table as sensor_readings_old")
+    p.add_argument("--vacuum", action="store_true",
+                   help="VACUUM afterwards even if the DB already uses auto_vacuum=INCREMENTAL")
+    args = p.parse_args(argv)
+
+    conn = sqlite3.connect(args.db_path)
+    try:
+        before, after = migrate(conn, keep_old=args.keep_old)
+        print(f"Migrated {args.db_path}: {before} rows in, {after} rows out "
+              f"({before - after} skipped as unparsable or duplicate)")
+        # Derived tables (latest_readings, ...) may be newer than the DB
+        init_sensor_db(conn)
+        # Setting auto_vacuum on a non-empty DB only takes effect with a
+        # VACUUM, which also returns the old table's pages
+        if args.vacuum or conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print("[INFO] VACUUM to switch to auto_vacuum=INCREMENTAL...")
+            enable_incremental_vacuum(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,19 @@ import json
 
 THRESHOLDS_FILE = os.path.join(os.path.dirname(__file__), "..", "db", "thresholds.json")
 
-def load_thresholds():
+# Used until thresholds are saved from the params page (same keys as the form)
+DEFAULT_THRESHOLDS = {
+    "Low": {"river_max": 2.0, "soil_min": 20, "soil_max": 80},
+    "Mid": {"river_max": 2.2, "soil_min": 15, "soil_max": 85, "rain_thresh": 3.0},
+    "High": {"river_max": 2.5, "soil_min": 10, "soil_max": 90, "rain_thresh": 5.0}
+}
+
+def load_thresholds(path=THRESHOLDS_FILE):
     try:
-        with open(THRESHOLDS_FILE, "r") as f:
+        with open(path, "r") as f:
             return json.load(f)
     except FileNotFoundError:
-        return {
-            "Low": {"river": 2.0, "soil_min": 20, "soil_max": 80},
-            "Mid": {"river": 2.2, "soil_min": 15, "soil_max": 85},
-            "High": {"river": 2.5, "soil_min": 10, "soil_max": 90}
-        }
+        return {level: dict(values) for level, values in DEFAULT_THRESHOLDS.items()}
 
 def save_thresholds(thresholds):
     with open(THRESHOLDS_FILE, "w") as f:
@@ -0,0 +1,219 @@
+# query_trace.py
+# Optional SQL tracing for the dashboard's connections.
+#
+# With tracing on, connect() returns a TracedConnection:
+#   - sqlite3's trace callback records every statement as executed, with its
+#     parameters expanded (statements run by triggers included)
+#   - the progress handler counts virtual machine steps per statement, a
+#     cheap measure of how much of the database a query walked
+#   - execute() and fetch*() are timed, so a statement's time includes
+#     stepping through its rows, not just preparing it
+# When the connection is closed its statements are added to the trace of the
+# current request (a context variable, so Flask request threads and the alert
+# engine thread don't mix). Statements slower than slow_ms get an EXPLAIN
+# QUERY PLAN and a line in the slow-query log (JSON lines).
+#
+# With tracing off, connect() is plain sqlite3.connect().
+
+import contextvars
+import json
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime
+from time import perf_counter
+
+SLOW_QUERY_MS = 50.0
+SLOW_LOG_PATH = './db/slow_queries.log'
+# The progress handler runs every this many VM instructions
+PROGRESS_STEPS = 1000
+# Traces kept for the debug endpoint
+RECENT_REQUESTS = 50
+RECENT_SLOW = 100
+
+_current = contextvars.ContextVar("sql_trace", default=None)
+
+
+def _is_full_scan(plan):
+    # "SCAN sensor_readings" walks the whole table; "SCAN ... USING INDEX" and
+    # "SEARCH ..." only touch the matching part
+    return any(detail.startswith("SCAN ") and " USING " not in detail for detail in plan)
+
+
+class TracedCursor(sqlite3.Cursor):
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._statement = None
+
+    def _add(self, elapsed, rows=0):
+        if self._statement is not None:
+            self._statement["ms"] += elapsed * 1000.0
+            self._statement["rows"] += rows
+
+    def _execute(self, fn, *args):
+        conn = self.connection
+        conn._last = None
+        start = perf_counter()
+        try:
+            return fn(self, *args)
+        finally:
+            # The trace callback recorded the statement when it started
+            self._statement = conn._last
+            self._add(perf_counter() - start)
+
+    def _fetch(self, fn, *args):
+        conn = self.connection
+        conn._active = self._statement
+        start = perf_counter()
+        try:
+            result = fn(self, *args)
+        finally:
+            conn._active = None
+        rows = len(result) if isinstance(result, list) else int(result is not None)
+        self._add(perf_counter() - start, rows)
+        return result
+
+    def execute(self, sql, parameters=()):
+        return self._execute(sqlite3.Cursor.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._execute(sqlite3.Cursor.executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self._fetch(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(sqlite3.Cursor.fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(sqlite3.Cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+
+class TracedConnection(sqlite3.Connection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tracer = None
+        self.statements = []
+        self._last = None
+        self._active = None
+        self.set_trace_callback(self._on_statement)
+        self.set_progress_handler(self._on_progress, PROGRESS_STEPS)
+
+    def _on_statement(self, sql):
+        statement = {"sql": sql, "ms": 0.0, "steps": 0, "rows": 0}
+        self.statements.append(statement)
+        self._last = statement
+
+    def _on_progress(self):
+        statement = self._active or self._last
+        if statement is not None:
+            statement["steps"] += PROGRESS_STEPS
+        return 0  # non-zero would abort the statement
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def explain(self, sql):
+        """EXPLAIN QUERY PLAN details of an (expanded) statement, untraced."""
+        self.set_trace_callback(None)
+        self.set_progress_handler(None, 0)
+        try:
+            return [row[3] for row in sqlite3.Connection.execute(self, "EXPLAIN QUERY PLAN " + sql)]
+        except sqlite3.Error as e:
+            return [f"(no plan: {e})"]
+        finally:
+            self.set_trace_callback(self._on_statement)
+            self.set_progress_handler(self._on_progress, PROGRESS_STEPS)
+
+    def close(self):
+        if self.tracer is not None and self.statements:
+            self.tracer.collect(self, self.statements)
+            self.statements = []
+        super().close()
+
+
+class SqlTracer:
+    """
+    Per-request SQL statistics and a slow-query log. Off unless enabled;
+    set enabled/slow_ms/log_path before serving (see app.py).
+    """
+
+    def __init__(self, enabled=False, slow_ms=SLOW_QUERY_MS, log_path=SLOW_LOG_PATH):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._requests = deque(maxlen=RECENT_REQUESTS)
+        self._slow = deque(maxlen=RECENT_SLOW)
+
+    def connect(self, db_path, **kwargs):
+        if not self.enabled:
+            return sqlite3.connect(db_path, **kwargs)
+        conn = sqlite3.connect(db_path, factory=TracedConnection, **kwargs)
+        conn.tracer = self
+        return conn
+
+    # -----------------------
+    # Request scope
+    # -----------------------
+    def begin_request(self, label):
+        if self.enabled:
+            _current.set({"request": label, "queries": 0, "ms": 0.0, "steps": 0, "statements": []})
+
+    def end_request(self):
+        """The finished request's trace (None if tracing is off), also kept for recent()."""
+        trace = _current.get()
+        if trace is None:
+            return None
+        _current.set(None)
+        trace["ms"] = round(trace["ms"], 3)
+        with self._lock:
+            self._requests.append(trace)
+        return trace
+
+    def collect(self, conn, statements):
+        """Called by TracedConnection.close() with the statements it ran."""
+        trace = _current.get()
+        for s in statements:
+            s["ms"] = round(s["ms"], 3)
+            if s["ms"] >= self.slow_ms:
+                s["plan"] = conn.explain(s["sql"])
+                s["full_scan"] = _is_full_scan(s["plan"])
+                self._log_slow(s, trace["request"] if trace else None)
+            if trace is not None:
+                trace["queries"] += 1
+                trace["ms"] += s["ms"]
+                trace["steps"] += s["steps"]
+                trace["statements"].append(s)
+
+    def _log_slow(self, statement, request):
+        entry = dict(statement, at=datetime.now().isoformat(timespec="seconds"), request=request)
+        print(f"[WARN] Slow query ({statement['ms']:.1f} ms, {request or 'background'}): {statement['sql']}")
+        with self._lock:
+            self._slow.append(entry)
+            if self.log_path:
+                try:
+                    with open(self.log_path, "a") as f:
+                        f.write(json.dumps(entry) + "\n")
+                except OSError as e:
+                    print(f"[WARN] Could not write slow-query log {self.log_path}: {e}")
+
+    def recent(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "slow_ms": self.slow_ms,
+                "requests": list(self._requests),
+                "slow": list(self._slow),
+            }
@@ -0,0 +1,99 @@
+# Response cache for the dashboard API.
+#
+# Every writer of sensor data (the LoRa receiver, the forecast fetcher) bumps
+# a single counter in the data_version table in the same transaction as its
+# insert. A cached response is reused while that counter (plus an optional
+# per-route "vary" value, e.g. the current hour for chart labels) is unchanged,
+# so a poll with nothing new costs one primary-key lookup instead of the
+# route's queries. Each response carries a strong ETag; a poll whose
+# If-None-Match still matches gets an empty 304.
+
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, make_response
+
+MAX_ENTRIES = 256
+
+
+class ResponseCache:
+
+    def __init__(self, version_fn, max_entries=MAX_ENTRIES):
+        """version_fn() returns the current data version, or None if unknown (no caching)."""
+        self.version_fn = version_fn
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (version, vary, body, mimetype, etag)
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0, "bypassed": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["entries"] = len(self._entries)
+        lookups = s["hits"] + s["misses"]
+        s["hit_ratio"] = s["hits"] / lookups if lookups else 0.0
+        return s
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _respond(self, body, mimetype, etag, state):
+        if request.if_none_match.contains(etag):
+            self._count("not_modified")
+            resp = make_response("", 304)
+        else:
+            resp = make_response(body)
+            resp.mimetype = mimetype
+        resp.set_etag(etag)
+        # Browsers must revalidate every poll, which the ETag makes cheap
+        resp.headers["Cache-Control"] = "no-cache"
+        resp.headers["X-Cache"] = state
+        return resp
+
+    def cached(self, vary=None):
+        """
+        Decorator for a GET view. Only 200 responses are stored; the key is the
+        view name plus its URL arguments and query string.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                version = self.version_fn()
+                if version is None:
+                    self._count("bypassed")
+                    return view(*args, **kwargs)
+
+                key = (view.__name__, tuple(sorted(kwargs.items())), request.query_string)
+                vary_value = vary() if vary else None
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry and entry[0] == version and entry[1] == vary_value:
+                        self._entries.move_to_end(key)
+                        self._stats["hits"] += 1
+                        hit = entry
+                    else:
+                        self._stats["misses"] += 1
+                        hit = None
+                if hit:
+                    return self._respond(hit[2], hit[3], hit[4], "HIT")
+
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200 or resp.is_streamed:
+                    return resp
+                body = resp.get_data()
+                etag = hashlib.sha1(body).hexdigest()
+                with self._lock:
+                    self._entries[key] = (version, vary_value, body, resp.mimetype, etag)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                return self._respond(body, resp.mimetype, etag, "MISS")
+            return wrapper
+        return decorator
@@ -1,65 +1,268 @@
+# Generates synthetic sensor_readings for load testing the dashboard.
+#
+#   python -m utils.seeddat [db_path] [--nodes N] [--cadence S] [--start T] [--end T | --days D]
+#
+# Nodes alternate between weather nodes (soil, temp, hum, rain,
+# total_daily_rain) and river nodes (river, rate_of_rise, high_level_alert);
+# the first two are sensors 2 and 3, which the dashboard shows, the rest are
+# numbered from EXTRA_SENSOR_BASE. All nodes share one regional storm
+# sequence, so rain, soil moisture and river level rise and fall together:
+#   temp   seasonal + diurnal cycle, cooler while it rains
+#   soil   rain filtered through an exponential drainage response
+#   river  rain through a lagged unit hydrograph (peaks ~RIVER_PEAK_H later)
+#
+# Each node's series are computed as whole NumPy arrays and written in
+# chunks of executemany inside one transaction per node. Triggers and the
+# time index are dropped for the load and the derived tables (latest_readings,
+# rollups) are rebuilt once at the end.
+
+import argparse
 import sqlite3
+import sys
+import os
+import time
 from datetime import datetime, timedelta
-import random
-
-DB_PATH = './sensor_data.db'
-
-# Connect to database
-conn = sqlite3.connect(DB_PATH)
-cursor = conn.cursor()
-
-# Create table
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS sensor_readings (
-    timestamp TEXT,
-    soil REAL,
-    temp REAL,
-    hum REAL,
-    rain REAL,
-    river REAL,
-    rate_of_rise REAL,
-    high_level_alert INTEGER,
-    sensor_id INTEGER,
-    total_daily_rain REAL,
-    PRIMARY KEY (timestamp, sensor_id)
-)
-""")
-
-# Clear old data
-cursor.execute("DELETE FROM sensor_readings")
-
-# Start from Jan 1 2025 00:00
-start = datetime(2025, 1, 1, 0, 0)
-now = datetime.now()
-
-print(f"Generating hourly test data from {start} to {now}...")
-
-current = start
-while current <= now:
-    # Sensor 2: soil, temp, hum, rain per min, total_daily_rain
-    soil = round(random.uniform(20, 80), 1)
-    temp = round(random.uniform(5, 35), 1)
-    hum = round(random.uniform(30, 90), 1)
-    rain = round(random.uniform(0, 2), 2)
-    total_daily_rain = round(random.uniform(0, 20), 2)
-
-    cursor.execute("""
-        INSERT INTO sensor_readings (timestamp, soil, temp, hum, rain, total_daily_rain, sensor_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (current.strftime('%Y-%m-%d %H:%M:%S'), soil, temp, hum, rain, total_daily_rain, 2))
-
-    # Sensor 3: river height, rate_of_rise, high_level_alert
-    river = round(random.uniform(2.0, 3.5), 2)
-    rate_of_rise = round(random.uniform(-0.05, 0.05), 3)
-    high_level_alert = random.choice([0, 1])
-
-    cursor.execute("""
-        INSERT INTO sensor_readings (timestamp, river, rate_of_rise, high_level_alert, sensor_id)
-        VALUES (?, ?, ?, ?, ?)
-    """, (current.strftime('%Y-%m-%d %H:%M:%S'), river, rate_of_rise, high_level_alert, 3))
-
-    current += timedelta(hours=1)
-
-conn.commit()
-conn.close()
-print("Test data inserted.")
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.db_helpers import (DB_PATH, SENSOR_SCHEMA, bump_data_version, check_sensor_schema, rebuild_latest,
+                              rebuild_rollups, to_epoch_ms)
+
+EXTRA_SENSOR_BASE = 100
+CHUNK_ROWS = 50_000
+
+STORMS_PER_DAY = 0.12
+STORM_HOURS = (2, 36)
+STORM_MM_PER_H = 4.0        # mean peak intensity (exponentially distributed)
+SOIL_DRAIN_H = 72           # e-folding time of soil moisture
+RIVER_PEAK_H = 8
+RIVER_RECESS_H = 36
+RIVER_BASE = 1.6
+HIGH_LEVEL_SWITCH = 3.0     # float switch on the river node
+
+WEATHER_SQL = """
+    INSERT OR REPLACE INTO sensor_readings (ts, sensor_id, soil, temp, hum, rain, total_daily_rain)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+RIVER_SQL = """
+    INSERT OR REPLACE INTO sensor_readings (ts, sensor_id, river, rate_of_rise, high_level_alert)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+# Bulk-load settings: no fsync and an in-memory rollback journal (a crash
+# mid-load means regenerating, not corruption of anything that matters).
+LOAD_PRAGMAS = [
+    "PRAGMA journal_mode=MEMORY",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",   # 64 MiB
+    "PRAGMA locking_mode=EXCLUSIVE",
+]
+# What the receiver runs with (receiver/storage.py)
+RESTORE_PRAGMAS = [
+    "PRAGMA locking_mode=NORMAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+]
+
+
+def sensor_ids(nodes):
+    """[(sensor_id, kind)]: 2 = weather, 3 = river, then alternating from EXTRA_SENSOR_BASE."""
+    out = []
+    for i in range(nodes):
+        kind = "weather" if i % 2 == 0 else "river"
+        out.append((i + 2 if i < 2 else EXTRA_SENSOR_BASE + i - 2, kind))
+    return out
+
+
+def _convolve(signal, kernel):
+    """Causal convolution via FFT, same length as signal."""
+    n = len(signal) + len(kernel) - 1
+    size = 1 << (n - 1).bit_length()
+    out = np.fft.irfft(np.fft.rfft(signal, size) * np.fft.rfft(kernel, size), size)
+    return out[:len(signal)]
+
+
+def storm_rain(ts_s, cadence_s, rng):
+    """Regional rain intensity (mm/h) at each timestep: random storms with a rise and decay."""
+    span_days = (ts_s[-1] - ts_s[0]) / 86400.0 if len(ts_s) else 0
+    count = rng.poisson(STORMS_PER_DAY * max(span_days, 0))
+    rate = np.zeros(len(ts_s))
+    for start, hours, peak in zip(rng.uniform(ts_s[0], ts_s[-1], count),
+                                  rng.uniform(*STORM_HOURS, count),
+                                  rng.exponential(STORM_MM_PER_H, count)):
+        lo, hi = np.searchsorted(ts_s, [start, start + hours * 3600])
+        phase = (ts_s[lo:hi] - start) / (hours * 3600)
+        # Sharp onset, long tail, with gusty variation
+        shape = np.sin(np.pi * phase ** 0.6) * rng.uniform(0.4, 1.6, hi - lo)
+        rate[lo:hi] += peak * np.clip(shape, 0, None)
+    return rate
+
+
+def _local_hours(ts_s):
+    """Local hour of day (float) and local day number of each timestep."""
+    local = ts_s + time.localtime(int(ts_s[0])).tm_gmtoff
+    return (local % 86400) / 3600.0, (local // 86400).astype(np.int64)
+
+
+def weather_columns(ts_s, cadence_s, rain_rate, rng):
+    n = len(ts_s)
+    hour, day = _local_hours(ts_s)
+    doy = (ts_s / 86400.0) % 365.25
+    wet = rain_rate > 0.05
+
+    # mm fallen during each interval at this node (local variation +-30 %)
+    rain = np.clip(rain_rate * rng.uniform(0.7, 1.3) * cadence_s / 3600.0
+                   + rng.normal(0, 0.005, n) * wet, 0, None)
+    # Running total, reset at local midnight
+    cum = np.cumsum(rain)
+    day_start = np.flatnonzero(np.diff(day, prepend=day[0] - 1))
+    before_day = np.concatenate(([0.0], cum[day_start[1:] - 1]))
+    total_daily_rain = cum - np.repeat(before_day, np.diff(np.append(day_start, n)))
+
+    temp = (11 + 8 * np.sin(2 * np.pi * (doy - 110) / 365.25)
+            + 5 * np.sin(2 * np.pi * (hour - 9) / 24)
+            - 3 * wet + rng.normal(0, 0.4, n) + rng.normal(0, 1.5))
+    hum = np.clip(72 - 1.8 * (temp - 11) + 18 * wet + rng.normal(0, 3, n), 15, 100)
+
+    steps = int(SOIL_DRAIN_H * 3600 / cadence_s)
+    kernel = np.exp(-np.arange(5 * steps) / steps)
+    # ~0.6 % moisture per mm of rain still held in the soil
+    soil = np.clip(25 + rng.uniform(-5, 5) + 0.6 * _convolve(rain, kernel) + rng.normal(0, 0.5, n), 0, 100)
+    return soil.round(1), temp.round(1), hum.round(1), rain.round(2), total_daily_rain.round(2)
+
+
+def river_columns(ts_s, cadence_s, rain_rate, rng):
+    n = len(ts_s)
+    doy = (ts_s / 86400.0) % 365.25
+    step_h = cadence_s / 3600.0
+    # Gamma-shaped unit hydrograph, normalised to unit area
+    t_h = np.arange(int(6 * RIVER_RECESS_H / step_h) + 1) * step_h
+    kernel = (t_h / RIVER_PEAK_H) ** 2 * np.exp(-2 * (t_h / RIVER_PEAK_H - 1)) * np.exp(-t_h / RIVER_RECESS_H)
+    kernel /= kernel.sum()
+
+    catchment = rng.uniform(0.6, 1.4)
+    runoff = _convolve(rain_rate * catchment, kernel)
+    river = (RIVER_BASE + rng.uniform(-0.2, 0.2) + 0.15 * np.sin(2 * np.pi * (doy - 20) / 365.25)
+             + 0.5 * runoff + rng.normal(0, 0.005, n))
+    rate_of_rise = np.diff(river, prepend=river[0]) / step_h  # m/h
+    high_level_alert = (river >= HIGH_LEVEL_SWITCH).astype(np.int64)
+    return river.round(3), rate_of_rise.round(3), high_level_alert
+
+
+def _drop_triggers_and_index(conn):
+    triggers = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'sensor_readings'")]
+    for name in triggers:
+        conn.execute(f"DROP TRIGGER {name}")
+    conn.execute("DROP INDEX IF EXISTS idx_sensor_readings_ts")
+    return triggers
+
+
+def _write(conn, sql, columns, chunk_rows):
+    rows = 0
+    n = len(columns[0])
+    for lo in range(0, n, chunk_rows):
+        chunk = zip(*(c[lo:lo + chunk_rows].tolist() for c in columns))
+        rows += conn.executemany(sql, chunk).rowcount
+    return rows
+
+
+def seed(conn, nodes=2, cadence_s=60, start=None, end=None, random_seed=None, append=False,
+         chunk_rows=CHUNK_ROWS):
+    """Generate and store readings for nodes between start and end (datetimes). Returns rows written."""
+    end = end or datetime.now()
+    start = start or end - timedelta(days=365)
+    rng = np.random.default_rng(random_seed)
+    ts_s = np.arange(to_epoch_ms(start) // 1000, to_epoch_ms(end) // 1000 + 1, cadence_s, dtype=np.int64)
+    if not len(ts_s):
+        return 0
+    ts_ms = ts_s * 1000
+    rain_rate = storm_rain(ts_s.astype(np.float64), cadence_s, rng)
+
+    check_sensor_schema(conn)
+    for pragma in LOAD_PRAGMAS:
+        conn.execute(pragma)
+    for stmt in SENSOR_SCHEMA:
+        conn.execute(stmt)
+    conn.commit()
+
+    written = 0
+    try:
+        with conn:
+            _drop_triggers_and_index(conn)
+            if not append:
+                conn.execute("DELETE FROM sensor_readings")
+                # Nothing compacted any more: rollups are rebuilt from scratch
+                conn.execute("DELETE FROM retention")
+
+        for sensor_id, kind in sensor_ids(nodes):
+            t0 = time.monotonic()
+            ids = np.full(len(ts_ms), sensor_id, dtype=np.int64)
+            # Nodes do not all report on the same second
+            node_ts = ts_ms + int(rng.integers(0, cadence_s)) * 1000
+            with conn:
+                if kind == "weather":
+                    cols = weather_columns(ts_s.astype(np.float64), cadence_s, rain_rate, rng)
+                    rows = _write(conn, WEATHER_SQL, (node_ts, ids) + cols, chunk_rows)
+                else:
+                    cols = river_columns(ts_s.astype(np.float64), cadence_s, rain_rate, rng)
+                    rows = _write(conn, RIVER_SQL, (node_ts, ids) + cols, chunk_rows)
+            written += rows
+            print(f"[INFO] Sensor {sensor_id} ({kind}): {rows} rows in {time.monotonic() - t0:.1f}s")
+    finally:
+        # Index, triggers and derived tables back as init_sensor_db leaves them
+        t0 = time.monotonic()
+        for stmt in SENSOR_SCHEMA:
+            conn.execute(stmt)
+        conn.commit()
+        rebuild_latest(conn)
+        rebuild_rollups(conn)
+        with conn:
+            bump_data_version(conn)
+        print(f"[INFO] Rebuilt index, latest_readings and rollups in {time.monotonic() - t0:.1f}s")
+        for pragma in RESTORE_PRAGMAS:
+            conn.execute(pragma)
+    return written
+
+
+def _parse_time(value):
+    if value.lstrip("-").isdigit():
+        return datetime.fromtimestamp(int(value) / 1000)
+    return datetime.fromisoformat(value)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Generate synthetic sensor readings for load testing")
+    p.add_argument("db_path", nargs="?", default=DB_PATH)
+    p.add_argument("--nodes", type=int, default=2, help="virtual nodes, alternating weather/river (default 2)")
+    p.add_argument("--cadence", type=int, default=60, help="seconds between readings of a node (default 60)")
+    p.add_argument("--start", help="ISO time or epoch ms (default: --days before --end)")
+    p.add_argument("--end", help="ISO time or epoch ms (default: now)")
+    p.add_argument("--days", type=float, default=365)
+    p.add_argument("--seed", type=int, help="random seed, for repeatable data")
+    p.add_argument("--append", action="store_true", help="keep existing readings instead of clearing them")
+    p.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="rows per executemany call")
+    args = p.parse_args(argv)
+
+    end = _parse_time(args.end) if args.end else datetime.now()
+    start = _parse_time(args.start) if args.start else end - timedelta(days=args.days)
+    if args.nodes < 1 or args.cadence < 1 or start >= end:
+        p.error("need --nodes >= 1, --cadence >= 1 and start before end")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db_path)), exist_ok=True)
+    print(f"Generating {args.nodes} nodes every {args.cadence}s from {start} to {end} into {args.db_path}...")
+    t0 = time.monotonic()
+    conn = sqlite3.connect(args.db_path)
+    try:
+        rows = seed(conn, args.nodes, args.cadence, start, end, args.seed, args.append, args.chunk)
+    finally:
+        conn.close()
+    elapsed = time.monotonic() - t0
+    print(f"Test data inserted: {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
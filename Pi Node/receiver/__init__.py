@@ -0,0 +1,4 @@
+# ResilIoT LoRa receiver: radio backends, decode pipeline and SQLite storage.
+
+from receiver.backends import RadioBackend, SX127xBackend, SimulatedBackend
+from receiver.service import Receiver
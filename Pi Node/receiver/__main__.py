@@ -0,0 +1,100 @@
+# __main__.py
+# python -m receiver                                   run on the Pi with the SX127x HAT
+# python -m receiver --sim --rate 200 --duration 10    simulated radio, prints throughput/latency JSON
+# python -m receiver --fleet 200 --speed 20 --duration 30
+#                                                      200 virtual field nodes on one channel, prints
+#                                                      sustained packets/s and where frames were lost
+
+import argparse
+import json
+import os
+import sys
+
+from receiver.backends import SX127xBackend, SimulatedBackend, FleetBackend, MAX_FLEET
+from receiver.config import DB_PATH, DB_MAX_BATCH, DB_MAX_DELAY_S, RX_QUEUE_SIZE, METRICS_FILENAME
+from receiver.service import Receiver
+from receiver.storage import SchemaMissing
+
+
+def build_parser():
+    p = argparse.ArgumentParser(description="ResilIoT LoRa receiver")
+    p.add_argument("--sim", action="store_true", help="use the simulated radio instead of the SX127x")
+    p.add_argument("--rate", type=float, default=10.0, help="simulated frames per second")
+    p.add_argument("--duration", type=float, default=10.0, help="simulated run length in seconds")
+    p.add_argument("--count", type=int, default=None, help="stop the simulation after this many frames")
+    p.add_argument("--binary", action="store_true", help="simulated nodes send the binary payload format")
+    p.add_argument("--nodes", default="2,3", help="comma separated simulated node IDs")
+    p.add_argument("--fleet", type=int, default=0, metavar="N",
+                   help=f"simulate N field nodes (at most {MAX_FLEET}, node IDs are one byte), "
+                        "half Node1-style weather and half Node2-style river")
+    p.add_argument("--interval", type=float, default=60.0, help="fleet reporting interval in seconds")
+    p.add_argument("--jitter", type=float, default=0.1, help="fleet interval jitter as a fraction of the interval")
+    p.add_argument("--speed", type=float, default=1.0, help="run fleet time this many times faster than real time")
+    p.add_argument("--corrupt", type=float, default=0.0, help="probability a fleet frame arrives corrupted")
+    p.add_argument("--no-collisions", action="store_true", help="fleet frames never collide on air")
+    p.add_argument("--seed", type=int, default=None, help="random seed for the simulated radio")
+    p.add_argument("--db", default=DB_PATH, help="SQLite database path")
+    p.add_argument("--queue-size", type=int, default=RX_QUEUE_SIZE)
+    p.add_argument("--max-batch", type=int, default=DB_MAX_BATCH)
+    p.add_argument("--max-delay", type=float, default=DB_MAX_DELAY_S)
+    p.add_argument("--metrics-file", default=None,
+                   help=f"metrics snapshot for the dashboard (default: {METRICS_FILENAME} next to the DB, '' to disable)")
+    p.add_argument("--quiet", action="store_true", help="no per-packet output")
+    return p
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, radio_args = parser.parse_known_args(argv)
+    if not 0 <= args.fleet <= MAX_FLEET:
+        parser.error(f"--fleet must be between 1 and {MAX_FLEET}: node IDs are one byte. "
+                     "Use --speed to offer the load of a larger fleet.")
+
+    if args.fleet:
+        backend = FleetBackend(
+            weather=(args.fleet + 1) // 2, river=args.fleet // 2,
+            weather_interval_s=args.interval, river_interval_s=args.interval,
+            jitter=args.jitter, collisions=not args.no_collisions, corrupt=args.corrupt,
+            speed=args.speed, duration_s=args.duration, count=args.count, seed=args.seed,
+        )
+    elif args.sim:
+        backend = SimulatedBackend(
+            rate_hz=args.rate, duration_s=args.duration, count=args.count,
+            nodes=[int(n) for n in args.nodes.split(",") if n], binary=args.binary, seed=args.seed,
+        )
+    else:
+        # Anything we did not consume is for LoRaArgumentParser (frequency, SF, ...)
+        sys.argv = [sys.argv[0]] + radio_args
+        backend = SX127xBackend()
+
+    metrics_path = args.metrics_file
+    if metrics_path is None:
+        metrics_path = os.path.join(os.path.dirname(os.path.abspath(args.db)), METRICS_FILENAME)
+
+    receiver = Receiver(
+        backend, db_path=args.db, queue_size=args.queue_size,
+        max_batch=args.max_batch, max_delay_s=args.max_delay,
+        verbose=not args.quiet, metrics_path=metrics_path or None,
+    )
+    try:
+        receiver.run()
+    except SchemaMissing as e:
+        receiver.close()
+        sys.exit(f"[ERROR] {e}")
+
+    stats = receiver.stats()
+    if args.fleet:
+        stats["fleet"] = backend.report(stats)
+    elif args.sim:
+        elapsed = backend.elapsed_s or 1e-9
+        stats["sim"] = {
+            "sent": backend.sent,
+            "elapsed_s": elapsed,
+            "offered_fps": backend.sent / elapsed,
+            "stored_rows_per_s": stats["storage"]["rows_written"] / elapsed,
+        }
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
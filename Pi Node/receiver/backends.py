@@ -0,0 +1,363 @@
+# backends.py
+# Radio access for the receiver. A backend delivers every received frame to
+# on_packet(payload_bytes, rssi) and must return from that call quickly.
+#   SX127xBackend   - the real LoRa HAT on the Pi (SX127x lib, imported lazily)
+#   SimulatedBackend - in-process source of encrypted frames for off-Pi runs
+#   FleetBackend     - many virtual Node1/Node2-style devices sharing one
+#                      channel, with jitter, collisions and corruption
+
+import heapq
+import math
+import random
+import threading
+from time import monotonic, sleep
+
+from receiver.config import CHACHA_KEY, MY_ADDRESS
+from receiver.crypto import encrypt_message
+from receiver.payload import encode_weather, encode_river
+
+
+class RadioBackend:
+    """Interface the receiver uses to talk to a radio."""
+
+    def start(self, on_packet):
+        """Deliver frames to on_packet(payload, rssi) until stop() is called. Blocks."""
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+
+class SX127xBackend(RadioBackend):
+    """
+    Continuous RX on an SX127x module.
+    Code adapted from example continious rx mode code form SX127x Lib.
+    """
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.lora = None
+        self._running = False
+
+    def _create_radio(self, on_packet):
+        # Imported here so the rest of the receiver runs on machines without the HAT
+        from SX127x.LoRa import LoRa, MODE
+        from SX127x.LoRaArgumentParser import LoRaArgumentParser
+        from SX127x.board_config import BOARD
+
+        class LoRaRcvCont(LoRa):
+            def __init__(self, verbose=False):
+                super(LoRaRcvCont, self).__init__(verbose)
+                self.set_mode(MODE.SLEEP)
+                self.set_dio_mapping([0] * 6)
+
+            def on_rx_done(self):
+                # Only copy the frame out of the FIFO here; decoding happens on the pipeline workers
+                BOARD.led_on()
+                self.clear_irq_flags(RxDone=1)
+                payload = self.read_payload(nocheck=True)
+                rssi = self.get_pkt_rssi_value()
+                if not on_packet(payload, rssi):
+                    print("[WARN] RX queue full, frame dropped")
+
+                self.set_mode(MODE.SLEEP)
+                self.reset_ptr_rx()
+                BOARD.led_off()
+                self.set_mode(MODE.RXCONT)
+
+        BOARD.setup()
+        parser = LoRaArgumentParser("Continuous LoRa receiver.")
+        lora = LoRaRcvCont(verbose=self.verbose)
+        parser.parse_args(lora)
+        lora.set_mode(MODE.STDBY)
+        lora.set_pa_config(pa_select=1)
+        print(lora)
+        assert lora.get_agc_auto_on() == 1
+        return lora, MODE, BOARD
+
+    def start(self, on_packet):
+        self.lora, MODE, BOARD = self._create_radio(on_packet)
+        self._running = True
+        try:
+            self.lora.reset_ptr_rx()
+            self.lora.set_mode(MODE.RXCONT)
+            while self._running:
+                sleep(0.5)
+        finally:
+            self.lora.set_mode(MODE.SLEEP)
+            BOARD.teardown()
+
+    def stop(self):
+        self._running = False
+
+
+def node2_message(rng, binary=False):
+    """Random Node 2 (weather/soil) reading, as CSV text or a binary payload."""
+    values = (rng.randint(-5, 35), rng.randint(30, 95), rng.randint(10, 90),
+              rng.choice([0.0, 0.0, 0.2, 0.4]), round(rng.uniform(0, 40), 2))
+    if binary:
+        return encode_weather(*values)
+    return "%d,%d,%d,%.2f,%.2f" % values
+
+
+def node3_message(rng, binary=False):
+    """Random Node 3 (river) reading, as CSV text or a binary payload."""
+    values = (round(rng.uniform(20, 200), 1), round(rng.uniform(-5, 5), 1), rng.random() < 0.05)
+    if binary:
+        return encode_river(*values)
+    return "%.1f,%.1f,%d" % values
+
+
+MESSAGE_BUILDERS = {2: node2_message, 3: node3_message}
+
+
+class SimulatedBackend(RadioBackend):
+    """
+    Injects correctly encrypted frames from the given node IDs at rate_hz,
+    round-robin, until duration_s has passed or count frames were sent.
+    Frames are delivered on the calling thread, like the SX127x IRQ callback.
+    With binary=True nodes send the packed payload format instead of CSV.
+    """
+
+    def __init__(self, rate_hz=10.0, duration_s=None, count=None, nodes=(2, 3),
+                 key=CHACHA_KEY, dest=MY_ADDRESS, seed=None, binary=False):
+        self.rate_hz = rate_hz
+        self.duration_s = duration_s
+        self.count = count
+        self.nodes = list(nodes)
+        self.key = key
+        self.dest = dest
+        self.binary = binary
+        self.rng = random.Random(seed)
+        self.counters = {src: 0 for src in self.nodes}
+        self.sent = 0
+        self.accepted = 0
+        self.elapsed_s = 0.0
+        self._stop = threading.Event()
+
+    def next_frame(self):
+        src = self.nodes[self.sent % len(self.nodes)]
+        self.counters[src] += 1
+        message = MESSAGE_BUILDERS.get(src, node2_message)(self.rng, self.binary)
+        micros = int(monotonic() * 1e6)
+        return encrypt_message(self.dest, src, message, self.counters[src], micros, self.key)
+
+    def start(self, on_packet):
+        interval = 1.0 / self.rate_hz if self.rate_hz else 0.0
+        start = monotonic()
+        next_due = start
+        while not self._stop.is_set():
+            now = monotonic()
+            if self.duration_s is not None and now - start >= self.duration_s:
+                break
+            if self.count is not None and self.sent >= self.count:
+                break
+            if now < next_due:
+                sleep(next_due - now)
+            payload = self.next_frame()
+            self.sent += 1
+            if on_packet(payload, -self.rng.randint(40, 120)):
+                self.accepted += 1
+            next_due += interval
+        self.elapsed_s = monotonic() - start
+
+    def stop(self):
+        self._stop.set()
+
+
+# Radio settings of the ESP nodes (LoRa.setSpreadingFactor(7), 125 kHz, 4/5)
+LORA_SF = 7
+LORA_BW_HZ = 125000
+LORA_CR = 1             # coding rate 4/(4 + LORA_CR)
+LORA_PREAMBLE = 8
+CAPTURE_DB = 6.0        # a frame this much stronger survives a collision
+
+# Node1 (weather) reports every 60 s; Node2 (river) sleeps 60/30/5 s by rate of rise
+NODE1_INTERVAL_S = 60
+NODE2_INTERVAL_S = 60
+MAX_NODE_ID = 255       # the source ID is one byte of the frame
+FIRST_FLEET_ID = 2      # 0 is unused and 1 is the Pi (MY_ADDRESS)
+# Devices one fleet can hold; use --speed to offer the load of a larger one
+MAX_FLEET = MAX_NODE_ID - FIRST_FLEET_ID + 1
+
+
+def time_on_air_s(payload_len, sf=LORA_SF, bw_hz=LORA_BW_HZ, cr=LORA_CR, preamble=LORA_PREAMBLE,
+                  crc=False, explicit_header=True):
+    """LoRa time on air of one frame (Semtech SX127x datasheet formula)."""
+    t_sym = (2 ** sf) / bw_hz
+    low_dr = 1 if t_sym > 0.016 else 0
+    num = 8 * payload_len - 4 * sf + 28 + 16 * crc - (0 if explicit_header else 20)
+    n_payload = 8 + max(math.ceil(num / (4 * (sf - 2 * low_dr))) * (cr + 4), 0)
+    return (preamble + 4.25 + n_payload) * t_sym
+
+
+class VirtualDevice:
+    """
+    One field node: its own nonce counter, uptime clock (for the micros() half
+    of the nonce), reporting interval and signal strength at the Pi.
+    """
+
+    def __init__(self, src, kind, interval_s, rng, key=CHACHA_KEY, dest=MY_ADDRESS):
+        self.src = src
+        self.kind = kind
+        self.interval_s = interval_s
+        self.key = key
+        self.dest = dest
+        self.rng = rng
+        # As if the node had been running for a while before the test started
+        self.counter = rng.randrange(1 << 16)
+        self.boot_s = rng.uniform(0, 3600)
+        self.rssi = -rng.uniform(40, 120)
+        self.sent = 0
+
+    def frame(self, now_s):
+        self.counter = (self.counter + 1) & 0xFFFFFFFF
+        self.sent += 1
+        build = node2_message if self.kind == "weather" else node3_message
+        micros = int((self.boot_s + now_s) * 1e6)
+        return encrypt_message(self.dest, self.src, build(self.rng, binary=True), self.counter, micros, self.key)
+
+
+class FleetBackend(RadioBackend):
+    """
+    Simulated channel shared by `weather` Node1-style and `river` Node2-style
+    devices (binary payloads, node IDs from first_id). The two kinds take
+    alternate IDs while both last, so nodes 2 and 3 match their types in
+    node_schemas.json (weather, river). Each device reports
+    every interval, +- jitter (fraction of the interval). Node IDs are one
+    byte, so a fleet holds at most MAX_FLEET devices.
+
+    Frames whose air time overlaps are a collision: the strongest survives if
+    it is CAPTURE_DB above all the others, otherwise all are lost. Survivors
+    are corrupted (one byte flipped, so authentication fails) with
+    probability `corrupt`. Virtual time runs `speed` times faster than real
+    time, so one run can offer far more packets per second than the fleet
+    would in the field.
+    """
+
+    def __init__(self, weather=100, river=100, weather_interval_s=NODE1_INTERVAL_S,
+                 river_interval_s=NODE2_INTERVAL_S, jitter=0.1, collisions=True, corrupt=0.0,
+                 speed=1.0, duration_s=None, count=None, first_id=FIRST_FLEET_ID, key=CHACHA_KEY,
+                 dest=MY_ADDRESS, seed=None):
+        if first_id + weather + river - 1 > MAX_NODE_ID:
+            raise ValueError(f"At most {MAX_NODE_ID - first_id + 1} devices fit in the one-byte node ID")
+        self.rng = random.Random(seed)
+        self.jitter = jitter
+        self.collisions = collisions
+        self.corrupt = corrupt
+        self.speed = speed
+        self.duration_s = duration_s
+        self.count = count
+        self.devices = []
+        paired = min(weather, river)
+        kinds = ["weather", "river"] * paired + ["weather"] * (weather - paired) + ["river"] * (river - paired)
+        for i, kind in enumerate(kinds):
+            interval = weather_interval_s if kind == "weather" else river_interval_s
+            self.devices.append(VirtualDevice(first_id + i, kind, interval, self.rng, key, dest))
+
+        self.stats = {
+            "generated": 0,
+            "collided": 0,
+            "corrupted": 0,
+            "delivered": 0,
+            "accepted": 0,
+            "queue_full": 0,
+            "max_lag_s": 0.0,
+            "virtual_s": 0.0,
+        }
+        self.elapsed_s = 0.0
+        self._stop = threading.Event()
+
+    def _next_interval(self, device):
+        return device.interval_s * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def _deliver(self, burst, on_packet):
+        """Resolve one group of overlapping frames and hand the survivors to the receiver."""
+        if len(burst) > 1 and self.collisions:
+            burst.sort(key=lambda item: item[0], reverse=True)
+            if burst[0][0] - burst[1][0] >= CAPTURE_DB:
+                self.stats["collided"] += len(burst) - 1
+                burst = burst[:1]
+            else:
+                self.stats["collided"] += len(burst)
+                return
+        for rssi, payload in burst:
+            if self.corrupt and self.rng.random() < self.corrupt:
+                payload = bytearray(payload)
+                payload[self.rng.randrange(len(payload))] ^= 1 << self.rng.randrange(8)
+                payload = bytes(payload)
+                self.stats["corrupted"] += 1
+            self.stats["delivered"] += 1
+            if on_packet(payload, int(rssi)):
+                self.stats["accepted"] += 1
+            else:
+                self.stats["queue_full"] += 1
+
+    def start(self, on_packet):
+        # Devices power up at random points of their first interval
+        queue = [(self.rng.uniform(0, d.interval_s), i) for i, d in enumerate(self.devices)]
+        heapq.heapify(queue)
+        burst, burst_end = [], None
+        start = monotonic()
+
+        while queue and not self._stop.is_set():
+            t, i = queue[0]
+            if self.duration_s is not None and t / self.speed >= self.duration_s:
+                break
+            if self.count is not None and self.stats["generated"] >= self.count:
+                break
+
+            # Wait until the frame is due in (scaled) real time
+            lag = monotonic() - start - t / self.speed
+            if lag < 0:
+                sleep(-lag)
+            else:
+                self.stats["max_lag_s"] = max(self.stats["max_lag_s"], lag)
+
+            device = self.devices[i]
+            heapq.heapreplace(queue, (t + self._next_interval(device), i))
+            payload = device.frame(t)
+            self.stats["generated"] += 1
+            end = t + time_on_air_s(len(payload))
+
+            if burst and t >= burst_end:
+                self._deliver(burst, on_packet)
+                burst = []
+            burst.append((device.rssi + self.rng.gauss(0, 2), payload))
+            burst_end = end if len(burst) == 1 else max(burst_end, end)
+            self.stats["virtual_s"] = t
+
+        if burst:
+            self._deliver(burst, on_packet)
+        self.elapsed_s = monotonic() - start
+
+    def stop(self):
+        self._stop.set()
+
+    def report(self, receiver_stats):
+        """Sustained rates and where frames were lost, given Receiver.stats() after the run."""
+        elapsed = self.elapsed_s or 1e-9
+        s = self.stats
+        generated = s["generated"] or 1
+        decode = receiver_stats["decode"]
+        stored = receiver_stats["storage"]["rows_written"]
+        return {
+            "devices": len(self.devices),
+            "speed": self.speed,
+            "elapsed_s": elapsed,
+            "virtual_s": s["virtual_s"],
+            "generated": s["generated"],
+            "offered_pps": s["generated"] / elapsed,
+            "delivered_pps": s["delivered"] / elapsed,
+            "stored_pps": stored / elapsed,
+            "max_lag_s": s["max_lag_s"],
+            "loss": {
+                "collided": s["collided"],
+                "corrupted": s["corrupted"],
+                "queue_full": s["queue_full"],
+                "decrypt_failed": decode["decrypt_failed"],
+                "rejected": decode["rejected"] + decode["replayed"] + decode["duplicate"],
+                "not_stored": s["generated"] - stored,
+                "loss_ratio": (s["generated"] - stored) / generated,
+            },
+        }
@@ -0,0 +1,33 @@
+# config.py
+# Receiver settings shared by the radio backends, decoder and storage.
+
+import os
+
+MY_ADDRESS = 0x01
+
+# Encryption key (32 bytes, for now just 0x00 to 0x1f)
+CHACHA_KEY = bytes([
+    0x00,0x01,0x02,0x03,0x04,0x05,0x06,0x07,
+    0x08,0x09,0x0a,0x0b,0x0c,0x0d,0x0e,0x0f,
+    0x10,0x11,0x12,0x13,0x14,0x15,0x16,0x17,
+    0x18,0x19,0x1a,0x1b,0x1c,0x1d,0x1e,0x1f
+])
+
+# Per-node keys, node ID -> 32-byte key. Nodes not listed use CHACHA_KEY.
+NODE_KEYS = {}
+
+# Node ID -> node type and per-type field specs (see schemas.py)
+NODE_SCHEMAS_PATH = os.path.join(os.path.dirname(__file__), "node_schemas.json")
+
+DB_PATH = os.path.expanduser("~/ResilIoT/db/sensor_data.db")
+
+# Group-commit limits for the write-behind queue
+DB_MAX_BATCH = 64
+DB_MAX_DELAY_S = 2.0
+
+# Frames buffered between the RX callback and the decode worker
+RX_QUEUE_SIZE = 256
+
+# Metrics snapshot for the dashboard's /metrics, written next to the database
+METRICS_FILENAME = "receiver.prom"
+METRICS_INTERVAL_S = 10.0
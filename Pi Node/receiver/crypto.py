@@ -0,0 +1,28 @@
+# crypto.py
+# ChaCha20-Poly1305 framing used on the LoRa link.
+# Frame layout (see sendEncryptedMessage() in the ESP node sketches):
+#   nonce (12) = counter (uint32, little-endian) || micros() (uint64, little-endian)
+#   ciphertext of [dest, src, message...] || tag (16)
+
+import struct
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+from receiver.config import CHACHA_KEY
+
+NONCE_LEN = 12
+TAG_LEN = 16
+
+_NONCE = struct.Struct("<IQ")
+
+
+def build_nonce(counter, micros):
+    return _NONCE.pack(counter & 0xFFFFFFFF, micros & 0xFFFFFFFFFFFFFFFF)
+
+
+def encrypt_message(dest, src, message, counter, micros, key=CHACHA_KEY):
+    """Build a frame exactly as an ESP node would send it."""
+    if isinstance(message, str):
+        message = message.encode("utf-8")
+    nonce = build_nonce(counter, micros)
+    plaintext = bytes([dest, src]) + message
+    return nonce + ChaCha20Poly1305(key).encrypt(nonce, plaintext, associated_data=None)
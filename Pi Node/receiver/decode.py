@@ -0,0 +1,38 @@
+# decode.py
+# Turns decrypted node messages into sensor_readings rows.
+
+from time import strftime, localtime
+
+from receiver.payload import decode_message, describe, PayloadError
+from receiver.schemas import SchemaRegistry, SchemaError
+
+
+def log_error(ts, src, raw_data, reason):
+    timestamp = strftime("%Y-%m-%d %H:%M:%S", localtime(ts / 1000.0))
+    print(f"[ERROR LOG] {timestamp} Node {src}: {raw_data} ({reason})")
+
+
+_registry = None
+
+
+def default_registry():
+    """Registry loaded from node_schemas.json on first use."""
+    global _registry
+    if _registry is None:
+        _registry = SchemaRegistry.load()
+    return _registry
+
+
+def parse_message(src, body, ts, registry=None):
+    """
+    Returns the sensor_readings row for a node message (CSV or binary), or None
+    (after logging the reason) if it cannot be used. ts is epoch milliseconds.
+    """
+    registry = registry or default_registry()
+    try:
+        msg_type, fields = decode_message(body)
+        schema = registry.resolve(src, msg_type)
+        return schema.build_row(fields, ts, src)
+    except (PayloadError, SchemaError) as e:
+        log_error(ts, src, describe(body), str(e))
+        return None
@@ -0,0 +1,162 @@
+# keys.py
+# Per-node key registry with cached AEAD contexts and replay protection.
+#
+# The source node ID is inside the ciphertext, so the node is only known after
+# a key has authenticated the frame. Duplicate rejection therefore happens in
+# two places:
+#   - before decryption: an exact-nonce cache catches retransmitted/replayed
+#     copies of a frame we already accepted (the common case on LoRa)
+#   - after decryption, before any DB work: a per-node sliding window over the
+#     nonce counter (first 4 nonce bytes, little-endian on the ESP32) rejects
+#     counters that were already used or are too old to track
+#
+# For the same reason a frame is tried against each distinct key until one
+# authenticates, most recently successful key first. Nodes on the default key
+# share one AEAD, so a genuine frame normally costs one decryption; a forged
+# or corrupted one costs one per distinct key. Cutting that to one would need
+# the source ID in clear in the frame header, i.e. a firmware change on every
+# node.
+
+import threading
+from collections import OrderedDict
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+from receiver.config import CHACHA_KEY
+from receiver.crypto import NONCE_LEN, TAG_LEN
+
+REPLAY_WINDOW = 64
+RECENT_NONCES = 4096
+
+
+class DuplicateFrame(Exception):
+    """Frame nonce was already accepted; rejected before decryption."""
+
+
+class ReplayedFrame(Exception):
+    """Authenticated frame whose counter is already used or outside the replay window."""
+
+
+class ReplayWindow:
+    """Sliding bitmap over the last `size` counters (same idea as IPsec/WireGuard)."""
+
+    def __init__(self, size=REPLAY_WINDOW):
+        self.size = size
+        self.highest = None
+        self.bitmap = 0
+
+    def seen(self, counter):
+        if self.highest is None or counter > self.highest:
+            return False
+        offset = self.highest - counter
+        if offset >= self.size:
+            return True  # too old to tell, treat as a replay
+        return bool(self.bitmap & (1 << offset))
+
+    def accept(self, counter):
+        """Record counter. Returns False (and changes nothing) if it was already seen."""
+        if self.seen(counter):
+            return False
+        if self.highest is None:
+            self.highest = counter
+            self.bitmap = 1
+        elif counter > self.highest:
+            shift = counter - self.highest
+            self.bitmap = ((self.bitmap << shift) | 1) & ((1 << self.size) - 1) if shift < self.size else 1
+            self.highest = counter
+        else:
+            self.bitmap |= 1 << (self.highest - counter)
+        return True
+
+
+class KeyRegistry:
+    """
+    Maps source node IDs to keys. One ChaCha20Poly1305 object is built per
+    distinct key and reused for every packet. Nodes without their own key use
+    default_key.
+    """
+
+    def __init__(self, node_keys=None, default_key=CHACHA_KEY,
+                 window=REPLAY_WINDOW, recent_nonces=RECENT_NONCES):
+        self.default_key = default_key
+        self.window = window
+        self.recent_nonces = recent_nonces
+        self._lock = threading.Lock()
+        self._node_keys = {}
+        self._aeads = OrderedDict()  # key bytes -> AEAD, most recently successful first
+        self._windows = {}
+        self._recent = OrderedDict()
+
+        self._aead_for(default_key)
+        for node_id, key in (node_keys or {}).items():
+            self.add_node(node_id, key)
+
+    def _aead_for(self, key):
+        if key not in self._aeads:
+            self._aeads[key] = ChaCha20Poly1305(key)
+        return self._aeads[key]
+
+    def add_node(self, node_id, key):
+        with self._lock:
+            self._node_keys[node_id] = key
+            self._aead_for(key)
+
+    def key_for(self, node_id):
+        return self._node_keys.get(node_id, self.default_key)
+
+    def reset(self, node_id):
+        """Forget a node's replay window, e.g. after it was re-flashed and its counter restarted."""
+        with self._lock:
+            self._windows.pop(node_id, None)
+
+    @staticmethod
+    def nonce_counter(nonce):
+        return int.from_bytes(nonce[:4], "little")
+
+    def decrypt(self, payload_bytes):
+        """
+        Returns (dest, src, body) for a fresh, authenticated frame, where body is
+        the raw message bytes (CSV text or a binary payload, see payload.py).
+        Raises DuplicateFrame, ReplayedFrame, or ValueError for anything else.
+        """
+        if len(payload_bytes) < NONCE_LEN + TAG_LEN:
+            raise ValueError("Payload too short to contain nonce and tag")
+        nonce = bytes(payload_bytes[:NONCE_LEN])
+        ciphertext_and_tag = bytes(payload_bytes[NONCE_LEN:])
+
+        with self._lock:
+            if nonce in self._recent:
+                raise DuplicateFrame(f"nonce {nonce.hex()} already accepted")
+            candidates = list(self._aeads.items())
+
+        plaintext = None
+        for key, aead in candidates:
+            try:
+                plaintext = aead.decrypt(nonce, ciphertext_and_tag, associated_data=None)
+                break
+            except InvalidTag:
+                continue
+        if plaintext is None or len(plaintext) < 2:
+            raise ValueError("Authentication failed with every registered key")
+
+        dest = plaintext[0]
+        src = plaintext[1]
+        if key != self.key_for(src):
+            raise ValueError(f"Node {src} authenticated with a key that is not registered for it")
+
+        counter = self.nonce_counter(nonce)
+        with self._lock:
+            window = self._windows.get(src)
+            if window is None:
+                window = self._windows[src] = ReplayWindow(self.window)
+            if not window.accept(counter):
+                raise ReplayedFrame(f"node {src} counter {counter} already used (highest {window.highest})")
+
+            self._recent[nonce] = src
+            if len(self._recent) > self.recent_nonces:
+                self._recent.popitem(last=False)
+            # Try the key that just worked first next time
+            self._aeads.move_to_end(key, last=False)
+
+        return dest, src, plaintext[2:]
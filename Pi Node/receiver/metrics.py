@@ -0,0 +1,96 @@
+# metrics.py
+# Receiver metrics (registry in receiver/prometheus.py). The receiver is its
+# own process, so MetricsWriter dumps the registry to a textfile next to the
+# database every few seconds; the dashboard's /metrics appends that file to
+# its own metrics.
+
+import threading
+
+from receiver.prometheus import Registry
+
+REGISTRY = Registry()
+
+PACKETS = REGISTRY.counter(
+    "resiliot_receiver_packets_total",
+    "Frames handed over by the radio, by whether the RX queue had room (queued) or not (dropped).",
+    ["result"],
+)
+FRAMES = REGISTRY.counter(
+    "resiliot_receiver_frames_total",
+    "Decoded frames by outcome: accepted, rejected (unknown node or message type, wrong field count), "
+    "decrypt_failed, replayed, duplicate, wrong_dest.",
+    ["result"],
+)
+OUT_OF_RANGE = REGISTRY.counter(
+    "resiliot_receiver_out_of_range_total",
+    "Fields outside their schema range, stored as NULL, by node type and field.",
+    ["type", "field"],
+)
+ROWS = REGISTRY.counter(
+    "resiliot_receiver_rows_total",
+    "Rows handled by the write-behind queue, by outcome (written, duplicate, failed = dropped after retries).",
+    ["result"],
+)
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "resiliot_receiver_queue_wait_seconds",
+    "Time a frame waited in the RX queue before a worker picked it up.",
+)
+FLUSH_SECONDS = REGISTRY.histogram(
+    "resiliot_receiver_db_flush_seconds",
+    "Time to insert and commit one batch of rows.",
+)
+COMMIT_LATENCY_SECONDS = REGISTRY.histogram(
+    "resiliot_receiver_commit_latency_seconds",
+    "Time from a frame coming off the radio to its row being committed.",
+)
+BATCH_ROWS = REGISTRY.histogram(
+    "resiliot_receiver_db_batch_rows",
+    "Rows per committed batch.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "resiliot_receiver_queue_depth",
+    "Frames waiting in the RX queue.",
+)
+PENDING_ROWS = REGISTRY.gauge(
+    "resiliot_receiver_pending_rows",
+    "Rows waiting for the next write-behind flush.",
+)
+
+
+class MetricsWriter:
+    """
+    Writes REGISTRY to path every interval_s from a daemon thread, and once
+    more on stop(). sample() is called before each write to refresh gauges.
+    """
+
+    def __init__(self, path, interval_s, sample=None):
+        self.path = path
+        self.interval_s = interval_s
+        self.sample = sample
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._warned = False
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+    def write(self):
+        try:
+            if self.sample:
+                self.sample()
+            REGISTRY.write_textfile(self.path)
+        except OSError as e:
+            # Keep receiving; only say so once
+            if not self._warned:
+                print(f"[WARN] Could not write metrics to {self.path}: {e}")
+                self._warned = True
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.write()
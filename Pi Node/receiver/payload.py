@@ -0,0 +1,102 @@
+# payload.py
+# Uplink message formats carried inside the encrypted frame (after dest, src).
+#
+# Legacy CSV:  "23,55,41,0.20,3.40"  (always starts with an ASCII character)
+#
+# Binary v1:   byte 0  = 0x80 | version   (high bit set, so it can never be CSV)
+#              byte 1  = message type
+#              rest    = little-endian fixed-point fields, per type:
+#
+#   TYPE_WEATHER (0x02, Node 2)  <hHBHH  9 bytes
+#       temp  int16  0.01 degC      hum        uint16 0.01 %
+#       soil  uint8  1 %            rain/min   uint16 0.01 mm
+#                                   total_rain uint16 0.01 mm
+#   TYPE_RIVER   (0x03, Node 3)  <HhB    5 bytes
+#       river uint16 0.1 cm         rate_of_rise int16 0.1 cm/min
+#       flags uint8  bit 0 = high water switch
+#
+# A field holding its type's "missing" sentinel (0x7FFF / 0xFFFF / 0xFF)
+# decodes to None, e.g. when the DHT read failed.
+
+import struct
+
+BINARY_FLAG = 0x80
+VERSION = 1
+
+TYPE_WEATHER = 0x02
+TYPE_RIVER = 0x03
+
+_MISSING = {"h": 0x7FFF, "H": 0xFFFF, "B": 0xFF}
+
+
+def _layout(fmt, divisors):
+    st = struct.Struct(fmt)
+    missing = tuple(_MISSING[c] for c in fmt if c.isalpha())
+    return st, divisors, missing
+
+
+# (version, type) -> (struct, fixed-point divisor per field, missing sentinel per field)
+_LAYOUTS = {
+    (1, TYPE_WEATHER): _layout("<hHBHH", (100, 100, 1, 100, 100)),
+    (1, TYPE_RIVER): _layout("<HhB", (10, 10, 1)),
+}
+
+
+class PayloadError(ValueError):
+    pass
+
+
+def is_binary(body):
+    return len(body) >= 2 and body[0] & BINARY_FLAG
+
+
+def _decode_binary(body):
+    version = body[0] & ~BINARY_FLAG & 0xFF
+    msg_type = body[1]
+    layout = _LAYOUTS.get((version, msg_type))
+    if layout is None:
+        raise PayloadError(f"Unknown binary payload v{version} type {msg_type:#04x}")
+    st, divisors, missing = layout
+    if len(body) - 2 != st.size:
+        raise PayloadError(f"Binary type {msg_type:#04x} needs {st.size} bytes, got {len(body) - 2}")
+
+    raw = st.unpack_from(body, 2)
+    fields = []
+    for value, divisor, sentinel in zip(raw, divisors, missing):
+        fields.append(None if value == sentinel else value / divisor)
+    if msg_type == TYPE_RIVER and fields[2] is not None:
+        fields[2] = float(raw[2] & 0x01)
+    return msg_type, fields
+
+
+def decode_message(body):
+    """
+    Returns (msg_type, fields) for a message body.
+    msg_type is None for legacy CSV, whose fields stay as strings.
+    """
+    if is_binary(body):
+        return _decode_binary(body)
+    return None, body.decode('utf-8', errors='ignore').split(",")
+
+
+def describe(body):
+    """Readable form of a message body for log lines."""
+    if is_binary(body):
+        return f"bin:{body.hex()}"
+    return body.decode('utf-8', errors='ignore')
+
+
+def _pack(msg_type, values):
+    st, divisors, missing = _LAYOUTS[(VERSION, msg_type)]
+    packed = []
+    for value, divisor, sentinel in zip(values, divisors, missing):
+        packed.append(sentinel if value is None else int(round(value * divisor)))
+    return bytes([BINARY_FLAG | VERSION, msg_type]) + st.pack(*packed)
+
+
+def encode_weather(temp, hum, soil, rain_min, total_rain):
+    return _pack(TYPE_WEATHER, (temp, hum, soil, rain_min, total_rain))
+
+
+def encode_river(river, rate_of_rise, high_water):
+    return _pack(TYPE_RIVER, (river, rate_of_rise, 1 if high_water else 0))
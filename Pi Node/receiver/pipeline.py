@@ -0,0 +1,117 @@
+# pipeline.py
+# Staged receive pipeline: the radio callback only copies the raw frame into a
+# bounded queue and re-arms the radio; worker threads do decrypt, parse and
+# persistence afterwards.
+
+import queue
+import threading
+from collections import namedtuple
+from time import monotonic, time
+
+from receiver.metrics import PACKETS, QUEUE_WAIT_SECONDS
+
+# One received LoRa frame, as copied out of the radio FIFO
+RxFrame = namedtuple("RxFrame", ["payload", "rssi", "rx_time", "rx_wall"])
+
+DEFAULT_QUEUE_SIZE = 256
+
+_STOP = object()
+
+
+class RxPipeline:
+    """
+    Bounded hand-off between the RX interrupt path and the decode workers.
+
+    submit() never blocks: when the queue is full the frame is dropped and
+    counted, so the radio is always re-armed straight away.
+    """
+
+    def __init__(self, handler, maxsize=DEFAULT_QUEUE_SIZE, workers=1):
+        self.handler = handler
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._stats = {
+            "received": 0,
+            "processed": 0,
+            "dropped": 0,
+            "errors": 0,
+            "queue_high_water": 0,
+            "max_wait_ms": 0.0,
+            "total_wait_ms": 0.0,
+            "max_process_ms": 0.0,
+            "total_process_ms": 0.0,
+        }
+        self._workers = [
+            threading.Thread(target=self._run, name=f"rx-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._workers:
+            t.start()
+
+    def submit(self, payload, rssi=None):
+        """Called from the RX callback. Returns False if the frame was dropped."""
+        frame = RxFrame(bytes(payload), rssi, monotonic(), time())
+        try:
+            self._queue.put_nowait(frame)
+        except queue.Full:
+            PACKETS.inc(result="dropped")
+            with self._lock:
+                self._stats["received"] += 1
+                self._stats["dropped"] += 1
+            return False
+
+        PACKETS.inc(result="queued")
+        depth = self._queue.qsize()
+        with self._lock:
+            self._stats["received"] += 1
+            if depth > self._stats["queue_high_water"]:
+                self._stats["queue_high_water"] = depth
+        return True
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def close(self, timeout=None):
+        """Let the workers finish what is queued, then stop them."""
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        for t in self._workers:
+            t.join(timeout)
+
+    def stats(self):
+        """Backpressure snapshot: queue depth/high-water, drops and per-stage timings."""
+        with self._lock:
+            s = dict(self._stats)
+        s["depth"] = self.depth()
+        s["capacity"] = self.maxsize
+        done = s["processed"] + s["errors"]
+        s["avg_wait_ms"] = s["total_wait_ms"] / done if done else 0.0
+        s["avg_process_ms"] = s["total_process_ms"] / done if done else 0.0
+        return s
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is _STOP:
+                return
+
+            start = monotonic()
+            ok = True
+            try:
+                self.handler(frame)
+            except Exception as e:
+                ok = False
+                print(f"[ERROR] RX worker failed on frame: {e}")
+            end = monotonic()
+
+            QUEUE_WAIT_SECONDS.observe(start - frame.rx_time)
+            wait_ms = (start - frame.rx_time) * 1000.0
+            process_ms = (end - start) * 1000.0
+            with self._lock:
+                s = self._stats
+                s["processed" if ok else "errors"] += 1
+                s["total_wait_ms"] += wait_ms
+                s["total_process_ms"] += process_ms
+                s["max_wait_ms"] = max(s["max_wait_ms"], wait_ms)
+                s["max_process_ms"] = max(s["max_process_ms"], process_ms)
@@ -0,0 +1,132 @@
+# schemas.py
+# Declarative node-type schemas. Each node type lists its message fields in
+# order (name, type, range, target sensor_readings column); a node ID is mapped
+# to a type in node_schemas.json, so adding a node needs no code change.
+#
+# Every schema is compiled once into a flat list of (position, column, cast,
+# min, max, field) steps, so parsing a packet is one pass over that list.
+# Out-of-range values are stored as NULL and counted per node type and field
+# (metrics.OUT_OF_RANGE).
+
+import json
+from collections import namedtuple
+
+from receiver.config import NODE_SCHEMAS_PATH
+from receiver.metrics import OUT_OF_RANGE
+
+# Column order of the sensor_readings insert (see storage.INSERT_SQL)
+COLUMNS = (
+    "ts", "soil", "temp", "hum", "rain", "total_daily_rain",
+    "river", "rate_of_rise", "high_level_alert", "sensor_id",
+)
+_COLUMN_INDEX = {name: i for i, name in enumerate(COLUMNS)}
+_TS = _COLUMN_INDEX["ts"]
+_SENSOR_ID = _COLUMN_INDEX["sensor_id"]
+
+_CASTS = {"float": float, "int": lambda v: int(float(v)), "bool": lambda v: int(float(v) != 0)}
+
+FieldSpec = namedtuple("FieldSpec", ["name", "type", "min", "max", "column"])
+
+
+class SchemaError(ValueError):
+    pass
+
+
+class NodeSchema:
+    """A node type: its binary message type byte (if any) and ordered fields."""
+
+    def __init__(self, name, fields, msg_type=None):
+        self.name = name
+        self.msg_type = msg_type
+        self.fields = [f if isinstance(f, FieldSpec) else FieldSpec(**f) for f in fields]
+        self._steps = self._compile()
+        self._template = [None] * len(COLUMNS)
+
+    def _compile(self):
+        steps = []
+        for pos, f in enumerate(self.fields):
+            if f.type not in _CASTS:
+                raise SchemaError(f"{self.name}.{f.name}: unknown type {f.type!r}")
+            if f.column is None:
+                continue  # field is validated for count but not stored
+            if f.column not in _COLUMN_INDEX or f.column in ("ts", "sensor_id"):
+                raise SchemaError(f"{self.name}.{f.name}: invalid column {f.column!r}")
+            lo = float("-inf") if f.min is None else f.min
+            hi = float("inf") if f.max is None else f.max
+            steps.append((pos, _COLUMN_INDEX[f.column], _CASTS[f.type], lo, hi, f.name))
+        return tuple(steps)
+
+    def build_row(self, fields, ts, src):
+        """
+        Row for sensor_readings. Raises SchemaError on a wrong field count; a
+        field that is missing, unparsable or out of range is stored as NULL;
+        out of range ones are counted in OUT_OF_RANGE.
+        """
+        if len(fields) != len(self.fields):
+            raise SchemaError("Unexpected number of fields")
+        row = self._template[:]
+        row[_TS] = ts
+        row[_SENSOR_ID] = src
+        for pos, col, cast, lo, hi, name in self._steps:
+            value = fields[pos]
+            if value is None:
+                continue
+            try:
+                f = float(value)
+            except (TypeError, ValueError):
+                continue
+            if lo <= f <= hi:
+                row[col] = cast(f)
+            else:
+                OUT_OF_RANGE.inc(type=self.name, field=name)
+        return row
+
+
+class SchemaRegistry:
+    """node ID -> NodeSchema, plus binary message type -> NodeSchema."""
+
+    def __init__(self, types, nodes):
+        self.types = dict(types)
+        self.by_node = {}
+        self.by_msg_type = {}
+        for schema in self.types.values():
+            if schema.msg_type is not None:
+                self.by_msg_type[schema.msg_type] = schema
+        for node_id, type_name in nodes.items():
+            if type_name not in self.types:
+                raise SchemaError(f"Node {node_id}: unknown type {type_name!r}")
+            self.by_node[int(node_id)] = self.types[type_name]
+
+    @classmethod
+    def from_dict(cls, config):
+        types = {
+            name: NodeSchema(name, spec["fields"], spec.get("msg_type"))
+            for name, spec in config.get("types", {}).items()
+        }
+        return cls(types, config.get("nodes", {}))
+
+    @classmethod
+    def load(cls, path=NODE_SCHEMAS_PATH):
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+    def assign(self, node_id, type_name):
+        self.by_node[int(node_id)] = self.types[type_name]
+
+    def resolve(self, src, msg_type=None):
+        """
+        Schema for a message. A binary message names its own type, so nodes
+        not in the config are still accepted; a configured node must send the
+        type it is configured for. CSV messages need a configured node.
+        """
+        schema = self.by_node.get(src)
+        if msg_type is None:
+            if schema is None:
+                raise SchemaError("Unknown node ID")
+            return schema
+        typed = self.by_msg_type.get(msg_type)
+        if typed is None:
+            raise SchemaError(f"Unknown message type {msg_type:#04x}")
+        if schema is not None and schema is not typed:
+            raise SchemaError(f"Unexpected message type {msg_type:#04x}")
+        return typed
@@ -0,0 +1,129 @@
+# service.py
+# Wires a radio backend to the staged pipeline:
+#   backend RX callback -> RxPipeline queue -> decrypt/parse worker -> WriteBehindQueue -> SQLite
+
+import threading
+
+from receiver.config import (MY_ADDRESS, DB_PATH, DB_MAX_BATCH, DB_MAX_DELAY_S,
+                             RX_QUEUE_SIZE, NODE_KEYS, METRICS_INTERVAL_S)
+from receiver.decode import parse_message
+from receiver.payload import describe
+from receiver.keys import KeyRegistry, DuplicateFrame, ReplayedFrame
+from receiver.metrics import FRAMES, QUEUE_DEPTH, PENDING_ROWS, MetricsWriter
+from receiver.pipeline import RxPipeline
+from receiver.storage import WriteBehindQueue, check_schema
+
+
+class Receiver:
+    def __init__(self, backend, db_path=DB_PATH, queue_size=RX_QUEUE_SIZE,
+                 max_batch=DB_MAX_BATCH, max_delay_s=DB_MAX_DELAY_S,
+                 my_address=MY_ADDRESS, keys=None, schemas=None, verbose=True,
+                 metrics_path=None, metrics_interval_s=METRICS_INTERVAL_S):
+        self.backend = backend
+        self.schemas = schemas
+        self.keys = keys if keys is not None else KeyRegistry(NODE_KEYS)
+        self.my_address = my_address
+        self.verbose = verbose
+        self.storage = WriteBehindQueue(db_path, max_batch=max_batch,
+                                        max_delay_s=max_delay_s, verbose=verbose)
+        self.db_path = db_path
+        self.pipeline = RxPipeline(self.handle_frame, maxsize=queue_size)
+        # Snapshot for the dashboard's /metrics; None for runs that should not write one
+        self.metrics = MetricsWriter(metrics_path, metrics_interval_s, self._sample_gauges) if metrics_path else None
+        self._lock = threading.Lock()
+        self.counters = {
+            "duplicate": 0,
+            "replayed": 0,
+            "decrypt_failed": 0,
+            "wrong_dest": 0,
+            "rejected": 0,
+            "accepted": 0,
+        }
+        # Export every outcome from the start, so rate() alerts see zeros rather than no series
+        for name in self.counters:
+            FRAMES.inc(0, result=name)
+
+    def _count(self, name):
+        FRAMES.inc(result=name)
+        with self._lock:
+            self.counters[name] += 1
+
+    def _sample_gauges(self):
+        QUEUE_DEPTH.set(self.pipeline.depth())
+        PENDING_ROWS.set(self.storage.pending())
+
+    # RX callback: must stay cheap, it runs before the radio is re-armed
+    def on_packet(self, payload, rssi=None):
+        return self.pipeline.submit(payload, rssi)
+
+    def handle_frame(self, frame):
+        """Worker stage: decrypt, parse, range-check and queue one received frame."""
+        payload_bytes = frame.payload
+        if self.verbose:
+            print(f"Payload length: {len(payload_bytes)}, RSSI: {frame.rssi}")
+            print("Payload hex:", payload_bytes.hex())
+
+        try:
+            dest, src, body = self.keys.decrypt(payload_bytes)
+        except DuplicateFrame:
+            # Retransmission of a frame we already stored: no decrypt, no DB work
+            self._count("duplicate")
+            return
+        except ReplayedFrame as e:
+            print(f"[WARN] Replay rejected: {e}")
+            self._count("replayed")
+            return
+        except Exception as e:
+            print(f"[ERROR] Decrypt or parse error: {e}")
+            self._count("decrypt_failed")
+            return
+
+        if self.verbose:
+            print(f"[DEBUG] dest={dest}, src={src}, text={describe(body)}")
+        if dest != self.my_address:
+            print(f"[WARN] Ignored message to dest {dest}")
+            self._count("wrong_dest")
+            return
+
+        # Stamp with the time the frame came off the radio (epoch ms), not when it was processed
+        ts = int(frame.rx_wall * 1000)
+        row = parse_message(src, body, ts, self.schemas)
+        if row is None:
+            self._count("rejected")
+            return
+
+        self.storage.put(row, frame.rx_time)
+        self._count("accepted")
+
+    def run(self):
+        """
+        Receive until the backend finishes or Ctrl-C, then drain and flush
+        everything. Raises SchemaMissing before receiving anything if the
+        database was not set up by the dashboard.
+        """
+        check_schema(self.db_path)
+        if self.metrics:
+            self.metrics.start()
+        try:
+            self.backend.start(self.on_packet)
+        except KeyboardInterrupt:
+            print("[INFO] Stopping receiver")
+        finally:
+            self.close()
+
+    def close(self):
+        self.backend.stop()
+        # Drain the RX queue first, then flush what the workers handed to the writer
+        self.pipeline.close()
+        self.storage.close()
+        if self.metrics:
+            self.metrics.stop()
+
+    def stats(self):
+        with self._lock:
+            decode = dict(self.counters)
+        return {
+            "rx": self.pipeline.stats(),
+            "decode": decode,
+            "storage": self.storage.stats(),
+        }
@@ -0,0 +1,299 @@
+# storage.py
+# Write-behind queue for the LoRa receiver: decoded rows are buffered in memory
+# and group-committed to SQLite, so the SD card sees one transaction per batch
+# instead of one fsync per packet.
+
+import os
+import queue
+import sqlite3
+import threading
+from collections import deque
+from time import monotonic, sleep
+
+from receiver.metrics import ROWS, FLUSH_SECONDS, COMMIT_LATENCY_SECONDS, BATCH_ROWS
+
+INSERT_SQL = """
+    INSERT OR IGNORE INTO sensor_readings (
+        ts, soil, temp, hum, rain, total_daily_rain,
+        river, rate_of_rise, high_level_alert, sensor_id
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Change counter the dashboard's response cache watches (see
+# utils/db_helpers.py); bumped in every flush transaction that wrote rows.
+BUMP_VERSION_SQL = """
+    INSERT INTO data_version (id, version) VALUES (1, 1)
+    ON CONFLICT (id) DO UPDATE SET version = version + 1
+"""
+
+# The schema is owned by the dashboard (SENSOR_SCHEMA in utils/db_helpers.py).
+# Its triggers keep latest_readings and the rollups current on every insert,
+# so the receiver refuses a database that lacks them rather than create a
+# bare sensor_readings of its own.
+REQUIRED_TABLES = ("sensor_readings", "data_version")
+REQUIRED_TRIGGERS = ("trg_latest_readings", "trg_rollup_hour", "trg_rollup_day", "trg_rollup_week")
+INIT_HINT = "create or upgrade it from the dashboard directory with: python -m utils.migrate_db"
+
+# Flush when this many rows are waiting, or when the oldest waiting row is this old
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_DELAY_S = 2.0
+
+# A failing batch is retried this many times (e.g. DB locked by the compaction
+# job), then bisected: the rows that go in are committed, rows that fail on
+# their own are logged and dropped, so one bad row cannot stall ingest.
+DEFAULT_MAX_RETRIES = 3
+RETRY_DELAY_S = 0.5
+
+# Number of recent receive-to-commit latencies kept for percentiles
+LATENCY_SAMPLES = 10000
+
+_STOP = object()
+
+
+class SchemaMissing(RuntimeError):
+    """The database lacks tables or triggers of the dashboard's schema."""
+
+
+def check_schema(db_path):
+    """Raise SchemaMissing unless db_path has the dashboard's sensor tables and triggers."""
+    if not os.path.exists(db_path):
+        raise SchemaMissing(f"{db_path} does not exist; {INIT_HINT} {db_path}")
+    conn = sqlite3.connect(db_path)
+    try:
+        names = {name for name, in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+        cols = [r[1] for r in conn.execute("PRAGMA table_info(sensor_readings)")]
+    finally:
+        conn.close()
+    missing = [n for n in REQUIRED_TABLES + REQUIRED_TRIGGERS if n not in names]
+    if cols and "ts" not in cols:
+        missing.append("sensor_readings.ts")
+    if missing:
+        raise SchemaMissing(f"{db_path} is missing {', '.join(missing)}; {INIT_HINT} {db_path}")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+class WriteBehindQueue:
+    """
+    Buffers rows for sensor_readings and flushes them from a background thread
+    with a single executemany() transaction when max_batch rows are pending or
+    max_delay_s has passed since the first pending row. A batch that still
+    fails after max_retries attempts is split to isolate the rows at fault,
+    which are dropped and counted in rows_failed.
+    """
+
+    def __init__(self, db_path, max_batch=DEFAULT_MAX_BATCH, max_delay_s=DEFAULT_MAX_DELAY_S,
+                 insert_sql=INSERT_SQL, verbose=True, max_retries=DEFAULT_MAX_RETRIES,
+                 retry_delay_s=RETRY_DELAY_S):
+        self.db_path = db_path
+        self.verbose = verbose
+        self.max_batch = max_batch
+        self.max_delay_s = max_delay_s
+        self.insert_sql = insert_sql
+        self.max_retries = max_retries
+        self.retry_delay_s = retry_delay_s
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "rows_queued": 0,
+            "rows_written": 0,
+            "rows_duplicate": 0,
+            "rows_failed": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._closed = False
+        self._thread.start()
+
+    # -----------------------
+    # Producer side
+    # -----------------------
+    def put(self, row, rx_time=None):
+        """
+        Queue one row (same column order as INSERT_SQL). Never touches the DB.
+        rx_time is the monotonic() time the frame was received, if known; it is
+        used for the receive-to-commit latency figures in stats().
+        """
+        if self._closed:
+            raise RuntimeError("WriteBehindQueue is closed")
+        self._queue.put((tuple(row), rx_time))
+        with self._stats_lock:
+            self._stats["rows_queued"] += 1
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def close(self, timeout=None):
+        """Flush everything still queued and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        """Snapshot of the flush counters, plus the average flush latency and batch size."""
+        with self._stats_lock:
+            s = dict(self._stats)
+        s["pending"] = self.pending()
+        s["avg_flush_ms"] = s["total_flush_ms"] / s["flushes"] if s["flushes"] else 0.0
+        s["avg_batch_size"] = (s["rows_written"] + s["rows_duplicate"]) / s["flushes"] if s["flushes"] else 0.0
+        with self._stats_lock:
+            lat = sorted(self._latencies)
+        s["commit_latency_ms"] = {
+            "p50": percentile(lat, 50),
+            "p95": percentile(lat, 95),
+            "p99": percentile(lat, 99),
+            "max": lat[-1] if lat else 0.0,
+        }
+        return s
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -----------------------
+    # Writer thread
+    # -----------------------
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # WAL lets the dashboard keep reading while a batch commits, and
+        # synchronous=NORMAL drops the per-commit fsync of the main DB file.
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        except sqlite3.Error as e:
+            print(f"[WARN] Could not set DB pragmas: {e}")
+        return conn
+
+    def _run(self):
+        conn = None
+        batch = []
+        deadline = None
+        stopping = False
+
+        while not stopping:
+            timeout = None if deadline is None else max(0.0, deadline - monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = monotonic() + self.max_delay_s
+            except queue.Empty:
+                pass
+
+            # Drain whatever else is already waiting, up to the batch limit
+            while not stopping and len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+
+            due = deadline is not None and monotonic() >= deadline
+            if batch and (stopping or due or len(batch) >= self.max_batch):
+                conn = self._write(conn, batch, retry=not stopping)
+                batch = []
+                deadline = None
+
+        if conn is not None:
+            conn.close()
+
+    def _write(self, conn, batch, retry=True):
+        """
+        Flush batch, retrying after a short pause (e.g. DB locked) up to
+        max_retries times, then isolate the rows at fault. Returns the
+        connection, opened on first use.
+        """
+        for attempt in range(self.max_retries if retry else 1):
+            if attempt:
+                sleep(self.retry_delay_s)
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except sqlite3.Error as e:
+                    print(f"[ERROR] Could not open {self.db_path}: {e}")
+                    continue
+            if self._flush(conn, batch):
+                return conn
+        self._isolate(conn, batch)
+        return conn
+
+    def _isolate(self, conn, batch):
+        """Bisect a batch that keeps failing: commit the halves that go in, drop single rows that do not."""
+        if conn is None or len(batch) == 1:
+            for row, _ in batch:
+                print(f"[ERROR] Dropped row that could not be written: {row}")
+            with self._stats_lock:
+                self._stats["rows_failed"] += len(batch)
+            ROWS.inc(len(batch), result="failed")
+            return
+        mid = len(batch) // 2
+        for half in (batch[:mid], batch[mid:]):
+            if not self._flush(conn, half, log_errors=False):
+                self._isolate(conn, half)
+
+    def _flush(self, conn, batch, log_errors=True):
+        start = monotonic()
+        try:
+            with conn:
+                # rowcount, unlike total_changes, leaves out rows written by
+                # the dashboard's triggers (latest_readings, rollups)
+                written = conn.executemany(self.insert_sql, [row for row, _ in batch]).rowcount
+                if written:
+                    conn.execute(BUMP_VERSION_SQL)
+        except Exception as e:
+            if log_errors:
+                print(f"[ERROR] DB batch insert of {len(batch)} rows failed: {e}")
+            with self._stats_lock:
+                self._stats["flush_errors"] += 1
+            return False
+
+        done = monotonic()
+        elapsed_ms = (done - start) * 1000.0
+        FLUSH_SECONDS.observe(done - start)
+        BATCH_ROWS.observe(len(batch))
+        ROWS.inc(written, result="written")
+        ROWS.inc(len(batch) - written, result="duplicate")
+        for _, t in batch:
+            if t is not None:
+                COMMIT_LATENCY_SECONDS.observe(done - t)
+        with self._stats_lock:
+            self._latencies.extend((done - t) * 1000.0 for _, t in batch if t is not None)
+            s = self._stats
+            s["flushes"] += 1
+            s["rows_written"] += written
+            s["rows_duplicate"] += len(batch) - written
+            s["last_batch_size"] = len(batch)
+            s["max_batch_size"] = max(s["max_batch_size"], len(batch))
+            s["last_flush_ms"] = elapsed_ms
+            s["max_flush_ms"] = max(s["max_flush_ms"], elapsed_ms)
+            s["total_flush_ms"] += elapsed_ms
+
+        if written < len(batch):
+            print(f"[WARN] {len(batch) - written} duplicate row(s) skipped in batch")
+        if self.verbose:
+            print(f"[INFO] Flushed {written} row(s) in {elapsed_ms:.1f} ms")
+        return True
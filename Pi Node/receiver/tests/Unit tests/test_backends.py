@@ -0,0 +1,63 @@
+import unittest
+
+from receiver.backends import FleetBackend, MAX_FLEET, time_on_air_s
+from receiver.decode import parse_message
+from receiver.keys import KeyRegistry
+from receiver.payload import TYPE_RIVER, TYPE_WEATHER, decode_message
+
+
+class FleetBackendTestCase(unittest.TestCase):
+    """ Virtual devices send valid encrypted frames; collisions and corruption are accounted for. """
+
+    def _run(self, **kwargs):
+        frames = []
+        fleet = FleetBackend(speed=1e6, seed=4, **kwargs)
+        fleet.start(lambda payload, rssi: frames.append(payload) or True)
+        return fleet, frames
+
+    def test_frames_decrypt_and_parse(self):
+        fleet, frames = self._run(weather=3, river=2, collisions=False, count=40)
+        self.assertEqual(len(frames), 40)
+        self.assertEqual(fleet.stats["delivered"], 40)
+
+        keys = KeyRegistry()
+        seen = {}
+        for payload in frames:
+            dest, src, body = keys.decrypt(payload)
+            self.assertEqual(dest, 1)
+            msg_type, _ = decode_message(body)
+            seen[src] = msg_type
+            self.assertIsNotNone(parse_message(src, body, 0))
+        # Kinds alternate, so nodes 2 and 3 match node_schemas.json
+        self.assertEqual(seen, {2: TYPE_WEATHER, 3: TYPE_RIVER, 4: TYPE_WEATHER,
+                                5: TYPE_RIVER, 6: TYPE_WEATHER})
+
+    def test_collision_and_capture(self):
+        fleet = FleetBackend(weather=1, river=0, seed=1)
+        delivered = []
+        fleet._deliver([(-80.0, b"a"), (-82.0, b"b")], lambda payload, rssi: delivered.append(payload) or True)
+        self.assertEqual((delivered, fleet.stats["collided"]), ([], 2))
+        fleet._deliver([(-70.0, b"a"), (-90.0, b"b")], lambda payload, rssi: delivered.append(payload) or True)
+        self.assertEqual((delivered, fleet.stats["collided"]), ([b"a"], 3))
+
+    def test_corrupted_frames_fail_authentication(self):
+        fleet, frames = self._run(weather=2, river=2, collisions=False, corrupt=1.0, count=10)
+        self.assertEqual(fleet.stats["corrupted"], 10)
+        keys = KeyRegistry()
+        for payload in frames:
+            with self.assertRaises(ValueError):
+                keys.decrypt(payload)
+
+    def test_fleet_size_limit(self):
+        FleetBackend(weather=MAX_FLEET, river=0)
+        with self.assertRaises(ValueError):
+            FleetBackend(weather=MAX_FLEET, river=1)
+
+    def test_time_on_air(self):
+        # SF7 / 125 kHz: a 39 byte frame is on air for roughly 80 ms
+        self.assertAlmostEqual(time_on_air_s(39), 0.08, delta=0.01)
+        self.assertGreater(time_on_air_s(40), time_on_air_s(20))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+from receiver.config import CHACHA_KEY
+from receiver.crypto import encrypt_message
+from receiver.keys import KeyRegistry, ReplayWindow, DuplicateFrame, ReplayedFrame
+
+NODE_KEY = bytes(range(32, 64))
+
+
+class ReplayWindowTestCase(unittest.TestCase):
+    """ Counters are accepted once, out of order within the window, never when too old. """
+
+    def test_duplicates_and_reordering(self):
+        window = ReplayWindow(size=8)
+        self.assertTrue(window.accept(10))
+        self.assertFalse(window.accept(10))
+        self.assertTrue(window.accept(7))
+        self.assertFalse(window.accept(7))
+        self.assertTrue(window.accept(12))
+        self.assertEqual(window.highest, 12)
+        self.assertFalse(window.accept(10))
+
+    def test_out_of_window(self):
+        window = ReplayWindow(size=8)
+        window.accept(100)
+        self.assertTrue(window.seen(92))
+        self.assertFalse(window.accept(92))
+        self.assertTrue(window.accept(93))
+        # A jump past the window forgets everything before it
+        self.assertTrue(window.accept(200))
+        self.assertTrue(window.seen(192))
+        self.assertFalse(window.seen(193))
+        self.assertTrue(window.accept(193))
+
+
+class KeyRegistryTestCase(unittest.TestCase):
+    """ Frames are authenticated with the sending node's key and rejected when replayed. """
+
+    def setUp(self):
+        self.keys = KeyRegistry({5: NODE_KEY})
+
+    def test_duplicate_and_replayed_frames(self):
+        frame = encrypt_message(1, 2, "23,55,41,0.20,3.40", counter=7, micros=1000)
+        self.assertEqual(self.keys.decrypt(frame), (1, 2, b"23,55,41,0.20,3.40"))
+        with self.assertRaises(DuplicateFrame):
+            self.keys.decrypt(frame)
+        # Same counter, new nonce: authenticates, but the counter was used
+        with self.assertRaises(ReplayedFrame):
+            self.keys.decrypt(encrypt_message(1, 2, "x", counter=7, micros=2000))
+        self.keys.decrypt(encrypt_message(1, 2, "x", counter=8, micros=3000))
+
+    def test_node_restart(self):
+        self.keys.decrypt(encrypt_message(1, 2, "x", counter=5000, micros=1))
+        restarted = encrypt_message(1, 2, "x", counter=1, micros=2)
+        with self.assertRaises(ReplayedFrame):
+            self.keys.decrypt(restarted)
+        self.keys.reset(2)
+        self.assertEqual(self.keys.decrypt(restarted)[1], 2)
+
+    def test_per_node_keys(self):
+        self.assertEqual(self.keys.decrypt(encrypt_message(1, 5, "x", 1, 1, key=NODE_KEY))[1], 5)
+        # Node 5 has its own key; a frame claiming to be node 5 under the default key is refused
+        with self.assertRaises(ValueError):
+            self.keys.decrypt(encrypt_message(1, 5, "x", 2, 2, key=CHACHA_KEY))
+        with self.assertRaises(ValueError):
+            self.keys.decrypt(encrypt_message(1, 2, "x", 1, 3, key=bytes(32)))
+        with self.assertRaises(ValueError):
+            self.keys.decrypt(b"\x00" * 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+from receiver.payload import (decode_message, describe, encode_river, encode_weather, is_binary,
+                              PayloadError, TYPE_RIVER, TYPE_WEATHER)
+
+
+class PayloadTestCase(unittest.TestCase):
+    """ Binary v1 payloads round-trip through the fixed-point layouts; CSV passes through. """
+
+    def test_weather_round_trip(self):
+        body = encode_weather(21.37, 55.5, 41, 0.2, 3.4)
+        self.assertEqual(len(body), 2 + 9)
+        self.assertEqual(decode_message(body), (TYPE_WEATHER, [21.37, 55.5, 41.0, 0.2, 3.4]))
+
+    def test_river_round_trip(self):
+        body = encode_river(123.4, -2.5, True)
+        self.assertEqual(len(body), 2 + 5)
+        self.assertEqual(decode_message(body), (TYPE_RIVER, [123.4, -2.5, 1.0]))
+        self.assertEqual(decode_message(encode_river(0.0, 0.0, False))[1][2], 0.0)
+
+    def test_missing_fields_decode_to_none(self):
+        msg_type, fields = decode_message(encode_weather(None, None, 10, 0.0, 1.0))
+        self.assertEqual(fields[:2], [None, None])
+        self.assertEqual(fields[2], 10.0)
+
+    def test_bad_length_and_type(self):
+        body = encode_river(100.0, 0.0, False)
+        with self.assertRaises(PayloadError):
+            decode_message(body[:-1])
+        with self.assertRaises(PayloadError):
+            decode_message(body + b"\x00")
+        with self.assertRaises(PayloadError):
+            decode_message(bytes([0x81, 0x7F]) + body[2:])
+        with self.assertRaises(PayloadError):
+            decode_message(bytes([0x82]) + body[1:])
+
+    def test_csv(self):
+        self.assertFalse(is_binary(b"23,55,41,0.20,3.40"))
+        self.assertEqual(decode_message(b"23,55,41"), (None, ["23", "55", "41"]))
+        self.assertEqual(describe(b"1,2"), "1,2")
+        self.assertTrue(describe(encode_river(1.0, 0.0, False)).startswith("bin:8103"))
+
+
+if __name__ == "__main__":
+    unittest.main()
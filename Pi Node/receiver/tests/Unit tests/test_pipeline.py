@@ -0,0 +1,60 @@
+import threading
+import time
+import unittest
+
+from receiver.pipeline import RxPipeline
+
+
+def wait_for(predicate, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > end:
+            raise AssertionError("timed out")
+        time.sleep(0.005)
+
+
+class RxPipelineTestCase(unittest.TestCase):
+    """ submit() never blocks: a full queue drops and counts the frame. """
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.handled = []
+
+    def _handler(self, frame):
+        self.release.wait(5)
+        if frame.payload == b"bad":
+            raise ValueError("cannot parse")
+        self.handled.append(frame.payload)
+
+    def test_overflow_is_dropped_and_counted(self):
+        pipeline = RxPipeline(self._handler, maxsize=2)
+        self.assertTrue(pipeline.submit(b"f0", rssi=-80))
+        # The worker holds f0, so the queue itself has room for two more
+        wait_for(lambda: pipeline.depth() == 0)
+        self.assertTrue(pipeline.submit(b"f1"))
+        self.assertTrue(pipeline.submit(b"f2"))
+        self.assertFalse(pipeline.submit(b"f3"))
+        self.assertFalse(pipeline.submit(b"f4"))
+
+        s = pipeline.stats()
+        self.assertEqual((s["received"], s["dropped"], s["depth"], s["queue_high_water"]), (5, 2, 2, 2))
+
+        self.release.set()
+        pipeline.close()
+        self.assertEqual(self.handled, [b"f0", b"f1", b"f2"])
+        s = pipeline.stats()
+        self.assertEqual((s["processed"], s["errors"], s["depth"]), (3, 0, 0))
+
+    def test_handler_errors_are_counted(self):
+        self.release.set()
+        pipeline = RxPipeline(self._handler, maxsize=8, workers=2)
+        for payload in (b"ok", b"bad", b"ok"):
+            pipeline.submit(payload)
+        pipeline.close()
+        s = pipeline.stats()
+        self.assertEqual((s["processed"], s["errors"]), (2, 1))
+        self.assertEqual(self.handled, [b"ok", b"ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
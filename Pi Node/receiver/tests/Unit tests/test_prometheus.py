@@ -0,0 +1,43 @@
+import importlib.util
+import os
+import unittest
+
+from receiver import prometheus
+
+DASHBOARD_COPY = os.path.join(os.path.dirname(prometheus.__file__), "..", "ResilIoT", "utils", "prometheus.py")
+
+
+def load_dashboard_copy():
+    spec = importlib.util.spec_from_file_location("dashboard_prometheus", DASHBOARD_COPY)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def populate(registry):
+    frames = registry.counter("frames_total", "Frames by \"outcome\".", ["result"])
+    frames.inc(result="accepted")
+    frames.inc(3, result="decrypt_failed")
+    registry.gauge("queue_depth", "Frames waiting.").set(2.5)
+    flush = registry.histogram("flush_seconds", "Flush time.", buckets=(0.01, 0.1))
+    for value in (0.005, 0.05, 2.0):
+        flush.observe(value)
+    return registry.render()
+
+
+class SharedRegistryTestCase(unittest.TestCase):
+    """ The receiver's registry is the dashboard's utils/prometheus.py, byte for byte. """
+
+    def test_files_are_identical(self):
+        with open(prometheus.__file__, "rb") as ours, open(DASHBOARD_COPY, "rb") as theirs:
+            self.assertEqual(ours.read(), theirs.read(),
+                             "receiver/prometheus.py differs from ResilIoT/utils/prometheus.py; copy it over")
+
+    def test_same_exposition_text(self):
+        text = populate(prometheus.Registry())
+        self.assertEqual(populate(load_dashboard_copy().Registry()), text)
+        self.assertIn('flush_seconds_bucket{le="+Inf"} 3\n', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from receiver.metrics import OUT_OF_RANGE
+from receiver.schemas import COLUMNS, SchemaError, SchemaRegistry
+
+CONFIG = {
+    "types": {
+        "weather": {
+            "msg_type": 2,
+            "fields": [
+                {"name": "temp", "type": "float", "min": -30.0, "max": 50.0, "column": "temp"},
+                {"name": "hum", "type": "float", "min": 0, "max": 100, "column": "hum"},
+                {"name": "spare", "type": "int", "min": None, "max": None, "column": None},
+            ],
+        },
+        "river": {
+            "msg_type": 3,
+            "fields": [
+                {"name": "river_height", "type": "float", "min": 0, "max": 250, "column": "river"},
+                {"name": "high_alert", "type": "bool", "min": 0, "max": 1, "column": "high_level_alert"},
+            ],
+        },
+    },
+    "nodes": {"2": "weather", "3": "river"},
+}
+
+
+def field(column, type="float"):
+    return {"name": "f", "type": type, "min": None, "max": None, "column": column}
+
+
+class SchemaRegistryTestCase(unittest.TestCase):
+    """ Node configs are validated when loaded; rows are built and range-checked per type. """
+
+    def setUp(self):
+        self.registry = SchemaRegistry.from_dict(CONFIG)
+
+    def test_build_row(self):
+        rejected = OUT_OF_RANGE.value(type="weather", field="hum")
+        row = self.registry.resolve(2).build_row(["21.5", "140", "7"], 1000, 2)
+        values = dict(zip(COLUMNS, row))
+        self.assertEqual((values["ts"], values["sensor_id"], values["temp"]), (1000, 2, 21.5))
+        # Out of range is stored as NULL and counted, not rejected
+        self.assertIsNone(values["hum"])
+        self.assertEqual(OUT_OF_RANGE.value(type="weather", field="hum"), rejected + 1)
+        self.assertEqual(OUT_OF_RANGE.value(type="weather", field="temp"), 0)
+        self.assertIsNone(values["soil"])
+
+        row = self.registry.resolve(3, 3).build_row([120.0, 1.0], 2000, 3)
+        self.assertEqual(row[COLUMNS.index("high_level_alert")], 1)
+        with self.assertRaises(SchemaError):
+            self.registry.resolve(2).build_row(["21.5", "40"], 1000, 2)
+
+    def test_resolve(self):
+        with self.assertRaises(SchemaError):
+            self.registry.resolve(9)
+        # Binary messages name their type, so unconfigured nodes are accepted
+        self.assertEqual(self.registry.resolve(9, 3).name, "river")
+        with self.assertRaises(SchemaError):
+            self.registry.resolve(2, 3)
+        with self.assertRaises(SchemaError):
+            self.registry.resolve(2, 0x7F)
+
+    def test_invalid_configs(self):
+        for bad in (
+            {"types": {}, "nodes": {"2": "weather"}},
+            {"types": {"t": {"fields": [field("nope")]}}},
+            {"types": {"t": {"fields": [field("ts")]}}},
+            {"types": {"t": {"fields": [field("temp", type="text")]}}},
+        ):
+            with self.assertRaises(SchemaError):
+                SchemaRegistry.from_dict(bad)
+
+    def test_shipped_config_loads(self):
+        registry = SchemaRegistry.load()
+        self.assertEqual(registry.resolve(2).name, "weather")
+        self.assertEqual(registry.resolve(3).name, "river")
+
+
+if __name__ == "__main__":
+    unittest.main()
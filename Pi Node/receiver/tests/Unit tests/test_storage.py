@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from receiver.storage import WriteBehindQueue, SchemaMissing, check_schema
+
+# The columns and change counter the queue writes to; the full schema (with
+# the dashboard's triggers) is only needed by check_schema
+SCHEMA = [
+    """
+    CREATE TABLE sensor_readings (
+        ts INTEGER NOT NULL, sensor_id INTEGER NOT NULL,
+        soil REAL, temp REAL, hum REAL, rain REAL, total_daily_rain REAL,
+        river REAL, rate_of_rise REAL, high_level_alert INTEGER,
+        PRIMARY KEY (sensor_id, ts)
+    ) WITHOUT ROWID
+    """,
+    "CREATE TABLE data_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)",
+]
+
+
+def row(ts, soil=50.0, sensor_id=2):
+    return (ts, soil, 20.0, 60.0, 0.0, 1.0, None, None, None, sensor_id)
+
+
+def wait_for(predicate, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > end:
+            raise AssertionError("timed out")
+        time.sleep(0.005)
+
+
+class WriteBehindQueueTestCase(unittest.TestCase):
+    """ Rows are group-committed by size or deadline, flushed on close, and bad rows are isolated. """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "sensor_data.db")
+        conn = sqlite3.connect(self.db_path)
+        for stmt in SCHEMA:
+            conn.execute(stmt)
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _count(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _version(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute("SELECT version FROM data_version").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_group_commit_by_batch_size(self):
+        q = WriteBehindQueue(self.db_path, max_batch=10, max_delay_s=60, verbose=False)
+        for ts in range(25):
+            q.put(row(ts))
+        wait_for(lambda: q.stats()["flushes"] == 2)
+        self.assertEqual(self._count(), 20)
+        self.assertEqual(q.stats()["max_batch_size"], 10)
+        self.assertEqual(q.pending(), 0)
+
+        q.close()
+        s = q.stats()
+        self.assertEqual((s["flushes"], s["rows_written"], s["last_batch_size"]), (3, 25, 5))
+        # One data_version bump per committed batch
+        self.assertEqual(self._version(), 3)
+
+    def test_flush_on_deadline(self):
+        q = WriteBehindQueue(self.db_path, max_batch=100, max_delay_s=0.05, verbose=False)
+        for ts in range(3):
+            q.put(row(ts), rx_time=time.monotonic())
+        wait_for(lambda: self._count() == 3)
+        s = q.stats()
+        self.assertEqual((s["flushes"], s["rows_written"]), (1, 3))
+        self.assertGreater(s["commit_latency_ms"]["max"], 0)
+        q.close()
+
+    def test_flush_on_close(self):
+        q = WriteBehindQueue(self.db_path, max_batch=100, max_delay_s=60, verbose=False)
+        for ts in range(5):
+            q.put(row(ts))
+        q.put(row(4))
+        q.close()
+        s = q.stats()
+        self.assertEqual((s["flushes"], s["rows_written"], s["rows_duplicate"]), (1, 5, 1))
+        self.assertEqual(self._count(), 5)
+        with self.assertRaises(RuntimeError):
+            q.put(row(6))
+
+    def test_failing_rows_are_isolated_and_dropped(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TRIGGER reject BEFORE INSERT ON sensor_readings WHEN NEW.soil < 0 "
+                     "BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+        conn.commit()
+        conn.close()
+
+        q = WriteBehindQueue(self.db_path, max_batch=16, max_delay_s=60, verbose=False,
+                             max_retries=2, retry_delay_s=0)
+        for ts in range(16):
+            q.put(row(ts, soil=-1.0 if ts in (3, 11) else 50.0))
+        wait_for(lambda: q.stats()["rows_written"] + q.stats()["rows_failed"] == 16)
+        # Ingest carries on after the bad batch
+        q.put(row(100))
+        q.close()
+
+        s = q.stats()
+        self.assertEqual((s["rows_written"], s["rows_failed"]), (15, 2))
+        self.assertGreaterEqual(s["flush_errors"], 2)
+        self.assertEqual(self._count(), 15)
+
+    def test_missing_triggers_are_refused(self):
+        with self.assertRaises(SchemaMissing) as ctx:
+            check_schema(self.db_path)
+        self.assertIn("trg_latest_readings", str(ctx.exception))
+        with self.assertRaises(SchemaMissing):
+            check_schema(os.path.join(self.tmp.name, "missing.db"))
+
+
+if __name__ == "__main__":
+    unittest.main()